@@ -61,6 +61,18 @@ def get_password_hash(password: str) -> str:
             detail=f"Password hashing failed: Password must be 72 bytes or less"
         )
 
+ACCESS_TOKEN_TYPE = "access"
+REFRESH_TOKEN_TYPE = "refresh"
+
+def build_token_claims(user) -> dict:
+    """Signed claims that let most requests authorize without loading the user"""
+    return {
+        "sub": user.username,
+        "uid": user.id,
+        "role": user.role.value if user.role else None,
+        "tv": user.token_version or 0,
+    }
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -68,22 +80,40 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "type": ACCESS_TOKEN_TYPE})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str):
+def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
+    to_encode = data.copy()
+    expire = datetime.utcnow() + (expires_delta or timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS))
+    to_encode.update({"exp": expire, "type": REFRESH_TOKEN_TYPE})
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+def create_token_pair(user) -> dict:
+    claims = build_token_claims(user)
+    return {
+        "token": create_access_token(data=claims),
+        "refresh_token": create_refresh_token(data=claims),
+    }
+
+def decode_token(token: str, expected_type: str = ACCESS_TOKEN_TYPE) -> dict:
+    """Decode and validate a JWT, returning its claims"""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials"
-            )
-        return username
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials"
-        )
\ No newline at end of file
+        )
+    # Tokens issued before typed tokens existed are access tokens
+    token_type = payload.get("type", ACCESS_TOKEN_TYPE)
+    if payload.get("sub") is None or token_type != expected_type:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials"
+        )
+    return payload
+
+def verify_token(token: str):
+    return decode_token(token)["sub"]
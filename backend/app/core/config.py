@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List, Optional
 import os
 
 class Settings(BaseSettings):
@@ -10,10 +10,120 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 14
+    # How long a user's token_version / status is trusted before re-reading it
+    TOKEN_VERSION_CACHE_TTL_SECONDS: int = 30
+    
+    # Rate limiting (set RATE_LIMIT_REDIS_URL to share buckets between workers)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_REDIS_URL: Optional[str] = os.getenv("RATE_LIMIT_REDIS_URL")
+    # Reverse proxies in front of the app whose X-Forwarded-For entries are trusted (1 on Render)
+    RATE_LIMIT_TRUSTED_PROXIES: int = 0
+    
+    # Notifications
+    NOTIFICATION_FANOUT_CHUNK_SIZE: int = 1000
+    
+    # Background jobs (JOB_WORKERS=0 disables the in-process workers)
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    JOB_VISIBILITY_TIMEOUT_SECONDS: int = 300
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BASE_SECONDS: float = 5.0
+    JOB_RETRY_MAX_SECONDS: float = 3600.0
+    
+    # Notification event streams
+    NOTIFICATION_STREAM_HEARTBEAT_SECONDS: float = 15.0
+    NOTIFICATION_STREAM_RETRY_MS: int = 3000
+    NOTIFICATION_STREAM_QUEUE_SIZE: int = 100
+    NOTIFICATION_STREAM_REPLAY_LIMIT: int = 100
+    NOTIFICATION_STREAM_MAX_PER_USER: int = 5
+    
+    # Like notifications within one window merge into a single "N people liked" row
+    NOTIFICATION_COALESCE_WINDOW_SECONDS: int = 86400
+    
+    # Unread notification counters
+    UNREAD_COUNT_CACHE_TTL_SECONDS: int = 10
+    UNREAD_COUNT_RECONCILE_SECONDS: int = 3600
+    
+    # Notification retention: read notifications older than their type's
+    # retention leave the hot table, archived or (for DELETE_TYPES) dropped
+    NOTIFICATION_RETENTION_DAYS: int = 90
+    NOTIFICATION_RETENTION_DAYS_BY_TYPE: Dict[str, int] = {"like": 30}
+    NOTIFICATION_RETENTION_DELETE_TYPES: List[str] = ["like"]
+    NOTIFICATION_RETENTION_BATCH_SIZE: int = 1000
+    NOTIFICATION_RETENTION_PAUSE_SECONDS: float = 0.05
+    NOTIFICATION_COMPACTION_INTERVAL_SECONDS: int = 86400
+    
+    # Admin dashboard counts are cached this long (or until a status change)
+    ADMIN_STATS_CACHE_TTL_SECONDS: int = 30
+    
+    # Analytics rollups: rows younger than the settle time wait for the next run
+    ANALYTICS_ROLLUP_INTERVAL_SECONDS: int = 300
+    ANALYTICS_ROLLUP_BATCH_SIZE: int = 5000
+    ANALYTICS_SETTLE_SECONDS: int = 60
+    # Buffered views are written every this many seconds (0 disables the flusher)
+    ANALYTICS_VIEW_FLUSH_SECONDS: int = 60
+    
+    # Moderation queue leases
+    MODERATION_LEASE_SECONDS: int = 900
+    MODERATION_CLAIM_MAX: int = 50
+    
+    # Uploads are copied to disk in chunks of this size; larger avatars are rejected
+    UPLOAD_CHUNK_BYTES: int = 256 * 1024
+    AVATAR_MAX_BYTES: int = 5 * 1024 * 1024
+    # Local scratch space for uploads on their way into storage (default: the system temp dir)
+    UPLOAD_STAGING_DIR: str = ""
+    # Square avatar variants rendered at upload time (needs Pillow)
+    AVATAR_VARIANT_SIZES: List[int] = [48, 96, 256]
+    AVATAR_VARIANT_FORMATS: List[str] = ["webp", "jpeg"]
+    IMAGE_WORKERS: int = 2
+    
+    # Resumable audio/video uploads; ones without a chunk for MEDIA_UPLOAD_EXPIRE_SECONDS are deleted
+    MEDIA_UPLOAD_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    MEDIA_UPLOAD_EXPIRE_SECONDS: int = 24 * 3600
+    MEDIA_UPLOAD_CLEANUP_INTERVAL_SECONDS: int = 3600
+    
+    # Serving uploads: Cache-Control by path prefix (longest match wins), bytes per body chunk
+    MEDIA_CACHE_CONTROL: Dict[str, str] = {
+        "/media/": "public, max-age=31536000, immutable",
+        "/avatar-variants/": "public, max-age=31536000, immutable",
+        "/uploads/": "public, max-age=86400",
+        "/avatars/": "public, max-age=86400",
+    }
+    MEDIA_CHUNK_BYTES: int = 256 * 1024
+    
+    # Content-addressed upload storage: "local" (STORAGE_LOCAL_DIR) or "s3" (needs boto3)
+    STORAGE_BACKEND: str = "local"
+    STORAGE_LOCAL_DIR: str = ""
+    S3_BUCKET: str = ""
+    S3_PREFIX: str = ""
+    S3_ENDPOINT_URL: str = ""  # e.g. a MinIO server
+    S3_REGION: str = ""
+    S3_ACCESS_KEY_ID: str = ""
+    S3_SECRET_ACCESS_KEY: str = ""
+    # Objects whose post-commit delete failed are retried by a sweep this often
+    STORAGE_SWEEP_INTERVAL_SECONDS: int = 3600
+    
+    # Admin exports: rows fetched per server-side cursor batch, bytes per streamed chunk
+    EXPORT_BATCH_SIZE: int = 1000
+    EXPORT_CHUNK_BYTES: int = 65536
     
     # CORS
     ALLOWED_HOSTS: List[str] = ["http://localhost:3000", "http://localhost:5173", "*"]
     
+    # Cache warm-up before /health reports ready (app.services.warmup)
+    WARMUP_ENABLED: bool = True
+    WARMUP_TIMEOUT_SECONDS: float = 10.0
+    WARMUP_WORKERS: int = 4
+    WARMUP_FEED_PAGES: int = 3
+    # Public feed pages are cached this long; like and comment counts may lag by as much
+    PUBLIC_FEED_CACHE_TTL_SECONDS: int = 30
+    # The category catalogue reloads on local changes; other workers' changes show up within this
+    CATEGORY_CATALOGUE_MAX_AGE_SECONDS: int = 300
+    
+    # Startup: skip create_all, migrations and seeding when a release step has already run them
+    SKIP_SCHEMA_CHECK: bool = False
+    
     # Environment
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
     
@@ -1,32 +1,88 @@
-from fastapi import Depends, HTTPException, status
+from typing import Optional
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from app.database.connection import get_db
 from app.database.models import User, RoleEnum
-from app.core.auth import verify_token
+from app.core.auth import decode_token
+from app.schemas.schemas import TokenData
+from app.services import token_versions
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
-def get_current_user(
+def get_token_data(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
-):
-    token = credentials.credentials
-    username = verify_token(token)
+) -> TokenData:
+    """Authorize from the signed token claims plus a cached token_version check"""
+    return token_data_from_token(credentials.credentials, db)
+
+def get_stream_token_data(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    token: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+) -> TokenData:
+    """Like get_token_data, but also accepts ?token= since EventSource can't set headers"""
+    raw_token = credentials.credentials if credentials else token
+    if not raw_token:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authenticated"
+        )
+    return token_data_from_token(raw_token, db)
+
+def token_data_from_token(token: str, db: Session) -> TokenData:
+    payload = decode_token(token)
     
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
+    user_id = payload.get("uid")
+    if user_id is None:
+        # Legacy token that only carries the username
+        user = db.query(User.id).filter(User.username == payload["sub"]).first()
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found"
+            )
+        user_id = user.id
+    
+    state = token_versions.get_token_state(db, user_id)
+    if state is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
         )
     
-    if not user.is_active:
+    if payload.get("tv", 0) != state.token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked"
+        )
+    
+    if not state.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Inactive user"
         )
     
+    return TokenData(
+        username=payload["sub"],
+        user_id=user_id,
+        role=state.role,
+        token_version=state.token_version,
+    )
+
+def get_current_user(
+    token_data: TokenData = Depends(get_token_data),
+    db: Session = Depends(get_db)
+):
+    user = db.query(User).filter(User.id == token_data.user_id).first()
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+    
     return user
 
 def require_admin(current_user: User = Depends(get_current_user)):
@@ -37,10 +93,19 @@ def require_admin(current_user: User = Depends(get_current_user)):
         )
     return current_user
 
+def require_admin_token(token_data: TokenData = Depends(get_token_data)):
+    """Like require_admin, for handlers that only need the caller's id"""
+    if token_data.role != RoleEnum.ADMIN.value:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return token_data
+
 def require_tech_writer_or_admin(current_user: User = Depends(get_current_user)):
     if current_user.role not in [RoleEnum.TECH_WRITER, RoleEnum.ADMIN]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Tech Writer or Admin access required"
         )
-    return current_user
\ No newline at end of file
+    return current_user
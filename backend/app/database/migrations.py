@@ -0,0 +1,149 @@
+"""Idempotent schema upgrades for databases created by older releases.
+
+``Base.metadata.create_all`` creates missing tables but never touches
+existing ones, so columns added to a model after a table was first created
+are added here. Every step checks the live schema first and is safe to run
+on every startup.
+"""
+import logging
+
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger(__name__)
+
+
+def _column_names(conn, table_name):
+    return {column["name"] for column in inspect(conn).get_columns(table_name)}
+
+
+def _add_column(conn, table_name, column_name, ddl):
+    if column_name in _column_names(conn, table_name):
+        return False
+    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {ddl}"))
+    logger.info(f"Added column {table_name}.{column_name}")
+    return True
+
+
+def _create_index(conn, index_name, table_name, columns):
+    # IF NOT EXISTS is understood by both PostgreSQL and SQLite
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns})"))
+
+
+def _add_user_token_version(conn):
+    _add_column(conn, "users", "token_version", "INTEGER NOT NULL DEFAULT 0")
+
+
+def _add_comment_lookup_indexes(conn):
+    _create_index(conn, "ix_comments_content_id", "comments", "content_id")
+    _create_index(conn, "ix_comments_parent_id", "comments", "parent_id")
+    _create_index(conn, "ix_comment_likes_comment_id", "comment_likes", "comment_id")
+    _create_index(conn, "ix_comment_likes_user_id", "comment_likes", "user_id")
+
+
+def _add_comment_thread_page_index(conn):
+    _create_index(conn, "ix_comments_thread_page", "comments", "content_id, parent_id, id")
+
+
+def _path_segment_sql(dialect_name):
+    # SQL spelling of models.comment_path_segment
+    if dialect_name == "postgresql":
+        return "lpad(CAST(id AS TEXT), 10, '0') || '/'"
+    return "substr('0000000000' || id, -10, 10) || '/'"
+
+
+def backfill_comment_paths(conn):
+    """Fill comments.path/depth for rows that lack them, one tree level per UPDATE"""
+    segment = _path_segment_sql(conn.dialect.name)
+    updated = conn.execute(text(
+        f"UPDATE comments SET path = {segment}, depth = 0 "
+        "WHERE path IS NULL AND parent_id IS NULL"
+    )).rowcount
+    while True:
+        level = conn.execute(text(
+            "UPDATE comments SET "
+            f"path = (SELECT p.path FROM comments p WHERE p.id = comments.parent_id) || {segment}, "
+            "depth = (SELECT p.depth FROM comments p WHERE p.id = comments.parent_id) + 1 "
+            "WHERE path IS NULL AND parent_id IN (SELECT id FROM comments WHERE path IS NOT NULL)"
+        )).rowcount
+        if not level:
+            break
+        updated += level
+    if updated:
+        logger.info(f"Backfilled materialized paths for {updated} comments")
+
+
+def _add_comment_paths(conn):
+    _add_column(conn, "comments", "path", "VARCHAR")
+    _add_column(conn, "comments", "depth", "INTEGER DEFAULT 0")
+    _create_index(conn, "ix_comments_path", "comments", "path")
+    # Runs on every startup: also picks up replies written while a parent had no path
+    backfill_comment_paths(conn)
+
+
+def _add_subscriber_index(conn):
+    _create_index(conn, "ix_user_categories_category_user", "user_categories", "category_id, user_id")
+
+
+def _add_notification_user_index(conn):
+    _create_index(conn, "ix_notifications_user_id_id", "notifications", "user_id, id")
+
+
+def _backfill_notification_counters(conn):
+    # First run only: later changes keep the counters in step themselves
+    if conn.execute(text("SELECT 1 FROM notification_counters LIMIT 1")).first():
+        return
+    inserted = conn.execute(text(
+        "INSERT INTO notification_counters (user_id, unread_count) "
+        "SELECT user_id, COUNT(*) FROM notifications "
+        "WHERE is_read = false AND user_id IS NOT NULL GROUP BY user_id"
+    )).rowcount
+    if inserted:
+        logger.info(f"Backfilled unread notification counters for {inserted} users")
+
+
+def _add_notification_coalescing(conn):
+    from app.database.models import UNREAD_GROUP_PREDICATE
+    _add_column(conn, "notifications", "group_key", "VARCHAR")
+    _add_column(conn, "notifications", "aggregate_count", "INTEGER NOT NULL DEFAULT 1")
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_notifications_user_group_unread "
+        f"ON notifications (user_id, group_key) WHERE {UNREAD_GROUP_PREDICATE}"
+    ))
+
+
+def _add_notification_inbox_index(conn):
+    _create_index(conn, "ix_notifications_user_created_id", "notifications", "user_id, created_at, id")
+
+
+def _add_moderation_leases(conn):
+    for table_name in ("content", "content_flags"):
+        _add_column(conn, table_name, "claimed_by", "INTEGER")
+        _add_column(conn, table_name, "claim_expires_at", "TIMESTAMP")
+    _create_index(conn, "ix_content_status_created_id", "content", "status, created_at, id")
+    _create_index(conn, "ix_content_flags_resolved_created_id", "content_flags", "is_resolved, created_at, id")
+
+
+def _add_avatar_variants(conn):
+    _add_column(conn, "profiles", "avatar_variants", "TEXT")
+
+
+MIGRATIONS = [
+    _add_user_token_version,
+    _add_comment_lookup_indexes,
+    _add_comment_thread_page_index,
+    _add_comment_paths,
+    _add_subscriber_index,
+    _add_notification_user_index,
+    _backfill_notification_counters,
+    _add_notification_coalescing,
+    _add_notification_inbox_index,
+    _add_moderation_leases,
+    _add_avatar_variants,
+]
+
+
+def run_migrations(engine):
+    """Apply every pending migration step in order"""
+    with engine.begin() as conn:
+        for step in MIGRATIONS:
+            step(conn)
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Enum, Table
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Boolean, DateTime, ForeignKey, Enum, Table, Index
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from app.database.connection import Base
+from datetime import datetime
 import enum
 
 # Association tables for many-to-many relationships
@@ -9,7 +10,9 @@ user_categories = Table(
     'user_categories',
     Base.metadata,
     Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
-    Column('category_id', Integer, ForeignKey('categories.id'), primary_key=True)
+    Column('category_id', Integer, ForeignKey('categories.id'), primary_key=True),
+    # Streams a category's subscribers in user_id order
+    Index('ix_user_categories_category_user', 'category_id', 'user_id')
 )
 
 user_wishlist = Table(
@@ -44,6 +47,16 @@ class FlagReasonEnum(enum.Enum):
     MISINFORMATION = "misinformation"
     OTHER = "other"
 
+class MediaUploadStatusEnum(enum.Enum):
+    UPLOADING = "uploading"
+    COMPLETE = "complete"
+
+class JobStatusEnum(enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
 class NotificationTypeEnum(enum.Enum):
     STATUS_CHANGE = "status_change"
     COMMENT = "comment"
@@ -62,6 +75,8 @@ class User(Base):
     full_name = Column(String)
     role = Column(Enum(RoleEnum), default=RoleEnum.USER)
     is_active = Column(Boolean, default=True)
+    # Bumped to revoke every access/refresh token issued to this user
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -81,6 +96,8 @@ class Profile(Base):
     user_id = Column(Integer, ForeignKey("users.id"), unique=True)
     bio = Column(Text)
     avatar_url = Column(String)
+    # JSON {size: {format: url}} of the avatar's precomputed variants
+    avatar_variants = Column(Text)
     linkedin_url = Column(String)
     github_url = Column(String)
     twitter_url = Column(String)
@@ -124,20 +141,32 @@ class Content(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     published_at = Column(DateTime(timezone=True))
+    # Moderation lease (naive UTC): the admin reviewing this item until it expires
+    claimed_by = Column(Integer, nullable=True)
+    claim_expires_at = Column(DateTime, nullable=True)
     
     author = relationship("User", back_populates="content")
     category = relationship("Category", back_populates="content")
     comments = relationship("Comment", back_populates="content")
     likes = relationship("Like", back_populates="content")
     wishlisted_by = relationship("User", secondary=user_wishlist, back_populates="wishlist")
+    
+    __table_args__ = (
+        # The moderation queue: content in review, oldest first
+        Index("ix_content_status_created_id", "status", "created_at", "id"),
+    )
 
 class Comment(Base):
     __tablename__ = "comments"
     
     id = Column(Integer, primary_key=True, index=True)
-    content_id = Column(Integer, ForeignKey("content.id"))
+    content_id = Column(Integer, ForeignKey("content.id"), index=True)
     author_id = Column(Integer, ForeignKey("users.id"))
-    parent_id = Column(Integer, ForeignKey("comments.id"))  # For nested comments
+    parent_id = Column(Integer, ForeignKey("comments.id"), index=True)  # For nested comments
+    # Materialized path of zero-padded ancestor ids ("0000000012/0000000034/"),
+    # so a whole sub-thread is one indexed prefix/range scan
+    path = Column(String, index=True)
+    depth = Column(Integer, default=0)
     text = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -146,6 +175,23 @@ class Comment(Base):
     author = relationship("User", back_populates="comments")
     parent = relationship("Comment", remote_side=[id])
     replies = relationship("Comment", overlaps="parent")
+    
+    __table_args__ = (
+        # Keyset pages of a thread's top-level comments
+        Index("ix_comments_thread_page", "content_id", "parent_id", "id"),
+    )
+    
+    def assign_path(self, parent=None):
+        """Set path/depth once the comment has an id (after a flush)"""
+        segment = comment_path_segment(self.id)
+        if parent is None:
+            self.path, self.depth = segment, 0
+        elif parent.path is not None:
+            self.path, self.depth = parent.path + segment, (parent.depth or 0) + 1
+        # else: the parent predates paths; the startup backfill fills both in
+
+def comment_path_segment(comment_id: int) -> str:
+    return f"{comment_id:010d}/"
 
 class Like(Base):
     __tablename__ = "likes"
@@ -159,12 +205,15 @@ class Like(Base):
     user = relationship("User", back_populates="likes")
     content = relationship("Content", back_populates="likes")
 
+    # Rollup watermarks assume ids are never reused; SQLite reuses the highest deleted rowid otherwise
+    __table_args__ = {"sqlite_autoincrement": True}
+
 class CommentLike(Base):
     __tablename__ = "comment_likes"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    comment_id = Column(Integer, ForeignKey("comments.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    comment_id = Column(Integer, ForeignKey("comments.id"), index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     user = relationship("User")
@@ -181,6 +230,9 @@ class CommentReport(Base):
     user = relationship("User")
     comment = relationship("Comment")
 
+# Predicate of the partial unique index on notifications (user_id, group_key)
+UNREAD_GROUP_PREDICATE = "is_read = false"
+
 class Notification(Base):
     __tablename__ = "notifications"
     
@@ -191,14 +243,190 @@ class Notification(Base):
     message = Column(Text, nullable=False)
     is_read = Column(Boolean, default=False)
     related_content_id = Column(Integer, ForeignKey("content.id"), nullable=True)
+    # Coalesced notifications: events sharing a group_key merge into one
+    # unread row whose aggregate_count says how many there were
+    group_key = Column(String, nullable=True)
+    aggregate_count = Column(Integer, nullable=False, default=1, server_default="1")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     user = relationship("User", back_populates="notifications")
     
+    __table_args__ = (
+        # Per-user lookups in id order (event stream replay)
+        Index("ix_notifications_user_id_id", "user_id", "id"),
+        # Newest-first inbox pages: user_id = ? ORDER BY created_at DESC, id DESC
+        Index("ix_notifications_user_created_id", "user_id", "created_at", "id"),
+        # The ON CONFLICT target for coalescing: one unread row per group
+        Index(
+            "uq_notifications_user_group_unread", "user_id", "group_key", unique=True,
+            postgresql_where=text(UNREAD_GROUP_PREDICATE),
+            sqlite_where=text(UNREAD_GROUP_PREDICATE),
+        ),
+    )
+    
     @property
     def notification_type_str(self):
         return self.notification_type.value if self.notification_type else None
 
+class NotificationActor(Base):
+    """A user already counted in a coalesced notification's aggregate_count"""
+    __tablename__ = "notification_actors"
+    
+    notification_id = Column(Integer, ForeignKey("notifications.id", ondelete="CASCADE"), primary_key=True)
+    actor_id = Column(Integer, primary_key=True)
+
+class NotificationArchive(Base):
+    """Read notifications past their retention, moved out of the hot table.
+
+    Keeps the original id; no foreign keys and a single index, so it stays
+    cheap to append to.
+    """
+    __tablename__ = "notifications_archive"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=True)
+    notification_type = Column(Enum(NotificationTypeEnum), nullable=True)
+    title = Column(String, nullable=False)
+    message = Column(Text, nullable=False)
+    related_content_id = Column(Integer, nullable=True)
+    aggregate_count = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_notifications_archive_user_created", "user_id", "created_at"),
+    )
+
+class NotificationCounter(Base):
+    """Unread notification count per user, kept in step with notification writes"""
+    __tablename__ = "notification_counters"
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    unread_count = Column(Integer, nullable=False, default=0)
+
+class NotificationFanout(Base):
+    """Progress of notifying a category's subscribers about new content.
+
+    ``last_user_id`` is the resume cursor: every subscriber with a lower or
+    equal id has already been notified.
+    """
+    __tablename__ = "notification_fanouts"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    content_id = Column(Integer, ForeignKey("content.id"), nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
+    exclude_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    notification_type = Column(Enum(NotificationTypeEnum), default=NotificationTypeEnum.STATUS_CHANGE)
+    title = Column(String, nullable=False)
+    message = Column(Text, nullable=False)
+    last_user_id = Column(Integer, nullable=False, default=0)
+    delivered_count = Column(Integer, nullable=False, default=0)
+    is_complete = Column(Boolean, nullable=False, default=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+class Job(Base):
+    """A unit of background work, claimed by workers through the database.
+
+    Times are naive UTC set by the application so that claim comparisons
+    never mix database and application clocks.
+    """
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False, index=True)
+    payload = Column(Text, nullable=False, default="{}")  # JSON
+    status = Column(Enum(JobStatusEnum), nullable=False, default=JobStatusEnum.QUEUED)
+    idempotency_key = Column(String, unique=True, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = Column(DateTime, nullable=True)
+    locked_by = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        # Workers scan for the next runnable job by status and due time
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
+class EngagementRollup(Base):
+    """Views, likes and comments per content item per hour or day (naive UTC buckets)"""
+    __tablename__ = "engagement_rollups"
+    
+    id = Column(Integer, primary_key=True)
+    bucket = Column(String(8), nullable=False)  # "hour" or "day"
+    bucket_start = Column(DateTime, nullable=False)
+    content_id = Column(Integer, nullable=False)
+    # Denormalized from the content row so reports never join back to it
+    category_id = Column(Integer, nullable=True)
+    author_id = Column(Integer, nullable=True)
+    views = Column(Integer, nullable=False, default=0)
+    likes = Column(Integer, nullable=False, default=0)
+    dislikes = Column(Integer, nullable=False, default=0)
+    comments = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index("uq_engagement_rollups_bucket_content", "bucket", "bucket_start", "content_id", unique=True),
+        Index("ix_engagement_rollups_category", "bucket", "category_id", "bucket_start"),
+        Index("ix_engagement_rollups_author", "bucket", "author_id", "bucket_start"),
+    )
+
+class PlatformRollup(Base):
+    """Site-wide counts per hour or day that are not tied to a content item"""
+    __tablename__ = "platform_rollups"
+    
+    id = Column(Integer, primary_key=True)
+    bucket = Column(String(8), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    registrations = Column(Integer, nullable=False, default=0)
+    content_created = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index("uq_platform_rollups_bucket", "bucket", "bucket_start", unique=True),
+    )
+
+class RollupWatermark(Base):
+    """Highest source row id already folded into the rollups, per source table"""
+    __tablename__ = "rollup_watermarks"
+    
+    source = Column(String, primary_key=True)
+    last_id = Column(Integer, nullable=False, default=0)
+
+class StoredObject(Base):
+    """A content-addressed file in upload storage and the number of references to it"""
+    __tablename__ = "stored_objects"
+    
+    key = Column(String, primary_key=True)  # sha256 hex + "." + extension
+    size = Column(BigInteger, nullable=False)
+    content_type = Column(String, nullable=False)
+    refcount = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class MediaUpload(Base):
+    """A resumable upload of an audio or video file, ``upload_offset`` bytes in so far"""
+    __tablename__ = "media_uploads"
+    
+    id = Column(String, primary_key=True)  # random hex; the upload URL is its capability
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    filename = Column(String, nullable=False)
+    extension = Column(String, nullable=False)
+    total_size = Column(BigInteger, nullable=False)
+    upload_offset = Column(BigInteger, nullable=False, default=0)
+    status = Column(Enum(MediaUploadStatusEnum), nullable=False, default=MediaUploadStatusEnum.UPLOADING)
+    key = Column(String, nullable=True)  # stored object, once complete
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # The cleanup job looks for uploads that stopped receiving chunks
+        Index("ix_media_uploads_status_updated", "status", "updated_at"),
+    )
+
 class ContentFlag(Base):
     __tablename__ = "content_flags"
     
@@ -211,4 +439,12 @@ class ContentFlag(Base):
     resolved_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     resolved_at = Column(DateTime(timezone=True), nullable=True)
     admin_notes = Column(Text, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    # Moderation lease (naive UTC): the admin reviewing this flag until it expires
+    claimed_by = Column(Integer, nullable=True)
+    claim_expires_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        # The moderation queue: unresolved flags, oldest first
+        Index("ix_content_flags_resolved_created_id", "is_resolved", "created_at", "id"),
+    )
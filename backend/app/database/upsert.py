@@ -0,0 +1,20 @@
+"""``INSERT ... ON CONFLICT`` for the databases we run on.
+
+PostgreSQL and SQLite share the ``on_conflict_do_update`` /
+``on_conflict_do_nothing`` API, but each dialect ships its own ``insert``
+construct.
+"""
+from sqlalchemy.dialects import postgresql, sqlite
+
+_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def dialect_insert(conn, table):
+    """An upsert-capable insert for ``table`` in the dialect of ``conn``"""
+    try:
+        return _INSERTS[conn.dialect.name](table)
+    except KeyError:
+        raise NotImplementedError(f"Upserts are not supported on {conn.dialect.name}")
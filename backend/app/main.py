@@ -1,20 +1,83 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from app.database.connection import engine
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.database.connection import engine, get_db
 from app.database.models import Base
-from app.routes import auth, users, content, comments, categories, notifications, wishlist, admin_enhanced
+from app.database.migrations import run_migrations
+from sqlalchemy.orm import Session
+from app.services import category_catalogue
+from app.routes import auth, users, content, comments, categories, notifications, wishlist, admin_enhanced, media, media_uploads
+import asyncio
 import logging
 import os
-
-# Import seed function
-from seed_final import seed_database
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Moringa TechHub API", version="1.0.0")
+
+def init_database():
+    """Create missing tables, apply migrations and seed if SEED_ON_START is set"""
+    try:
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
+        logger.info("Database tables created successfully")
+        
+        # Seed database if requested
+        if os.getenv("SEED_ON_START", "false").lower() == "true":
+            logger.info("Seeding database on startup...")
+            try:
+                # Imported here: the seed data is large and only needed on this path
+                from seed_final import seed_database
+                seed_database()
+                logger.info("Database seeded successfully")
+            except Exception as e:
+                logger.error(f"Database seeding failed: {e}")
+                
+    except Exception as e:
+        logger.error(f"Database connection failed: {e}")
+        logger.info("The API will start but database operations will fail until database is properly configured")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing touches the database until the server starts: importing the app stays cheap
+    from app.services.jobs import start_workers, stop_workers
+    from app.services.analytics import start_view_flusher, stop_view_flusher
+    from app.services.images import variants_dir
+    from app.services import warmup
+    
+    started = time.perf_counter()
+    if settings.SKIP_SCHEMA_CHECK:
+        logger.info("Skipping schema check and seeding (SKIP_SCHEMA_CHECK)")
+    else:
+        await run_in_threadpool(init_database)
+    os.makedirs(variants_dir(), exist_ok=True)
+    # Jobs left running by a crashed process are picked up once their lease expires
+    start_workers(engine)
+    start_view_flusher(engine)
+    # Hot caches fill in the background; /health reports ready once they have
+    warming = None
+    if settings.WARMUP_ENABLED:
+        warming = asyncio.create_task(warmup.run_warmup(engine))
+    else:
+        warmup.mark_disabled()
+    logger.info(f"Startup finished in {(time.perf_counter() - started) * 1000:.0f} ms")
+    try:
+        yield
+    finally:
+        if warming is not None and not warming.done():
+            warming.cancel()
+        stop_workers()
+        stop_view_flusher(engine)
+
+
+app = FastAPI(title="Moringa TechHub API", version="1.0.0", lifespan=lifespan)
 
 # Configure CORS middleware - MUST be added right after app creation
 app.add_middleware(
@@ -31,24 +94,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create database tables with error handling
-try:
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database tables created successfully")
-    
-    # Seed database if requested
-    if os.getenv("SEED_ON_START", "false").lower() == "true":
-        logger.info("Seeding database on startup...")
-        try:
-            seed_database()
-            logger.info("Database seeded successfully")
-        except Exception as e:
-            logger.error(f"Database seeding failed: {e}")
-            
-except Exception as e:
-    logger.error(f"Database connection failed: {e}")
-    logger.info("The API will start but database operations will fail until database is properly configured")
-
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(users.router, prefix="/api/users", tags=["Users"])
@@ -58,29 +103,25 @@ app.include_router(comments.router, prefix="/api/comments", tags=["Comments"])
 app.include_router(notifications.router, prefix="/api/notifications", tags=["Notifications"])
 app.include_router(wishlist.router, prefix="/api/wishlist", tags=["Wishlist"])
 app.include_router(admin_enhanced.router, prefix="/api/admin", tags=["Admin"])
+# Content-addressed uploads (app.services.storage)
+app.include_router(media.router, prefix="/media", tags=["Media"])
+app.include_router(media_uploads.router, prefix="/api/uploads", tags=["Media"])
 
 # Add simple categories routes directly to bypass router issues
 @app.get("/api/categories")
-def get_categories_direct():
+def get_categories_direct(db: Session = Depends(get_db)):
     try:
-        from app.database.connection import get_db
-        from app.database.models import Category
-        db = next(get_db())
-        categories = db.query(Category).all()
-        return [{"id": c.id, "name": c.name, "description": c.description, "color": c.color} for c in categories]
+        return [category.as_dict() for category in category_catalogue.list_categories(db)]
     except Exception as e:
         return [{"id": 1, "name": "Web Development", "description": "Web dev content", "color": "#3B82F6"}]
 
 @app.post("/api/categories")
-def create_category_direct(data: dict):
+def create_category_direct(data: dict, db: Session = Depends(get_db)):
     try:
-        from app.database.connection import get_db
         from app.database.models import Category
-        db = next(get_db())
         
         # Check if category already exists
-        existing = db.query(Category).filter(Category.name == data.get("name")).first()
-        if existing:
+        if category_catalogue.find_category_by_name(db, data.get("name")):
             return {"error": "Category already exists"}
             
         category = Category(
@@ -113,12 +154,18 @@ if os.getenv("PERSISTENT_STORAGE"):
     uploads_path = os.getenv("PERSISTENT_STORAGE")
 else:
     uploads_path = os.path.join(os.path.dirname(__file__), "..", "uploads")
+# Avatar variants are named by content hash; mounted first so /uploads does not shadow them
+from app.services.images import VARIANTS_URL_PREFIX, variants_dir
+from app.utils.static_files import ImmutableStaticFiles, MediaStaticFiles
+# The directory is created by the lifespan handler
+app.mount(VARIANTS_URL_PREFIX, ImmutableStaticFiles(directory=variants_dir(), check_dir=False), name="avatar-variants")
+# Range requests, conditional GETs and per-path Cache-Control (MEDIA_CACHE_CONTROL)
 if os.path.exists(uploads_path):
-    app.mount("/uploads", StaticFiles(directory=uploads_path), name="uploads")
+    app.mount("/uploads", MediaStaticFiles(directory=uploads_path), name="uploads")
     # Also serve avatars directly
     avatars_path = os.path.join(uploads_path, "avatars")
     if os.path.exists(avatars_path):
-        app.mount("/avatars", StaticFiles(directory=avatars_path), name="avatars")
+        app.mount("/avatars", MediaStaticFiles(directory=avatars_path), name="avatars")
 
 @app.options("/{path:path}")
 async def options_handler(path: str):
@@ -138,14 +185,18 @@ async def root():
 
 @app.get("/health")
 async def health_check():
+    from app.services import warmup
+    # Not ready (503) while caches are still warming, so no traffic is routed here yet
+    readiness = {"ready": warmup.is_ready(), "warmup": warmup.report()}
     try:
         # Test database connection
         from sqlalchemy import text
         with engine.connect() as conn:
             conn.execute(text("SELECT 1"))
-        return {"status": "healthy", "database": "connected", "version": "1.0.1"}
+        body = {"status": "healthy", "database": "connected", "version": "1.0.1", **readiness}
     except Exception as e:
-        return {"status": "unhealthy", "database": "disconnected", "error": str(e)}
+        body = {"status": "unhealthy", "database": "disconnected", "error": str(e), **readiness}
+    return JSONResponse(content=jsonable_encoder(body), status_code=200 if readiness["ready"] else 503)
 
 @app.get("/debug")
 async def debug_routes():
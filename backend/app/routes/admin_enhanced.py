@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Path
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, desc, func
 from typing import List, Optional
@@ -9,9 +10,13 @@ from app.database.models import (
     User, Profile, Content, ContentFlag, RoleEnum, Category,
     FlagReasonEnum, Notification, NotificationTypeEnum, ContentStatusEnum
 )
-from app.schemas.schemas import UserCreate, UserResponse, ContentResponse, CategoryResponse
+from app.schemas.schemas import (
+    UserCreate, UserResponse, ContentResponse, CategoryResponse,
+    BulkModerationRequest, BulkFlagRequest, BulkResolveFlagsRequest, BulkModerationResponse
+)
 from app.core.dependencies import get_current_user, require_admin
 from app.core.auth import get_password_hash
+from app.services import admin_stats, moderation, token_versions
 
 router = APIRouter()
 
@@ -116,6 +121,7 @@ def deactivate_user(
     
     user.is_active = False
     db.commit()
+    token_versions.revoke_user_tokens(db, user.id)
     
     return {"message": f"User {user.username} deactivated successfully"}
 
@@ -132,6 +138,7 @@ def activate_user(
     
     user.is_active = True
     db.commit()
+    token_versions.invalidate(user.id)
     
     return {"message": f"User {user.username} activated successfully"}
 
@@ -169,6 +176,8 @@ def update_user_role(
     
     user.role = new_role
     db.commit()
+    # Tokens carry the role claim, so a role change revokes them
+    token_versions.revoke_user_tokens(db, user.id)
     
     return {"message": f"User role updated to {new_role.value}"}
 
@@ -417,6 +426,117 @@ def resolve_flag(
     db.commit()
     return {"message": f"Flag {action}d successfully"}
 
+# =========================
+# Bulk Moderation (Admin)
+# =========================
+
+def _bulk_response(results):
+    return {
+        "changed": sum(1 for item in results if item["status"] not in (moderation.UNCHANGED, moderation.NOT_FOUND)),
+        "results": results
+    }
+
+@router.post("/moderation/content/approve", response_model=BulkModerationResponse)
+def bulk_approve_content(
+    request: BulkModerationRequest,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Approve many content items in one transaction"""
+    results = moderation.approve_content(db, request.ids)
+    db.commit()
+    return _bulk_response(results)
+
+@router.post("/moderation/content/reject", response_model=BulkModerationResponse)
+def bulk_reject_content(
+    request: BulkModerationRequest,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Reject many content items in one transaction"""
+    results = moderation.reject_content(db, request.ids)
+    db.commit()
+    return _bulk_response(results)
+
+@router.post("/moderation/content/flag", response_model=BulkModerationResponse)
+def bulk_flag_content(
+    request: BulkFlagRequest,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Flag many content items for review in one transaction"""
+    results = moderation.flag_content(db, request.ids, current_user.id, request.reason)
+    db.commit()
+    return _bulk_response(results)
+
+@router.post("/moderation/flags/resolve", response_model=BulkModerationResponse)
+def bulk_resolve_flags(
+    request: BulkResolveFlagsRequest,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Resolve many content flags in one transaction"""
+    results = moderation.resolve_flags(db, request.ids, current_user.id, request.action, request.admin_notes)
+    db.commit()
+    return _bulk_response(results)
+
+@router.post("/moderation/queue/{queue}/claim")
+def claim_moderation_items(
+    queue: str = Path(..., pattern="^(content|flags)$"),
+    limit: int = Query(10, ge=1),
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Lease the next items of a moderation queue to the current admin, oldest first"""
+    from app.core.config import settings
+    ids = moderation.claim_items(db, queue, current_user.id, min(limit, settings.MODERATION_CLAIM_MAX))
+    model = Content if queue == "content" else ContentFlag
+    by_id = {item.id: item for item in db.query(model).filter(model.id.in_(ids)).all()} if ids else {}
+    items = []
+    for item_id in ids:
+        item = by_id[item_id]
+        if queue == "content":
+            items.append({
+                "id": item.id,
+                "title": item.title,
+                "content_type": item.content_type.value if item.content_type else None,
+                "author_id": item.author_id,
+                "category_id": item.category_id,
+                "created_at": item.created_at,
+                "claim_expires_at": item.claim_expires_at
+            })
+        else:
+            items.append({
+                "id": item.id,
+                "content_id": item.content_id,
+                "flagged_by": item.flagged_by,
+                "reason": item.reason.value if item.reason else None,
+                "description": item.description,
+                "created_at": item.created_at,
+                "claim_expires_at": item.claim_expires_at
+            })
+    return {"queue": queue, "items": items}
+
+@router.post("/moderation/queue/{queue}/release", response_model=BulkModerationResponse)
+def release_moderation_items(
+    request: BulkModerationRequest,
+    queue: str = Path(..., pattern="^(content|flags)$"),
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Hand claimed items back to the queue before their lease expires"""
+    results = moderation.release_items(db, queue, current_user.id, request.ids)
+    db.commit()
+    return _bulk_response(results)
+
+@router.get("/moderation/queue/stats")
+def get_moderation_queue_stats(
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Depth, leases and age of the moderation queues"""
+    return moderation.queue_stats(db)
+
 # =========================
 # Dashboard Stats (Admin)
 # =========================
@@ -440,36 +560,245 @@ def seed_database_endpoint(
 
 @router.get("/stats")
 def get_admin_stats(
+    fresh: bool = False,
     current_user: User = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
-    """Get platform statistics for admin dashboard"""
-    total_users = db.query(User).count()
-    active_users = db.query(User).filter(User.is_active == True).count()
-    total_content = db.query(Content).count()
-    published_content = db.query(Content).filter(Content.status == ContentStatusEnum.PUBLISHED).count()
-    pending_content = db.query(Content).filter(Content.status == ContentStatusEnum.REVIEW).count()
-    pending_flags = db.query(ContentFlag).filter(ContentFlag.is_resolved == False).count()
-    
-    # User role breakdown
-    admins = db.query(User).filter(User.role == RoleEnum.ADMIN).count()
-    tech_writers = db.query(User).filter(User.role == RoleEnum.TECH_WRITER).count()
-    regular_users = db.query(User).filter(User.role == RoleEnum.USER).count()
-    
-    return {
-        "users": {
-            "total": total_users,
-            "active": active_users,
-            "admins": admins,
-            "tech_writers": tech_writers,
-            "regular_users": regular_users
-        },
-        "content": {
-            "total": total_content,
-            "published": published_content,
-            "pending_approval": pending_content
-        },
-        "moderation": {
-            "pending_flags": pending_flags
+    """Get platform statistics for admin dashboard (cached briefly; ?fresh=true for exact numbers)"""
+    return admin_stats.get_admin_stats(db, fresh=fresh)
+
+@router.get("/cache/warmup")
+def get_cache_warmup(current_user: User = Depends(require_admin)):
+    """Outcome and timing of the last cache warm-up"""
+    from app.services import warmup
+    return warmup.report()
+
+@router.post("/cache/warmup")
+async def run_cache_warmup(
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Reload the hot caches now, e.g. after a bulk import; /health stays ready meanwhile"""
+    from app.services import warmup
+    if warmup.rewarm_running():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A cache warm-up is already running")
+    return await warmup.run_warmup(db.get_bind(), rewarm=True)
+
+# =========================
+# Background Jobs (Admin)
+# =========================
+
+@router.get("/jobs/stats")
+def get_job_queue_stats(
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Background job queue depth and lag"""
+    from app.services.jobs import queue_stats
+    return queue_stats(db)
+
+@router.get("/jobs/failed")
+def get_failed_jobs(
+    limit: int = Query(50, ge=1, le=500),
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Most recent jobs that exhausted their retries"""
+    from app.database.models import Job, JobStatusEnum
+    jobs = db.query(Job).filter(
+        Job.status == JobStatusEnum.FAILED
+    ).order_by(desc(Job.finished_at)).limit(limit).all()
+    return [
+        {
+            "id": job.id,
+            "kind": job.kind,
+            "attempts": job.attempts,
+            "last_error": job.last_error,
+            "created_at": job.created_at,
+            "finished_at": job.finished_at
         }
-    }
\ No newline at end of file
+        for job in jobs
+    ]
+
+@router.post("/jobs/{job_id}/retry")
+def retry_job(
+    job_id: int,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Queue a failed job to run again with a fresh set of attempts"""
+    from app.database.models import Job, JobStatusEnum
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != JobStatusEnum.FAILED:
+        raise HTTPException(status_code=400, detail="Only failed jobs can be retried")
+    
+    job.status = JobStatusEnum.QUEUED
+    job.attempts = 0
+    job.run_at = datetime.utcnow()
+    job.finished_at = None
+    db.commit()
+    return {"message": "Job queued for retry"}
+
+# =========================
+# Storage (Admin)
+# =========================
+
+@router.get("/storage")
+def get_storage_stats(
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Sizes of the largest tables"""
+    from app.services.retention import table_sizes
+    return {"tables": table_sizes(db)}
+
+@router.post("/notifications/compact", status_code=status.HTTP_202_ACCEPTED)
+def compact_notifications(
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Run notification retention now instead of waiting for the daily job"""
+    from app.services.jobs import enqueue
+    job = enqueue(db, "notifications.compact")
+    db.commit()
+    return {"message": "Notification compaction queued", "job_id": job.id}
+
+# =========================
+# Analytics (Admin)
+# =========================
+
+def _analytics_range(bucket: str, start: Optional[datetime], end: Optional[datetime]):
+    from app.services.analytics import report_range
+    try:
+        return report_range(bucket, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/analytics/engagement")
+def get_engagement_analytics(
+    bucket: str = Query("day", pattern="^(hour|day)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    content_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    author_id: Optional[int] = None,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Views, likes, dislikes and comments per bucket, from the rollups"""
+    from app.services.analytics import engagement_series
+    start, end = _analytics_range(bucket, start, end)
+    return {
+        "bucket": bucket,
+        "start": start,
+        "end": end,
+        "series": engagement_series(
+            db, bucket, start, end,
+            content_id=content_id, category_id=category_id, author_id=author_id
+        )
+    }
+
+@router.get("/analytics/platform")
+def get_platform_analytics(
+    bucket: str = Query("day", pattern="^(hour|day)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Registrations and new content per bucket, from the rollups"""
+    from app.services.analytics import platform_series
+    start, end = _analytics_range(bucket, start, end)
+    return {"bucket": bucket, "start": start, "end": end, "series": platform_series(db, bucket, start, end)}
+
+@router.get("/analytics/top-content")
+def get_top_content_analytics(
+    metric: str = Query("views", pattern="^(views|likes|dislikes|comments)$"),
+    bucket: str = Query("day", pattern="^(hour|day)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(10, ge=1, le=100),
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Content ranked by one metric over a range, from the rollups"""
+    from app.services.analytics import top_content
+    start, end = _analytics_range(bucket, start, end)
+    return {
+        "metric": metric,
+        "start": start,
+        "end": end,
+        "items": top_content(db, bucket, start, end, metric, limit)
+    }
+
+# =========================
+# Exports (Admin)
+# =========================
+
+def _export_response(db: Session, dataset: str, query, format: str, gzip: bool):
+    from app.services.exports import FORMATS, export_filename, export_rows
+    filename = export_filename(dataset, format, gzip)
+    return StreamingResponse(
+        export_rows(db.get_bind(), query, format, gzip=gzip),
+        media_type="application/gzip" if gzip else FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/export/users")
+def export_users(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    role: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Stream every user matching the filters as NDJSON or CSV"""
+    from app.services.exports import users_query
+    role_enum = None
+    if role:
+        try:
+            role_enum = RoleEnum(role.lower())
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown role '{role}'")
+    return _export_response(db, "users", users_query(role=role_enum, is_active=is_active), format, gzip)
+
+@router.get("/export/content")
+def export_content(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    category_id: Optional[int] = None,
+    status: Optional[ContentStatusEnum] = None,
+    author_id: Optional[int] = None,
+    is_flagged: Optional[bool] = None,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Stream every content item matching the filters as NDJSON or CSV"""
+    from app.services.exports import content_query
+    query = content_query(category_id=category_id, status=status, author_id=author_id, is_flagged=is_flagged)
+    return _export_response(db, "content", query, format, gzip)
+
+@router.get("/export/engagement")
+def export_engagement(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    bucket: str = Query("day", pattern="^(hour|day)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    content_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    author_id: Optional[int] = None,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Stream engagement rollup rows matching the filters as NDJSON or CSV"""
+    from app.services.analytics import utc_naive
+    from app.services.exports import engagement_query
+    query = engagement_query(
+        bucket=bucket, start=utc_naive(start), end=utc_naive(end),
+        content_id=content_id, category_id=category_id, author_id=author_id
+    )
+    return _export_response(db, "engagement", query, format, gzip)
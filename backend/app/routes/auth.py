@@ -1,8 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body, UploadFile, File, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Request
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
+import logging
 import os
-import uuid
 from typing import Optional
 
 from app.database.connection import get_db
@@ -17,9 +17,15 @@ from app.schemas.schemas import (
 from app.core.auth import (
     verify_password,
     get_password_hash,
-    create_access_token,
+    create_token_pair,
+    decode_token,
+    REFRESH_TOKEN_TYPE,
 )
 from app.core.dependencies import get_current_user
+from app.services import token_versions
+from app.services.rate_limit import rate_limit
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["Authentication"])
 
@@ -28,7 +34,7 @@ router = APIRouter(tags=["Authentication"])
 # Register
 # =========================
 
-@router.post("/register")
+@router.post("/register", dependencies=[Depends(rate_limit("auth.register"))])
 def register(request_data: dict = Body(...), db: Session = Depends(get_db)):
     try:
         # Extract and validate data
@@ -64,9 +70,11 @@ def register(request_data: dict = Body(...), db: Session = Depends(get_db)):
                 db.commit()
                 db.refresh(existing_user_by_email)
                 
-                access_token = create_access_token(data={"sub": existing_user_by_email.username})
+                # Reactivation changes is_active, so drop the cached token state
+                token_versions.invalidate(existing_user_by_email.id)
+                tokens = create_token_pair(existing_user_by_email)
                 return {
-                    "token": access_token,
+                    **tokens,
                     "user": {
                         "id": existing_user_by_email.id,
                         "username": existing_user_by_email.username,
@@ -118,11 +126,11 @@ def register(request_data: dict = Body(...), db: Session = Depends(get_db)):
             db.rollback()
             raise
 
-        # Create token
-        access_token = create_access_token(data={"sub": db_user.username})
+        # Create tokens
+        tokens = create_token_pair(db_user)
 
         return {
-            "token": access_token,
+            **tokens,
             "user": {
                 "id": db_user.id,
                 "username": db_user.username,
@@ -156,7 +164,7 @@ def register(request_data: dict = Body(...), db: Session = Depends(get_db)):
 # Login
 # =========================
 
-@router.post("/login")
+@router.post("/login", dependencies=[Depends(rate_limit("auth.login"))])
 def login(request_data: dict = Body(...), db: Session = Depends(get_db)):
     try:
         email = request_data.get('email', '').strip().lower()
@@ -199,10 +207,10 @@ def login(request_data: dict = Body(...), db: Session = Depends(get_db)):
             raise HTTPException(status_code=403, detail="Your account has been deactivated. Please contact an administrator.")
         
         # User is active, proceed with login
-        access_token = create_access_token(data={"sub": user.username})
+        tokens = create_token_pair(user)
 
         return {
-            "token": access_token,
+            **tokens,
             "user": {
                 "id": user.id,
                 "username": user.username,
@@ -220,6 +228,39 @@ def login(request_data: dict = Body(...), db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Login failed: {str(e)}")
 
 
+# =========================
+# Token refresh / revocation
+# =========================
+
+@router.post("/refresh")
+def refresh_token(request_data: dict = Body(...), db: Session = Depends(get_db)):
+    """Exchange a refresh token for a new access/refresh token pair"""
+    token = request_data.get('refresh_token', '')
+    if not token:
+        raise HTTPException(status_code=400, detail="Refresh token is required")
+    
+    payload = decode_token(token, expected_type=REFRESH_TOKEN_TYPE)
+    user_id = payload.get("uid")
+    state = token_versions.get_token_state(db, user_id) if user_id is not None else None
+    if state is None or payload.get("tv", 0) != state.token_version:
+        raise HTTPException(status_code=401, detail="Refresh token has been revoked")
+    if not state.is_active:
+        raise HTTPException(status_code=403, detail="Your account has been deactivated. Please contact an administrator.")
+    
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    
+    return create_token_pair(user)
+
+
+@router.post("/logout-all")
+def logout_all_sessions(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Revoke every access and refresh token issued to the current user"""
+    token_versions.revoke_user_tokens(db, current_user.id)
+    return {"message": "All sessions have been signed out"}
+
+
 # =========================
 # Current user
 # =========================
@@ -243,6 +284,7 @@ def get_me(current_user: User = Depends(get_current_user), db: Session = Depends
             "user_id": user.profile.user_id,
             "bio": user.profile.bio,
             "avatar_url": user.profile.avatar_url,
+            "avatar_variants": user.profile.avatar_variants,
             "linkedin_url": user.profile.linkedin_url,
             "github_url": user.profile.github_url,
             "twitter_url": user.profile.twitter_url,
@@ -287,6 +329,11 @@ def update_profile(
     if profile_fields_data:
         profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
         if profile:
+            if profile_fields_data.get('avatar_url', profile.avatar_url) != profile.avatar_url:
+                # The stored avatar and its variants are being replaced
+                from app.services.images import release_avatar
+                release_avatar(db, profile)
+                profile.avatar_variants = None
             for field, value in profile_fields_data.items():
                 setattr(profile, field, value)
             print(f"DEBUG: Updated existing profile: {profile.bio}")
@@ -316,6 +363,7 @@ def update_profile(
             "user_id": user.profile.user_id,
             "bio": user.profile.bio,
             "avatar_url": user.profile.avatar_url,
+            "avatar_variants": user.profile.avatar_variants,
             "linkedin_url": user.profile.linkedin_url,
             "github_url": user.profile.github_url,
             "twitter_url": user.profile.twitter_url,
@@ -328,77 +376,41 @@ def update_profile(
 @router.post("/upload-avatar")
 async def upload_avatar(
     request: Request,
-    file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     from app.database.models import Profile
     from sqlalchemy.orm import joinedload
+    from starlette.concurrency import run_in_threadpool
+    from app.services import storage
+    from app.services.images import create_avatar_variants, encode_variants, release_avatar
+    from app.services.uploads import read_upload, save_upload, staging_dir
     
-    # Validate file type
-    if not file.content_type.startswith('image/'):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="File must be an image"
-        )
-    
-    # Create uploads directory if it doesn't exist
-    # Use persistent storage on Render, local storage for development
-    if os.getenv("PERSISTENT_STORAGE"):
-        uploads_dir = os.getenv("PERSISTENT_STORAGE")
-        os.makedirs(uploads_dir, exist_ok=True)
-    else:
-        uploads_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "uploads", "avatars"))
-        os.makedirs(uploads_dir, exist_ok=True)
-    
-    # Generate unique filename
-    file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'jpg'
-    unique_filename = f"{uuid.uuid4()}.{file_extension}"
-    file_path = os.path.join(uploads_dir, unique_filename)
-    
-    # Save file
+    # The form is read only now, after authentication, and never past the size cap
+    file = await read_upload(request, "file")
     try:
-        print(f"Saving file to: {file_path}")
-        print(f"Uploads directory: {uploads_dir}")
-        print(f"Unique filename: {unique_filename}")
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        print(f"File saved successfully. Size: {len(content)} bytes")
-        
-        # Verify file exists immediately after saving
-        if os.path.exists(file_path):
-            print(f"✅ File verified at: {file_path}")
-            print(f"File size: {os.path.getsize(file_path)} bytes")
-        else:
-            print(f"❌ File NOT found at: {file_path}")
-            
-    except Exception as e:
-        print(f"Error saving file: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to save file: {str(e)}"
-        )
-    
-    # Update user's avatar_url in profile
-    avatar_url = f"/uploads/avatars/{unique_filename}"
-    
-    # Verify file exists
-    if not os.path.exists(file_path):
-        print(f"ERROR: File was not saved at {file_path}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="File was not saved successfully"
-        )
-    
-    print(f"File verified at: {file_path}")
-    print(f"Avatar URL: {avatar_url}")
+        # Streamed to disk on a worker thread; type and size are checked on the way
+        filename, size = await save_upload(file, staging_dir())
+    finally:
+        await file.close()
+    staged_path = os.path.join(staging_dir(), filename)
+    try:
+        # Identical bytes already in storage are referenced, not stored again
+        key = await run_in_threadpool(storage.store_file, db, staged_path, filename.rsplit(".", 1)[1])
+        # Fixed-size variants for feeds and headers, rendered on the image pool
+        avatar_variants = encode_variants(await create_avatar_variants(db, staged_path))
+    finally:
+        os.unlink(staged_path)
+    avatar_url = storage.media_url(key)
+    logger.info(f"Stored avatar for user {current_user.id}: {key} ({size} bytes)")
     
     profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
     if profile:
+        release_avatar(db, profile)
         profile.avatar_url = avatar_url
+        profile.avatar_variants = avatar_variants
     else:
-        profile = Profile(user_id=current_user.id, avatar_url=avatar_url)
+        profile = Profile(user_id=current_user.id, avatar_url=avatar_url, avatar_variants=avatar_variants)
         db.add(profile)
     
     db.commit()
@@ -407,11 +419,7 @@ async def upload_avatar(
     user = db.query(User).options(joinedload(User.profile)).filter(User.id == current_user.id).first()
     
     # Return full URL for frontend
-    # Get the base URL from the request
     base_url = f"{request.url.scheme}://{request.url.netloc}"
-    full_avatar_url = f"{base_url}{avatar_url}" if avatar_url else None
-    
-    print(f"DEBUG: Returning avatar_url: {full_avatar_url}")
-    print(f"DEBUG: User profile.avatar_url: {user.profile.avatar_url if user.profile else 'No profile'}")
+    full_avatar_url = f"{base_url}{avatar_url}"
     
-    return {"avatar_url": full_avatar_url, "user": user}
+    return {"avatar_url": full_avatar_url, "user": UserResponse.model_validate(user)}
@@ -1,61 +1,134 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import func
+from typing import Dict, List, Optional, Set
 from app.database.connection import get_db
 from app.database.models import User, Content, Comment, RoleEnum, CommentLike, CommentReport
 from app.schemas.schemas import CommentCreate, CommentResponse
 from app.core.dependencies import get_current_user
+from app.services.rate_limit import rate_limit
+from app.utils.pagination import encode_cursor, decode_id_cursor
 
 router = APIRouter()
 
+DEFAULT_PAGE_SIZE = 20
+MAX_REPLY_DEPTH = 10
+
+def get_comment_like_counts(db: Session, comment_ids: List[int]) -> Dict[int, int]:
+    """Like counts for many comments in one grouped query"""
+    if not comment_ids:
+        return {}
+    rows = db.query(CommentLike.comment_id, func.count(CommentLike.id)).filter(
+        CommentLike.comment_id.in_(comment_ids)
+    ).group_by(CommentLike.comment_id).all()
+    return dict(rows)
+
+def get_liked_comment_ids(db: Session, comment_ids: List[int], user_id: Optional[int]) -> Set[int]:
+    """Which of the given comments the user has liked, in one IN query"""
+    if not comment_ids or user_id is None:
+        return set()
+    rows = db.query(CommentLike.comment_id).filter(
+        CommentLike.user_id == user_id,
+        CommentLike.comment_id.in_(comment_ids)
+    ).all()
+    return {row[0] for row in rows}
+
+def get_reply_counts(db: Session, comment_ids: List[int]) -> Dict[int, int]:
+    """Number of direct replies for many comments in one grouped query"""
+    if not comment_ids:
+        return {}
+    rows = db.query(Comment.parent_id, func.count(Comment.id)).filter(
+        Comment.parent_id.in_(comment_ids)
+    ).group_by(Comment.parent_id).all()
+    return dict(rows)
+
+def serialize_comment(comment: Comment, likes_counts: Dict[int, int], liked_ids: Set[int]) -> dict:
+    author = comment.author
+    return {
+        "id": comment.id,
+        "text": comment.text,
+        "created_at": comment.created_at,
+        "updated_at": comment.updated_at,
+        "author_id": comment.author_id,
+        "content_id": comment.content_id,
+        "parent_id": comment.parent_id,
+        # Only the public author fields, never the full User row
+        "author": {
+            "id": author.id,
+            "username": author.username,
+            "full_name": author.full_name,
+            "role": author.role.value if author.role else None,
+        } if author else None,
+        "likes_count": likes_counts.get(comment.id, 0),
+        "is_liked": comment.id in liked_ids,
+        "reply_count": 0,
+        "replies": []
+    }
+
 def build_comment_tree(comments: List[Comment], db: Session, current_user: User = None) -> List[dict]:
     """Build nested comment structure"""
+    comment_ids = [comment.id for comment in comments]
+    likes_counts = get_comment_like_counts(db, comment_ids)
+    liked_ids = get_liked_comment_ids(db, comment_ids, current_user.id if current_user else None)
+    
     comment_dict = {}
     root_comments = []
     
     # First pass: create comment objects
     for comment in comments:
-        # Get like count and check if current user liked this comment
-        likes_count = db.query(CommentLike).filter(CommentLike.comment_id == comment.id).count()
-        is_liked = False
-        if current_user:
-            user_like = db.query(CommentLike).filter(
-                CommentLike.comment_id == comment.id,
-                CommentLike.user_id == current_user.id
-            ).first()
-            is_liked = user_like is not None
-        
-        comment_data = {
-            "id": comment.id,
-            "text": comment.text,
-            "created_at": comment.created_at,
-            "updated_at": comment.updated_at,
-            "author_id": comment.author_id,
-            "content_id": comment.content_id,
-            "parent_id": comment.parent_id,
-            "author": comment.author,
-            "likes_count": likes_count,
-            "is_liked": is_liked,
-            "replies": []
-        }
-        comment_dict[comment.id] = comment_data
-    
-    # Second pass: build tree structure
+        comment_dict[comment.id] = serialize_comment(comment, likes_counts, liked_ids)
+    
+    # Second pass: attach each comment to its parent (dict lookups keep this linear)
     for comment in comments:
+        node = comment_dict[comment.id]
         if comment.parent_id is None:
-            root_comments.append(comment_dict[comment.id])
+            root_comments.append(node)
         else:
-            if comment.parent_id in comment_dict:
-                comment_dict[comment.parent_id]["replies"].append(comment_dict[comment.id])
+            parent = comment_dict.get(comment.parent_id)
+            if parent is not None:
+                parent["replies"].append(node)
+                parent["reply_count"] += 1
     
     return root_comments
 
+def build_comment_page(comments: List[Comment], db: Session, limit: int, user_id: Optional[int] = None) -> dict:
+    """One keyset page of comments; replies are fetched lazily per comment.
+
+    ``comments`` holds up to ``limit + 1`` rows so we know whether another
+    page follows without a separate count.
+    """
+    page = comments[:limit]
+    comment_ids = [comment.id for comment in page]
+    likes_counts = get_comment_like_counts(db, comment_ids)
+    liked_ids = get_liked_comment_ids(db, comment_ids, user_id)
+    reply_counts = get_reply_counts(db, comment_ids)
+    
+    items = []
+    for comment in page:
+        node = serialize_comment(comment, likes_counts, liked_ids)
+        node["reply_count"] = reply_counts.get(comment.id, 0)
+        items.append(node)
+    
+    has_more = len(comments) > limit
+    return {
+        "items": items,
+        "next_cursor": encode_cursor(page[-1].id) if has_more else None
+    }
+
 @router.get("/content/{content_id}")
 def get_content_comments(
     content_id: int,
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    """Comments for a piece of content.
+
+    Without ``limit``/``cursor`` the whole nested tree is returned as before.
+    With them, top-level comments come newest first as ``{"items", "next_cursor"}``
+    pages, each with a ``reply_count``; replies load via ``/{id}/replies``.
+    """
     from sqlalchemy.orm import joinedload
     content = db.query(Content).filter(Content.id == content_id).first()
     if not content:
@@ -64,10 +137,25 @@ def get_content_comments(
             detail="Content not found"
         )
     
-    comments = db.query(Comment).options(joinedload(Comment.author)).filter(Comment.content_id == content_id).all()
-    return build_comment_tree(comments, db, current_user)
+    if limit is None and cursor is None:
+        comments = db.query(Comment).options(joinedload(Comment.author)).filter(
+            Comment.content_id == content_id
+        ).order_by(Comment.created_at, Comment.id).all()
+        return build_comment_tree(comments, db, current_user)
+    
+    limit = limit or DEFAULT_PAGE_SIZE
+    before_id = decode_id_cursor(cursor)
+    # Ids grow with creation time, so id order is newest-first keyset order
+    query = db.query(Comment).options(joinedload(Comment.author)).filter(
+        Comment.content_id == content_id,
+        Comment.parent_id.is_(None)
+    )
+    if before_id is not None:
+        query = query.filter(Comment.id < before_id)
+    comments = query.order_by(Comment.id.desc()).limit(limit + 1).all()
+    return build_comment_page(comments, db, limit, current_user.id)
 
-@router.post("/", response_model=CommentResponse)
+@router.post("/", response_model=CommentResponse, dependencies=[Depends(rate_limit("comments.create"))])
 def create_comment(
     comment: CommentCreate,
     current_user: User = Depends(get_current_user),
@@ -105,33 +193,36 @@ def create_comment(
     )
     
     db.add(db_comment)
-    db.commit()
-    db.refresh(db_comment)
+    db.flush()
+    db_comment.assign_path(parent_comment if comment.parent_id else None)
     
-    # Create notification for content author (if not commenting on own content)
+    # Notifications are delivered by a background job committed with the comment
+    from app.database.models import NotificationTypeEnum
+    from app.services.notifications import enqueue_notifications, notification_row
+    commenter = current_user.full_name or current_user.username
+    notifications = []
+    
+    # Notify the content author (if not commenting on own content)
     if content.author_id != current_user.id:
-        from app.database.models import Notification, NotificationTypeEnum
-        notification = Notification(
-            user_id=content.author_id,
-            notification_type=NotificationTypeEnum.COMMENT,
-            title="New comment on your content",
-            message=f"{current_user.full_name or current_user.username} commented on \"{content.title}\"",
-            related_content_id=content.id
-        )
-        db.add(notification)
+        notifications.append(notification_row(
+            content.author_id,
+            NotificationTypeEnum.COMMENT,
+            "New comment on your content",
+            f"{commenter} commented on \"{content.title}\"",
+            content.id
+        ))
     
     # If replying to a comment, notify the parent comment author
     if comment.parent_id and parent_comment.author_id != current_user.id and parent_comment.author_id != content.author_id:
-        from app.database.models import Notification, NotificationTypeEnum
-        notification = Notification(
-            user_id=parent_comment.author_id,
-            notification_type=NotificationTypeEnum.COMMENT,
-            title="Reply to your comment",
-            message=f"{current_user.full_name or current_user.username} replied to your comment",
-            related_content_id=content.id
-        )
-        db.add(notification)
+        notifications.append(notification_row(
+            parent_comment.author_id,
+            NotificationTypeEnum.COMMENT,
+            "Reply to your comment",
+            f"{commenter} replied to your comment",
+            content.id
+        ))
     
+    enqueue_notifications(db, notifications, idempotency_key=f"comment:{db_comment.id}:created")
     db.commit()
     
     # Reload with relationships
@@ -212,11 +303,40 @@ def delete_comment(
     
     return {"message": "Comment deleted successfully"}
 
+def get_comment_subtree(db: Session, root: Comment, max_depth: int, children: List[Comment] = None) -> List[Comment]:
+    """Descendants of ``root`` down to ``max_depth`` levels, in one query.
+
+    Paths sort parents before children and siblings by id, so the result is
+    in tree order. When ``children`` (a run of consecutive direct replies) is
+    given, only their descendants are returned: that run's subtrees form one
+    contiguous path range.
+    """
+    from sqlalchemy.orm import joinedload
+    if children:
+        lower, upper, min_depth = children[0].path, children[-1].path + "~", root.depth + 2
+    else:
+        lower, upper, min_depth = root.path, root.path + "~", root.depth + 1
+    return db.query(Comment).options(joinedload(Comment.author)).filter(
+        Comment.path > lower,
+        Comment.path < upper,
+        Comment.depth >= min_depth,
+        Comment.depth <= root.depth + max_depth
+    ).order_by(Comment.path).all()
+
 @router.get("/{comment_id}/replies")
 def get_comment_replies(
     comment_id: int,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=100),
+    cursor: Optional[str] = None,
+    depth: int = Query(1, ge=1, le=MAX_REPLY_DEPTH),
     db: Session = Depends(get_db)
 ):
+    """Direct replies to a comment, oldest first, one keyset page at a time.
+
+    With ``depth`` > 1 each reply also carries its nested replies down to that
+    many levels, fetched with a single materialized-path query.
+    """
+    from sqlalchemy.orm import joinedload
     parent_comment = db.query(Comment).filter(Comment.id == comment_id).first()
     if not parent_comment:
         raise HTTPException(
@@ -224,8 +344,33 @@ def get_comment_replies(
             detail="Comment not found"
         )
     
-    replies = db.query(Comment).filter(Comment.parent_id == comment_id).all()
-    return replies
+    after_id = decode_id_cursor(cursor)
+    query = db.query(Comment).options(joinedload(Comment.author)).filter(Comment.parent_id == comment_id)
+    if after_id is not None:
+        query = query.filter(Comment.id > after_id)
+    replies = query.order_by(Comment.id).limit(limit + 1).all()
+    page = build_comment_page(replies, db, limit)
+    
+    page_replies = replies[:limit]
+    if depth == 1 or not page_replies or parent_comment.path is None or any(r.path is None for r in page_replies):
+        return page
+    
+    descendants = get_comment_subtree(db, parent_comment, depth, children=page_replies)
+    descendant_ids = [comment.id for comment in descendants]
+    likes_counts = get_comment_like_counts(db, descendant_ids)
+    reply_counts = get_reply_counts(db, descendant_ids)
+    
+    nodes = {item["id"]: item for item in page["items"]}
+    for comment in descendants:
+        node = serialize_comment(comment, likes_counts, set())
+        node["reply_count"] = reply_counts.get(comment.id, 0)
+        nodes[comment.id] = node
+        parent = nodes.get(comment.parent_id)
+        if parent is not None:
+            parent["replies"].append(node)
+    
+    return page
+
 @router.post("/{comment_id}/like")
 def like_comment(
     comment_id: int,
@@ -8,6 +8,10 @@ from app.database.models import User, Content, ContentStatusEnum, Like, Category
 from app.database.models import Comment as ContentComment
 from app.schemas.schemas import ContentCreate, ContentUpdate, ContentResponse, LikeCreate
 from app.core.dependencies import get_current_user, require_admin, require_tech_writer_or_admin
+from app.services.rate_limit import rate_limit
+from app.services import analytics, category_catalogue, public_feed
+from app.services.fanout import create_category_fanout
+from app.services.notifications import enqueue_admin_notification, enqueue_notifications, notification_row, notify_content_liked
 
 router = APIRouter()
 
@@ -20,79 +24,8 @@ def get_public_content(
 ):
     """Public endpoint to fetch published content without authentication"""
     try:
-        skip = (page - 1) * limit
-        query = db.query(Content)
-        
-        if category_id:
-            query = query.filter(Content.category_id == category_id)
-        
-        # Only show published content for public access
-        query = query.filter(Content.status == ContentStatusEnum.PUBLISHED)
-        query = query.filter(Content.is_flagged == False)
-        
-        # Sort by published_at (newest approved content first)
-        query = query.order_by(desc(Content.published_at), desc(Content.created_at))
-        
-        # Get content with relationships loaded
-        content_list = query.options(
-            joinedload(Content.author),
-            joinedload(Content.category)
-        ).offset(skip).limit(limit).all()
-        
-        # Return empty list if no content found
-        if not content_list:
-            return []
-        
-        # Add counts safely (likes, dislikes, comments from DB)
-        result = []
-        for content in content_list:
-            try:
-                likes_count = db.query(Like).filter(Like.content_id == content.id, Like.is_like == True).count()
-                dislikes_count = db.query(Like).filter(Like.content_id == content.id, Like.is_like == False).count()
-                comments_count = db.query(ContentComment).filter(ContentComment.content_id == content.id).count()
-                content_dict = {
-                    "id": content.id,
-                    "title": content.title,
-                    "content_text": content.content_text,
-                    "content_type": content.content_type.value if content.content_type else "article",
-                    "status": content.status.value if content.status else "published",
-                    "media_url": content.media_url,
-                    "thumbnail_url": content.thumbnail_url,
-                    "tags": getattr(content, 'tags', None),
-                    "views_count": content.views_count or 0,
-                    "created_at": content.created_at.isoformat() if content.created_at else None,
-                    "updated_at": content.updated_at.isoformat() if content.updated_at else None,
-                    "published_at": content.published_at.isoformat() if content.published_at else None,
-                    "author_id": content.author_id,
-                    "category_id": content.category_id,
-                    "likes_count": likes_count,
-                    "dislikes_count": dislikes_count,
-                    "comments_count": comments_count,
-                    "is_flagged": content.is_flagged if hasattr(content, 'is_flagged') else False,
-                    "author": {
-                        "id": content.author.id if content.author else None,
-                        "username": content.author.username if content.author else "Unknown",
-                        "email": content.author.email if content.author else "",
-                        "full_name": content.author.full_name if content.author else "Unknown",
-                        "role": content.author.role.value if content.author and content.author.role else "user",
-                        "is_active": content.author.is_active if content.author else True,
-                        "created_at": content.author.created_at.isoformat() if content.author and content.author.created_at else None
-                    },
-                    "category": {
-                        "id": content.category.id if content.category else None,
-                        "name": content.category.name if content.category else "Uncategorized",
-                        "description": content.category.description if content.category else "",
-                        "color": content.category.color if content.category else "#3B82F6",
-                        "created_at": content.category.created_at.isoformat() if content.category and content.category.created_at else None,
-                        "created_by": content.category.created_by if content.category else None
-                    }
-                }
-                result.append(content_dict)
-            except Exception as e:
-                print(f"Error processing content {content.id}: {e}")
-                continue
-        
-        return result
+        # Cached briefly; the first pages are preloaded at startup
+        return public_feed.get_public_page(db, page, limit, category_id)
     except Exception as e:
         # Return empty list on any error to prevent 500
         return []
@@ -226,8 +159,7 @@ def create_content(
     db: Session = Depends(get_db)
 ):
     # Verify category exists
-    category = db.query(Category).filter(Category.id == content.category_id).first()
-    if not category:
+    if not category_catalogue.get_category(db, content.category_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Category not found"
@@ -259,17 +191,14 @@ def create_content(
     )
     db.add(creator_notification)
     
-    # Create notifications for all admins
-    admins = db.query(User).filter(User.role == RoleEnum.ADMIN).all()
-    for admin in admins:
-        admin_notification = Notification(
-            user_id=admin.id,
-            notification_type=NotificationTypeEnum.STATUS_CHANGE,
-            title="New Content Pending Approval",
-            message=f"{current_user.full_name or current_user.username} has created new content '{content.title}' that requires your approval.",
-            related_content_id=db_content.id
-        )
-        db.add(admin_notification)
+    # Admins are notified by a background job
+    enqueue_admin_notification(
+        db,
+        title="New Content Pending Approval",
+        message=f"{current_user.full_name or current_user.username} has created new content '{content.title}' that requires your approval.",
+        related_content_id=db_content.id,
+        idempotency_key=f"content:{db_content.id}:created"
+    )
     
     db.commit()
     
@@ -492,6 +421,7 @@ def get_content_by_id(
     # Increment view count
     content.views_count = (content.views_count or 0) + 1
     db.commit()
+    analytics.views.record(content.id)
     
     # Add counts
     likes_count = db.query(Like).filter(
@@ -615,8 +545,6 @@ def approve_content(
     
     content.status = ContentStatusEnum.PUBLISHED
     content.published_at = datetime.utcnow()
-    db.commit()
-    db.refresh(content)
 
     # Notify content author about approval
     author_notification = Notification(
@@ -628,22 +556,12 @@ def approve_content(
     )
     db.add(author_notification)
 
-    # Notify category subscribers about new content
+    # Category subscribers are notified by a background job, in chunks
     if content.category_id:
-        category = db.query(Category).options(joinedload(Category.subscribers)).filter(Category.id == content.category_id).first()
-        if category and category.subscribers:
-            for subscriber in category.subscribers:
-                if subscriber.id != content.author_id:
-                    notification = Notification(
-                        user_id=subscriber.id,
-                        notification_type=NotificationTypeEnum.STATUS_CHANGE,
-                        title=f"New content in {category.name}",
-                        message=f"\"{content.title}\" was just published.",
-                        related_content_id=content.id
-                    )
-                    db.add(notification)
-    
-    # Commit all notifications
+        category = db.query(Category).filter(Category.id == content.category_id).first()
+        if category:
+            create_category_fanout(db, content, category)
+    
     db.commit()
 
     return {"message": "Content approved and published"}
@@ -677,7 +595,7 @@ def reject_content(
     
     return {"message": "Content rejected"}
 
-@router.post("/{content_id}/like")
+@router.post("/{content_id}/like", dependencies=[Depends(rate_limit("content.like"))])
 def like_content(
     content_id: int,
     like_data: LikeCreate,
@@ -702,10 +620,12 @@ def like_content(
     if existing_like:
         # If same action, remove the like/dislike (toggle off)
         if existing_like.is_like == like_data.is_like:
+            analytics.record_like_change(db, existing_like, None)
             db.delete(existing_like)
             action = "removed like" if like_data.is_like else "removed dislike"
         else:
             # Update to opposite action
+            analytics.record_like_change(db, existing_like, like_data.is_like)
             existing_like.is_like = like_data.is_like
             action = "liked" if like_data.is_like else "disliked"
             should_notify = like_data.is_like  # Only notify for likes, not dislikes
@@ -722,21 +642,11 @@ def like_content(
     
     db.commit()
     
-    # Create notification for content author (only for likes, not dislikes, and not own content)
+    # Notify the content author (only for likes, not dislikes, and not own content).
+    # Likes within a window merge into one "N people liked" notification
     if should_notify and content.author_id != current_user.id:
-        print(f"Creating like notification for user {content.author_id} by user {current_user.id}")
-        notification = Notification(
-            user_id=content.author_id,
-            notification_type=NotificationTypeEnum.LIKE,
-            title="Someone liked your content",
-            message=f"{current_user.full_name or current_user.username} liked \"{content.title}\"",
-            related_content_id=content.id
-        )
-        db.add(notification)
+        notify_content_liked(db, content, current_user.id, current_user.full_name or current_user.username)
         db.commit()
-        print(f"Like notification created successfully")
-    else:
-        print(f"Like notification not created. should_notify: {should_notify}, author_id: {content.author_id}, current_user_id: {current_user.id}")
     
     # Return updated counts
     likes_count = db.query(Like).filter(Like.content_id == content_id, Like.is_like == True).count()
@@ -860,6 +770,7 @@ def increment_views(
     # Increment view count
     content.views_count += 1
     db.commit()
+    analytics.views.record(content.id)
     
     return {
         "message": "View count incremented",
@@ -882,20 +793,19 @@ def flag_content(
     
     # Toggle flag status
     content.is_flagged = not content.is_flagged
-    db.commit()
     
-    # Create notification for content author when content is flagged
+    # Notify the content author from a background job when content is flagged
     if content.is_flagged and content.author_id != current_user.id:
         reason = flag_data.get('reason', 'No reason provided') if flag_data else 'No reason provided'
-        notification = Notification(
-            user_id=content.author_id,
-            notification_type=NotificationTypeEnum.FLAG,
-            title="Content Flagged",
-            message=f"Your content '{content.title}' has been flagged for review. Reason: {reason}",
-            related_content_id=content.id
-        )
-        db.add(notification)
-        db.commit()
+        enqueue_notifications(db, [notification_row(
+            content.author_id,
+            NotificationTypeEnum.FLAG,
+            "Content Flagged",
+            f"Your content '{content.title}' has been flagged for review. Reason: {reason}",
+            content.id
+        )])
+    
+    db.commit()
     
     action = "flagged" if content.is_flagged else "unflagged"
     return {"message": f"Content {action} successfully", "is_flagged": content.is_flagged}
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from starlette.staticfiles import NotModifiedResponse
+import os
+
+from app.services import storage
+from app.utils.static_files import MediaFileResponse, cache_control_for, is_not_modified
+
+router = APIRouter()
+
+
+@router.api_route("/{key}", methods=["GET", "HEAD"])
+def get_media(key: str, request: Request):
+    """A stored object; its key is the hash of its bytes, so it may be cached forever"""
+    if not storage.is_valid_key(key):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    backend = storage.get_storage()
+    # The content hash is the strongest validator there is
+    etag = f'"{key.split(".", 1)[0]}"'
+    cache_control = cache_control_for(request.url.path)
+    media_type = storage.content_type_for(key)
+    
+    path = backend.local_path(key)
+    if path is not None:
+        if not os.path.isfile(path):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+        return MediaFileResponse(path, media_type=media_type, etag=etag, cache_control=cache_control)
+    
+    # Remote backends: revalidation never needs to reach the bucket
+    headers = {"etag": etag}
+    if cache_control:
+        headers["cache-control"] = cache_control
+    if is_not_modified(headers, request.headers):
+        return NotModifiedResponse(headers)
+    try:
+        stream = backend.open(key)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    return StreamingResponse(storage.iter_stream(stream), media_type=media_type, headers=headers)
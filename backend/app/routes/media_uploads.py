@@ -0,0 +1,102 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.core.dependencies import get_current_user
+from app.database.connection import get_db
+from app.database.models import User
+from app.schemas.schemas import MediaUploadComplete, MediaUploadCreate, MediaUploadResponse
+from app.services import media_uploads, storage
+
+router = APIRouter()
+
+
+def _upload_response(upload) -> dict:
+    return MediaUploadResponse(
+        id=upload.id,
+        filename=upload.filename,
+        size=upload.total_size,
+        offset=upload.upload_offset,
+        status=upload.status.value,
+        media_url=storage.media_url(upload.key) if upload.key else None,
+        expires_at=media_uploads.expires_at(upload),
+    ).model_dump(mode="json")
+
+
+def _offset_headers(upload) -> dict:
+    return {
+        "Upload-Offset": str(upload.upload_offset),
+        "Upload-Length": str(upload.total_size),
+        "Cache-Control": "no-store",
+    }
+
+
+@router.post("", status_code=status.HTTP_201_CREATED, response_model=MediaUploadResponse)
+def create_upload(
+    body: MediaUploadCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Start a resumable upload of an audio or video file"""
+    upload = media_uploads.create_upload(db, current_user.id, body.filename, body.size)
+    return JSONResponse(
+        status_code=status.HTTP_201_CREATED,
+        content=_upload_response(upload),
+        headers={"Location": f"/api/uploads/{upload.id}", **_offset_headers(upload)},
+    )
+
+
+@router.api_route("/{upload_id}", methods=["GET", "HEAD"], response_model=MediaUploadResponse)
+def get_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Where to resume: the offset is also in the Upload-Offset header"""
+    upload = media_uploads.get_upload(db, upload_id, current_user.id)
+    return JSONResponse(content=_upload_response(upload), headers=_offset_headers(upload))
+
+
+@router.patch("/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def append_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+    upload_checksum: Optional[str] = Header(None, alias="Upload-Checksum"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Append the request body at Upload-Offset, streamed to disk as it arrives"""
+    if request.headers.get("content-type", "").split(";")[0].strip() != "application/offset+octet-stream":
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Chunks must be sent as application/offset+octet-stream"
+        )
+    upload = media_uploads.get_upload(db, upload_id, current_user.id)
+    await media_uploads.append_chunk(db, upload, upload_offset, request.stream(), upload_checksum)
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers=_offset_headers(upload))
+
+
+@router.post("/{upload_id}/complete", response_model=MediaUploadResponse)
+async def complete_upload(
+    upload_id: str,
+    body: Optional[MediaUploadComplete] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Move a fully received upload into storage; its media_url can then go on a content item"""
+    upload = media_uploads.get_upload(db, upload_id, current_user.id)
+    upload = await media_uploads.finalize_upload(db, upload, body.sha256 if body else None)
+    return _upload_response(upload)
+
+
+@router.delete("/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    upload = media_uploads.get_upload(db, upload_id, current_user.id)
+    media_uploads.delete_upload(db, upload)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
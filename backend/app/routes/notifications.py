@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import String, tuple_, type_coerce
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.database.connection import get_db
-from app.database.models import User, Notification
-from app.schemas.schemas import NotificationResponse
-from app.core.dependencies import get_current_user
+from app.database.models import Notification, NotificationTypeEnum
+from app.schemas.schemas import NotificationInboxResponse, NotificationResponse, TokenData
+from app.core.dependencies import get_stream_token_data, get_token_data
+from app.services.notification_hub import hub, notification_events
+from app.services.notifications import delete_notifications, mark_notifications_read
+from app.services.unread_counts import get_unread_count
+from app.utils.pagination import decode_cursor, encode_cursor
 
 router = APIRouter()
 
@@ -12,24 +18,74 @@ router = APIRouter()
 def get_user_notifications(
     skip: int = 0,
     limit: int = 20,
-    current_user: User = Depends(get_current_user),
+    current_user: TokenData = Depends(get_token_data),
     db: Session = Depends(get_db)
 ):
     notifications = db.query(Notification).filter(
-        Notification.user_id == current_user.id
+        Notification.user_id == current_user.user_id
     ).order_by(Notification.created_at.desc()).offset(skip).limit(limit).all()
     
     return notifications
 
+@router.get("/inbox", response_model=NotificationInboxResponse)
+def get_notification_inbox(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    notification_type: Optional[NotificationTypeEnum] = None,
+    is_read: Optional[bool] = None,
+    include_unread_count: bool = True,
+    current_user: TokenData = Depends(get_token_data),
+    db: Session = Depends(get_db)
+):
+    """Newest-first notifications, paginated by a (created_at, id) cursor.
+
+    A coalesced group that gains an event moves back to the top, so pages
+    fetched after that do not repeat it; the stream announces the change.
+    """
+    # The cursor carries created_at exactly as stored and is compared as such:
+    # SQLite keeps timestamps as text, and a re-formatted datetime would not
+    # sort the same way against it
+    created_key = type_coerce(Notification.created_at, String)
+    query = db.query(Notification, created_key).filter(
+        Notification.user_id == current_user.user_id
+    )
+    if notification_type is not None:
+        query = query.filter(Notification.notification_type == notification_type)
+    if is_read is not None:
+        query = query.filter(Notification.is_read == is_read)
+    
+    after = decode_cursor(cursor, 2)
+    if after is not None:
+        if not isinstance(after[0], str) or not isinstance(after[1], int):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid pagination cursor"
+            )
+        query = query.filter(
+            tuple_(created_key, Notification.id) < tuple_(type_coerce(after[0], String), after[1])
+        )
+    
+    rows = query.order_by(
+        Notification.created_at.desc(), Notification.id.desc()
+    ).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    return {
+        "items": [notification for notification, _ in rows],
+        "next_cursor": encode_cursor(str(rows[-1][1]), rows[-1][0].id) if has_more else None,
+        "unread_count": get_unread_count(db, current_user.user_id) if include_unread_count else None
+    }
+
 @router.put("/{notification_id}/read")
 def mark_notification_as_read(
     notification_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: TokenData = Depends(get_token_data),
     db: Session = Depends(get_db)
 ):
-    notification = db.query(Notification).filter(
+    notification = db.query(Notification.id).filter(
         Notification.id == notification_id,
-        Notification.user_id == current_user.id
+        Notification.user_id == current_user.user_id
     ).first()
     
     if not notification:
@@ -38,33 +94,70 @@ def mark_notification_as_read(
             detail="Notification not found"
         )
     
-    notification.is_read = True
+    mark_notifications_read(db, current_user.user_id, [notification_id])
     db.commit()
     
     return {"message": "Notification marked as read"}
 
 @router.put("/mark-all-read")
 def mark_all_notifications_as_read(
-    current_user: User = Depends(get_current_user),
+    current_user: TokenData = Depends(get_token_data),
     db: Session = Depends(get_db)
 ):
-    db.query(Notification).filter(
-        Notification.user_id == current_user.id,
-        Notification.is_read == False
-    ).update({"is_read": True})
-    
+    mark_notifications_read(db, current_user.user_id)
     db.commit()
     
     return {"message": "All notifications marked as read"}
 
+@router.delete("/{notification_id}")
+def delete_notification(
+    notification_id: int,
+    current_user: TokenData = Depends(get_token_data),
+    db: Session = Depends(get_db)
+):
+    if not delete_notifications(db, current_user.user_id, [notification_id]):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Notification not found"
+        )
+    db.commit()
+    
+    return {"message": "Notification deleted"}
+
 @router.get("/unread-count")
 def get_unread_notifications_count(
-    current_user: User = Depends(get_current_user),
+    current_user: TokenData = Depends(get_token_data),
     db: Session = Depends(get_db)
 ):
-    count = db.query(Notification).filter(
-        Notification.user_id == current_user.id,
-        Notification.is_read == False
-    ).count()
+    return {"unread_count": get_unread_count(db, current_user.user_id)}
+
+@router.get("/stream")
+async def stream_notifications(
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+    current_user: TokenData = Depends(get_stream_token_data),
+    db: Session = Depends(get_db)
+):
+    """Server-Sent Events: new notifications and unread-count changes as they happen"""
+    try:
+        resume_from = int(last_event_id) if last_event_id else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid Last-Event-ID"
+        )
+    
+    subscriber = hub.subscribe(current_user.user_id)
+    if subscriber is None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many open notification streams"
+        )
     
-    return {"unread_count": count}
\ No newline at end of file
+    # The request's session is closed before the stream starts, so the
+    # stream opens its own short-lived sessions on the same engine
+    return StreamingResponse(
+        notification_events(subscriber, db.get_bind(), resume_from, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -7,6 +7,7 @@ from app.database.models import User, Profile, RoleEnum, Content, Category, Like
 from app.schemas.schemas import UserResponse, UserUpdate, UserCreate
 from app.core.dependencies import get_current_user, require_admin
 from app.core.auth import get_password_hash
+from app.services import token_versions
 
 router = APIRouter()
 
@@ -70,6 +71,11 @@ def update_user(
     if profile_fields_data:
         profile = db.query(Profile).filter(Profile.user_id == user_id).first()
         if profile:
+            if profile_fields_data.get('avatar_url', profile.avatar_url) != profile.avatar_url:
+                # The stored avatar and its variants are being replaced
+                from app.services.images import release_avatar
+                release_avatar(db, profile)
+                profile.avatar_variants = None
             for field, value in profile_fields_data.items():
                 setattr(profile, field, value)
         else:
@@ -145,6 +151,8 @@ def update_user_role(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     user.role = body.role
     db.commit()
+    # Tokens carry the role claim, so a role change revokes them
+    token_versions.revoke_user_tokens(db, user.id)
     db.refresh(user)
     from sqlalchemy.orm import joinedload
     user = db.query(User).options(joinedload(User.profile)).filter(User.id == user_id).first()
@@ -165,6 +173,7 @@ def deactivate_user(
     
     user.is_active = False
     db.commit()
+    token_versions.revoke_user_tokens(db, user.id)
     
     return {"message": "User deactivated successfully"}
 
@@ -183,6 +192,7 @@ def activate_user(
     
     user.is_active = True
     db.commit()
+    token_versions.invalidate(user.id)
     
     return {"message": "User activated successfully"}
 
@@ -6,8 +6,10 @@ from pydantic import (
     model_validator,
     field_serializer,
     ConfigDict,
+    Field,
 )
-from typing import Optional
+import json
+from typing import Dict, List, Optional
 from datetime import datetime
 
 from app.database.models import (
@@ -59,6 +61,8 @@ class ProfileResponse(BaseModel):
     user_id: int
     bio: Optional[str] = None
     avatar_url: Optional[str] = None
+    # {"48": {"webp": url, "jpeg": url}, "96": ..., "256": ...}
+    avatar_variants: Optional[Dict[str, Dict[str, str]]] = None
     linkedin_url: Optional[str] = None
     github_url: Optional[str] = None
     twitter_url: Optional[str] = None
@@ -67,6 +71,14 @@ class ProfileResponse(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+    @field_validator('avatar_variants', mode='before')
+    @classmethod
+    def parse_avatar_variants(cls, v):
+        # Stored as JSON text on the profile row
+        if isinstance(v, str):
+            return json.loads(v)
+        return v
+
 
 
 
@@ -81,6 +93,9 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: Optional[str] = None
+    user_id: Optional[int] = None
+    role: Optional[str] = None
+    token_version: int = 0
 
 
 class LoginRequest(BaseModel):
@@ -229,6 +244,7 @@ class NotificationResponse(BaseModel):
     created_at: datetime
     notification_type: Optional[str] = None
     related_content_id: Optional[int] = None
+    aggregate_count: int = 1
 
     model_config = ConfigDict(from_attributes=True)
         
@@ -238,3 +254,59 @@ class NotificationResponse(BaseModel):
         if hasattr(v, 'value'):
             return v.value
         return str(v) if v else None
+
+
+class NotificationInboxResponse(BaseModel):
+    items: List[NotificationResponse]
+    next_cursor: Optional[str] = None
+    unread_count: Optional[int] = None
+
+
+# =========================
+# Bulk moderation schemas
+# =========================
+
+class BulkModerationRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=500)
+
+
+class BulkFlagRequest(BulkModerationRequest):
+    reason: Optional[str] = None
+
+
+class BulkResolveFlagsRequest(BulkModerationRequest):
+    action: str = Field(..., pattern="^(approve|reject)$")
+    admin_notes: Optional[str] = None
+
+
+class BulkItemResult(BaseModel):
+    id: int
+    status: str
+
+
+class BulkModerationResponse(BaseModel):
+    changed: int
+    results: List[BulkItemResult]
+
+
+# =========================
+# Resumable media upload schemas
+# =========================
+
+class MediaUploadCreate(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=255)
+    size: int = Field(..., ge=1)
+
+
+class MediaUploadComplete(BaseModel):
+    sha256: Optional[str] = Field(None, pattern="^[0-9a-fA-F]{64}$")
+
+
+class MediaUploadResponse(BaseModel):
+    id: str
+    filename: str
+    size: int
+    offset: int
+    status: str
+    media_url: Optional[str] = None
+    expires_at: Optional[datetime] = None
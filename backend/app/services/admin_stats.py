@@ -0,0 +1,112 @@
+"""Cached snapshot of the admin dashboard counts.
+
+Each table is counted with one conditional-aggregate query (``COUNT(...)
+FILTER (WHERE ...)``), three queries in all. The snapshot is cached for
+``ADMIN_STATS_CACHE_TTL_SECONDS``. A commit in this process that adds,
+removes or changes the status of a user, content item or flag drops it
+early. Set-based updates that bypass the ORM call ``mark_admin_stats_stale``
+themselves.
+"""
+from datetime import datetime
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database.models import Content, ContentFlag, ContentStatusEnum, RoleEnum, User
+from app.services.cache import TTLCache
+from app.services.warmup import warmup_task
+
+_snapshot = TTLCache(settings.ADMIN_STATS_CACHE_TTL_SECONDS, maxsize=1)
+_KEY = "admin_stats"
+
+# Columns whose changes move a dashboard number
+WATCHED_COLUMNS = {
+    User: ("is_active", "role"),
+    Content: ("status",),
+    ContentFlag: ("is_resolved",),
+}
+
+
+def compute_admin_stats(db: Session) -> dict:
+    users = db.query(
+        func.count(User.id),
+        func.count(User.id).filter(User.is_active == True),
+        func.count(User.id).filter(User.role == RoleEnum.ADMIN),
+        func.count(User.id).filter(User.role == RoleEnum.TECH_WRITER),
+        func.count(User.id).filter(User.role == RoleEnum.USER),
+    ).one()
+    content = db.query(
+        func.count(Content.id),
+        func.count(Content.id).filter(Content.status == ContentStatusEnum.PUBLISHED),
+        func.count(Content.id).filter(Content.status == ContentStatusEnum.REVIEW),
+    ).one()
+    pending_flags = db.query(func.count(ContentFlag.id)).filter(ContentFlag.is_resolved == False).scalar()
+
+    return {
+        "users": {
+            "total": users[0],
+            "active": users[1],
+            "admins": users[2],
+            "tech_writers": users[3],
+            "regular_users": users[4]
+        },
+        "content": {
+            "total": content[0],
+            "published": content[1],
+            "pending_approval": content[2]
+        },
+        "moderation": {
+            "pending_flags": pending_flags
+        },
+        "generated_at": datetime.utcnow()
+    }
+
+
+def get_admin_stats(db: Session, fresh: bool = False) -> dict:
+    if fresh:
+        stats = compute_admin_stats(db)
+        _snapshot.set(_KEY, stats)
+        return stats
+    return _snapshot.get_or_load(_KEY, lambda: compute_admin_stats(db))
+
+
+@warmup_task("admin_stats")
+def _warm_admin_stats(db: Session):
+    get_admin_stats(db, fresh=True)
+
+
+def invalidate_admin_stats():
+    _snapshot.invalidate()
+
+
+def mark_admin_stats_stale(db: Session):
+    """Drop the snapshot once ``db`` commits"""
+    db.info["admin_stats_stale"] = True
+
+
+def _mark_stale(mapper, connection, target):
+    Session.object_session(target).info["admin_stats_stale"] = True
+
+
+def _mark_stale_on_change(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[column].history.has_changes() for column in WATCHED_COLUMNS[mapper.class_]):
+        _mark_stale(mapper, connection, target)
+
+
+for _model in WATCHED_COLUMNS:
+    event.listen(_model, "after_insert", _mark_stale)
+    event.listen(_model, "after_delete", _mark_stale)
+    event.listen(_model, "after_update", _mark_stale_on_change)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    if session.info.pop("admin_stats_stale", False):
+        invalidate_admin_stats()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_uncommitted(session):
+    session.info.pop("admin_stats_stale", None)
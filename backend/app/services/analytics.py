@@ -0,0 +1,470 @@
+"""Hourly and daily engagement rollups for admin analytics.
+
+``engagement_rollups`` counts views, likes, dislikes and comments per
+content item per bucket. The rows carry the content's category and author,
+so reports filter on them without joining back to the content table.
+``platform_rollups`` counts registrations and new content per bucket.
+Buckets are naive UTC hour and day starts.
+
+Likes, comments, users and content are folded in by the
+``analytics.rollup`` job. It reads each source table past its watermark in
+``rollup_watermarks``, in id order, and adds the deltas with upserts. It
+advances the watermark with a compare-and-set in the same transaction, so
+every row is counted exactly once even if two aggregators overlap. Rows
+younger than ``ANALYTICS_SETTLE_SECONDS`` wait for the next run. A
+transaction that took a lower id but committed late is then still counted.
+
+Unliking and switching between like and dislike change rows the watermark
+has already passed. ``record_like_change`` corrects the rollups in the same
+transaction, so the like and dislike counts stay equal to the ``likes``
+table. A row past the watermark needs no correction: the aggregator will
+fold its final state.
+
+Views have no row of their own: ``views`` buffers them in memory, and each
+process flushes its buffer every ``ANALYTICS_VIEW_FLUSH_SECONDS``.
+
+Backfill history with ``python -m app.services.analytics backfill``.
+"""
+import argparse
+import logging
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database.models import (
+    Comment, Content, EngagementRollup, Like, PlatformRollup, RollupWatermark, User,
+)
+from app.database.upsert import dialect_insert
+from app.services.jobs import job_handler
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = ("hour", "day")
+ENGAGEMENT_METRICS = ("views", "likes", "dislikes", "comments")
+PLATFORM_METRICS = ("registrations", "content_created")
+
+
+def utc_naive(ts: Optional[datetime]) -> Optional[datetime]:
+    if ts is not None and ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def bucket_start(ts: datetime, bucket: str) -> datetime:
+    ts = ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0) if bucket == "day" else ts
+
+
+# =========================
+# Upserts
+# =========================
+
+def _add_engagement(conn, deltas: Dict[Tuple[str, datetime, int], dict]):
+    if not deltas:
+        return
+    table = EngagementRollup.__table__
+    stmt = dialect_insert(conn, table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.bucket, table.c.bucket_start, table.c.content_id],
+        set_={
+            "category_id": stmt.excluded.category_id,
+            "author_id": stmt.excluded.author_id,
+            **{metric: table.c[metric] + stmt.excluded[metric] for metric in ENGAGEMENT_METRICS},
+        },
+    )
+    conn.execute(stmt, [
+        {"bucket": bucket, "bucket_start": start, "content_id": content_id,
+         **{metric: values.get(metric, 0) for metric in ENGAGEMENT_METRICS},
+         "category_id": values.get("category_id"), "author_id": values.get("author_id")}
+        for (bucket, start, content_id), values in deltas.items()
+    ])
+
+
+def _add_platform(conn, deltas: Dict[Tuple[str, datetime], dict]):
+    if not deltas:
+        return
+    table = PlatformRollup.__table__
+    stmt = dialect_insert(conn, table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.bucket, table.c.bucket_start],
+        set_={metric: table.c[metric] + stmt.excluded[metric] for metric in PLATFORM_METRICS},
+    )
+    conn.execute(stmt, [
+        {"bucket": bucket, "bucket_start": start, **{metric: values.get(metric, 0) for metric in PLATFORM_METRICS}}
+        for (bucket, start), values in deltas.items()
+    ])
+
+
+# =========================
+# Aggregator
+# =========================
+
+def _engagement_rows(rows, metric_of):
+    deltas = defaultdict(Counter)
+    for row in rows:
+        if row.content_exists is None:
+            continue  # the content has since been deleted
+        for bucket in BUCKETS:
+            key = (bucket, bucket_start(utc_naive(row.created_at), bucket), row.content_id)
+            deltas[key][metric_of(row)] += 1
+            deltas[key]["category_id"] = row.category_id
+            deltas[key]["author_id"] = row.author_id
+    return deltas
+
+
+def _platform_rows(rows, metric):
+    deltas = defaultdict(Counter)
+    for row in rows:
+        for bucket in BUCKETS:
+            deltas[(bucket, bucket_start(utc_naive(row.created_at), bucket))][metric] += 1
+    return deltas
+
+
+def _content_columns():
+    return (Content.category_id, Content.author_id, Content.id.label("content_exists"))
+
+
+# source name -> (query past a watermark, fold rows into the rollups)
+SOURCES = {
+    "likes": (
+        lambda: select(Like.id, Like.created_at, Like.content_id, Like.is_like, *_content_columns())
+        .outerjoin(Content, Content.id == Like.content_id),
+        lambda conn, rows: _add_engagement(conn, _engagement_rows(
+            rows, lambda row: "likes" if row.is_like else "dislikes")),
+    ),
+    "comments": (
+        lambda: select(Comment.id, Comment.created_at, Comment.content_id, *_content_columns())
+        .outerjoin(Content, Content.id == Comment.content_id),
+        lambda conn, rows: _add_engagement(conn, _engagement_rows(rows, lambda row: "comments")),
+    ),
+    "users": (
+        lambda: select(User.id, User.created_at),
+        lambda conn, rows: _add_platform(conn, _platform_rows(rows, "registrations")),
+    ),
+    "content": (
+        lambda: select(Content.id, Content.created_at),
+        lambda conn, rows: _add_platform(conn, _platform_rows(rows, "content_created")),
+    ),
+}
+
+_SOURCE_MODELS = {"likes": Like, "comments": Comment, "users": User, "content": Content}
+
+
+def _watermark(db: Session, source: str) -> int:
+    # Locked until the batch commits, so record_like_change sees either none of it or all of it
+    last_id = db.execute(
+        select(RollupWatermark.last_id).where(RollupWatermark.source == source).with_for_update()
+    ).scalar()
+    if last_id is None:
+        stmt = dialect_insert(db.connection(), RollupWatermark.__table__).values(source=source, last_id=0)
+        db.execute(stmt.on_conflict_do_nothing(index_elements=["source"]))
+        last_id = 0
+    return last_id
+
+
+def _fold_batch(db: Session, source: str, settled_before: datetime, batch_size: int) -> int:
+    """Fold the next batch of one source into the rollups; returns how many rows"""
+    query, fold = SOURCES[source]
+    model = _SOURCE_MODELS[source]
+    last_id = _watermark(db, source)
+    rows = db.execute(
+        query().where(model.id > last_id).order_by(model.id).limit(batch_size)
+    ).all()
+
+    settled = []
+    for row in rows:
+        created_at = utc_naive(row.created_at)
+        if created_at is None or created_at > settled_before:
+            # Stop at the first unsettled row so no later id gets ahead of it
+            break
+        settled.append(row)
+    if not settled:
+        db.rollback()
+        return 0
+
+    conn = db.connection()
+    fold(conn, settled)
+    advanced = db.execute(
+        update(RollupWatermark)
+        .where(RollupWatermark.source == source, RollupWatermark.last_id == last_id)
+        .values(last_id=settled[-1].id)
+    ).rowcount
+    if not advanced:
+        # Another aggregator folded this batch first
+        db.rollback()
+        return 0
+    db.commit()
+    return len(settled)
+
+
+def run_aggregator(bind, now: datetime = None, settle_seconds: float = None, batch_size: int = None) -> Dict[str, int]:
+    """Fold every source up to the settle horizon; returns rows folded per source"""
+    now = utc_naive(now) or datetime.utcnow()
+    settle_seconds = settings.ANALYTICS_SETTLE_SECONDS if settle_seconds is None else settle_seconds
+    settled_before = now - timedelta(seconds=settle_seconds)
+    batch_size = batch_size or settings.ANALYTICS_ROLLUP_BATCH_SIZE
+    folded = {}
+
+    db = Session(bind=bind)
+    try:
+        for source in SOURCES:
+            total = 0
+            while True:
+                count = _fold_batch(db, source, settled_before, batch_size)
+                total += count
+                if count < batch_size:
+                    break
+            folded[source] = total
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return folded
+
+
+def record_like_change(db: Session, like: Like, is_like: Optional[bool]):
+    """Correct the rollups before ``like`` switches to ``is_like``, or is removed (None); the caller commits"""
+    if is_like == like.is_like:
+        return
+    # Shared lock: changes to likes do not wait for each other, only for a running batch
+    last_id = db.execute(
+        select(RollupWatermark.last_id).where(RollupWatermark.source == "likes").with_for_update(read=True)
+    ).scalar()
+    if last_id is None or like.id > last_id:
+        return
+    owner = db.execute(
+        select(Content.category_id, Content.author_id).where(Content.id == like.content_id)
+    ).first()
+    if owner is None:
+        return
+    deltas = defaultdict(Counter)
+    for bucket in BUCKETS:
+        key = (bucket, bucket_start(utc_naive(like.created_at), bucket), like.content_id)
+        deltas[key]["likes" if like.is_like else "dislikes"] -= 1
+        if is_like is not None:
+            deltas[key]["likes" if is_like else "dislikes"] += 1
+        deltas[key]["category_id"] = owner.category_id
+        deltas[key]["author_id"] = owner.author_id
+    _add_engagement(db.connection(), deltas)
+
+
+@job_handler("analytics.rollup", every=settings.ANALYTICS_ROLLUP_INTERVAL_SECONDS)
+def _rollup_job(db: Session, payload: dict):
+    # Batches commit as they go, so use a separate session from the job's
+    run_aggregator(db.get_bind())
+
+
+# =========================
+# Views
+# =========================
+
+class ViewBuffer:
+    """Content views counted in memory until the next flush"""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, content_id: int, at: datetime = None):
+        hour = bucket_start(utc_naive(at) or datetime.utcnow(), "hour")
+        with self._lock:
+            self._counts[(content_id, hour)] += 1
+
+    def _drain(self) -> Counter:
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        return counts
+
+    def _restore(self, counts: Counter):
+        with self._lock:
+            self._counts.update(counts)
+
+    def flush(self, bind) -> int:
+        """Add buffered views to the rollups; returns how many views were written"""
+        counts = self._drain()
+        if not counts:
+            return 0
+        db = Session(bind=bind)
+        try:
+            content_ids = {content_id for content_id, _ in counts}
+            owners = {
+                row.id: row for row in db.execute(
+                    select(Content.id, Content.category_id, Content.author_id).where(Content.id.in_(content_ids))
+                )
+            }
+            deltas = defaultdict(Counter)
+            for (content_id, hour), views in counts.items():
+                owner = owners.get(content_id)
+                if owner is None:
+                    continue
+                for bucket in BUCKETS:
+                    key = (bucket, bucket_start(hour, bucket), content_id)
+                    deltas[key]["views"] += views
+                    deltas[key]["category_id"] = owner.category_id
+                    deltas[key]["author_id"] = owner.author_id
+            _add_engagement(db.connection(), deltas)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Keep the views for the next attempt
+            self._restore(counts)
+            raise
+        finally:
+            db.close()
+        return sum(counts.values())
+
+    def __len__(self):
+        with self._lock:
+            return sum(self._counts.values())
+
+
+views = ViewBuffer()
+
+_flusher_stop = threading.Event()
+_flusher: Optional[threading.Thread] = None
+
+
+def start_view_flusher(bind):
+    global _flusher
+    if settings.ANALYTICS_VIEW_FLUSH_SECONDS <= 0 or _flusher is not None:
+        return
+
+    def run():
+        while not _flusher_stop.wait(settings.ANALYTICS_VIEW_FLUSH_SECONDS):
+            try:
+                views.flush(bind)
+            except Exception as e:
+                logger.warning(f"Could not flush buffered views: {e}")
+
+    _flusher_stop.clear()
+    _flusher = threading.Thread(target=run, name="view-flusher", daemon=True)
+    _flusher.start()
+
+
+def stop_view_flusher(bind):
+    global _flusher
+    if _flusher is None:
+        return
+    _flusher_stop.set()
+    _flusher.join(5)
+    _flusher = None
+    try:
+        views.flush(bind)
+    except Exception as e:
+        logger.warning(f"Dropped {len(views)} buffered views on shutdown: {e}")
+
+
+# =========================
+# Reports
+# =========================
+
+# Longest range a report may cover, per bucket
+MAX_RANGE = {"hour": timedelta(days=31), "day": timedelta(days=3660)}
+DEFAULT_RANGE = {"hour": timedelta(hours=48), "day": timedelta(days=30)}
+
+
+def report_range(bucket: str, start: Optional[datetime], end: Optional[datetime]):
+    """Resolve a report's [start, end) in naive UTC; raises ValueError if it is too long"""
+    end = utc_naive(end) or datetime.utcnow()
+    start = utc_naive(start) or end - DEFAULT_RANGE[bucket]
+    if start >= end:
+        raise ValueError("start must be before end")
+    if end - start > MAX_RANGE[bucket]:
+        raise ValueError(f"At most {MAX_RANGE[bucket].days} days of {bucket} buckets per request")
+    return bucket_start(start, bucket), end
+
+
+def engagement_series(db: Session, bucket: str, start: datetime, end: datetime,
+                      content_id: int = None, category_id: int = None, author_id: int = None):
+    filters = [
+        EngagementRollup.bucket == bucket,
+        EngagementRollup.bucket_start >= start,
+        EngagementRollup.bucket_start < end,
+    ]
+    if content_id is not None:
+        filters.append(EngagementRollup.content_id == content_id)
+    if category_id is not None:
+        filters.append(EngagementRollup.category_id == category_id)
+    if author_id is not None:
+        filters.append(EngagementRollup.author_id == author_id)
+    rows = db.execute(
+        select(EngagementRollup.bucket_start,
+               *[func.sum(getattr(EngagementRollup, metric)).label(metric) for metric in ENGAGEMENT_METRICS])
+        .where(*filters)
+        .group_by(EngagementRollup.bucket_start)
+        .order_by(EngagementRollup.bucket_start)
+    ).all()
+    return [
+        {"bucket_start": row.bucket_start, **{metric: int(getattr(row, metric) or 0) for metric in ENGAGEMENT_METRICS}}
+        for row in rows
+    ]
+
+
+def platform_series(db: Session, bucket: str, start: datetime, end: datetime):
+    rows = db.execute(
+        select(PlatformRollup)
+        .where(PlatformRollup.bucket == bucket, PlatformRollup.bucket_start >= start, PlatformRollup.bucket_start < end)
+        .order_by(PlatformRollup.bucket_start)
+    ).scalars().all()
+    return [
+        {"bucket_start": row.bucket_start, **{metric: getattr(row, metric) for metric in PLATFORM_METRICS}}
+        for row in rows
+    ]
+
+
+def top_content(db: Session, bucket: str, start: datetime, end: datetime, metric: str, limit: int):
+    total = func.sum(getattr(EngagementRollup, metric))
+    rows = db.execute(
+        select(EngagementRollup.content_id, total.label("total"))
+        .where(EngagementRollup.bucket == bucket, EngagementRollup.bucket_start >= start,
+               EngagementRollup.bucket_start < end)
+        .group_by(EngagementRollup.content_id)
+        .order_by(total.desc(), EngagementRollup.content_id)
+        .limit(limit)
+    ).all()
+    return [{"content_id": row.content_id, metric: int(row.total or 0)} for row in rows]
+
+
+# =========================
+# Backfill
+# =========================
+
+def backfill(bind, reset: bool = False) -> Dict[str, int]:
+    """Fold all history into the rollups, optionally rebuilding them from scratch.
+
+    Views cannot be rebuilt (no row is kept per view), so a reset zeroes
+    the other counters and keeps the view counts.
+    """
+    if reset:
+        db = Session(bind=bind)
+        try:
+            db.execute(update(EngagementRollup).values(likes=0, dislikes=0, comments=0))
+            db.execute(delete(PlatformRollup))
+            db.execute(delete(RollupWatermark))
+            db.commit()
+        finally:
+            db.close()
+    return run_aggregator(bind)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Engagement rollups")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = commands.add_parser("backfill", help="fold all existing history into the rollups")
+    backfill_parser.add_argument("--reset", action="store_true", help="rebuild like/comment/platform counts from scratch")
+    args = parser.parse_args(argv)
+
+    from app.database.connection import engine
+    folded = backfill(engine, reset=args.reset)
+    for source, count in folded.items():
+        print(f"{source}: {count} rows folded")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import threading
+import time
+from typing import Any, Callable, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Small thread-safe in-process cache where every entry expires after a TTL"""
+
+    def __init__(self, ttl_seconds: float, maxsize: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.maxsize = maxsize
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                # Lazy expiry: stale entries are dropped when they are next read
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl_seconds if ttl is None else ttl)
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.maxsize:
+                self._evict()
+            self._data[key] = (expires_at, value)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key: Hashable = _MISSING):
+        """Drop one key, or everything when called without arguments"""
+        with self._lock:
+            if key is _MISSING:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+    def _evict(self):
+        # Called with the lock held: purge expired entries first, then the oldest ones
+        now = time.monotonic()
+        expired = [k for k, (expires_at, _) in self._data.items() if expires_at < now]
+        for k in expired:
+            del self._data[k]
+        while len(self._data) >= self.maxsize:
+            del self._data[next(iter(self._data))]
@@ -0,0 +1,155 @@
+"""In-memory catalogue of the categories.
+
+Categories change a few times a year but are read on every page, so the
+whole table is held as an immutable snapshot with a version number that
+goes up on each reload. Readers get the snapshot without touching the
+database; the session they pass is only used to load it when there is none.
+A lookup that misses reloads once before giving up, since the category
+may just have been created by another worker.
+
+A commit in this process that creates, updates or deletes a category
+reloads the snapshot straight away, on its own session. Changes made by
+other workers show up once the snapshot is older than
+``CATEGORY_CATALOGUE_MAX_AGE_SECONDS``.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from types import MappingProxyType
+from typing import Callable, Mapping, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database.models import Category
+from app.services.warmup import warmup_task
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CategoryEntry:
+    id: int
+    name: str
+    description: Optional[str]
+    color: Optional[str]
+    created_by: Optional[int]
+    created_at: Optional[datetime]
+
+    def as_dict(self) -> dict:
+        return {"id": self.id, "name": self.name, "description": self.description, "color": self.color}
+
+
+@dataclass(frozen=True, eq=False)
+class Catalogue:
+    version: int
+    categories: Tuple[CategoryEntry, ...]
+    by_id: Mapping[int, CategoryEntry]
+    loaded_at: float
+
+    def get(self, category_id: int) -> Optional[CategoryEntry]:
+        return self.by_id.get(category_id)
+
+    def find_by_name(self, name: str) -> Optional[CategoryEntry]:
+        return next((category for category in self.categories if category.name == name), None)
+
+
+_lock = threading.Lock()
+_current: Optional[Catalogue] = None
+_version = 0
+# Bumped by every invalidation, so a load that started before one is not installed after it
+_generation = 0
+
+
+def load_catalogue(db: Session) -> Catalogue:
+    """Read the categories into a new snapshot and make it current"""
+    global _current, _version
+    generation = _generation
+    rows = db.query(Category).order_by(Category.id).all()
+    categories = tuple(
+        CategoryEntry(id=c.id, name=c.name, description=c.description, color=c.color,
+                      created_by=c.created_by, created_at=c.created_at)
+        for c in rows
+    )
+    with _lock:
+        _version += 1
+        catalogue = Catalogue(
+            version=_version,
+            categories=categories,
+            by_id=MappingProxyType({category.id: category for category in categories}),
+            loaded_at=time.monotonic(),
+        )
+        if generation == _generation:
+            _current = catalogue
+    return catalogue
+
+
+def get_catalogue(db: Session) -> Catalogue:
+    """The current snapshot; ``db`` is only queried when there is none or it is too old"""
+    catalogue = _current
+    if catalogue is None or time.monotonic() - catalogue.loaded_at > settings.CATEGORY_CATALOGUE_MAX_AGE_SECONDS:
+        catalogue = load_catalogue(db)
+    return catalogue
+
+
+def list_categories(db: Session) -> Tuple[CategoryEntry, ...]:
+    return get_catalogue(db).categories
+
+
+def _lookup(db: Session, find: Callable[[Catalogue], Optional[CategoryEntry]]) -> Optional[CategoryEntry]:
+    loaded = _current
+    catalogue = get_catalogue(db)
+    found = find(catalogue)
+    if found is None and catalogue is loaded:
+        # Not loaded just now: the category may be newer than the snapshot
+        found = find(load_catalogue(db))
+    return found
+
+
+def get_category(db: Session, category_id: int) -> Optional[CategoryEntry]:
+    return _lookup(db, lambda catalogue: catalogue.get(category_id))
+
+
+def find_category_by_name(db: Session, name: str) -> Optional[CategoryEntry]:
+    return _lookup(db, lambda catalogue: catalogue.find_by_name(name))
+
+
+def invalidate_catalogue():
+    global _current, _generation
+    with _lock:
+        _current = None
+        _generation += 1
+
+
+@warmup_task("categories")
+def _warm_catalogue(db: Session):
+    load_catalogue(db)
+
+
+def _mark_stale(mapper, connection, target):
+    Session.object_session(target).info["category_catalogue_stale"] = True
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(Category, _event, _mark_stale)
+
+
+@event.listens_for(Session, "after_commit")
+def _reload_committed(session):
+    if not session.info.pop("category_catalogue_stale", False):
+        return
+    invalidate_catalogue()
+    try:
+        with Session(bind=session.get_bind()) as db:
+            load_catalogue(db)
+    except Exception as e:
+        # The next reader loads it instead
+        logger.warning(f"Reloading the category catalogue failed: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_uncommitted(session):
+    session.info.pop("category_catalogue_stale", None)
@@ -0,0 +1,146 @@
+"""Category-subscriber notification fan-out, off the request path.
+
+Approving content records a ``NotificationFanout`` row, and a job to
+deliver it, in the same transaction and returns. ``run_fanout`` then streams subscriber ids in
+``user_id`` order, one chunk at a time. Each chunk's notifications are
+written with a single executemany, in the same transaction that advances
+the fan-out's ``last_user_id`` cursor. A crash therefore loses at most the
+uncommitted chunk, and the job's retry resumes after the last committed one.
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database.models import Category, Content, NotificationFanout, NotificationTypeEnum, user_categories
+from app.services.jobs import enqueue, enqueue_many, job_handler
+from app.services.notifications import bulk_create_notifications
+
+logger = logging.getLogger(__name__)
+
+
+def create_category_fanout(db: Session, content: Content, category: Category) -> NotificationFanout:
+    """Queue "new content" notifications for the category's subscribers; the caller commits"""
+    fanout = NotificationFanout(
+        content_id=content.id,
+        category_id=category.id,
+        exclude_user_id=content.author_id,
+        notification_type=NotificationTypeEnum.STATUS_CHANGE,
+        title=f"New content in {category.name}",
+        message=f"\"{content.title}\" was just published.",
+    )
+    db.add(fanout)
+    db.flush()
+    enqueue(db, "notifications.category_fanout", {"fanout_id": fanout.id},
+            idempotency_key=f"fanout:{fanout.id}")
+    return fanout
+
+
+def create_category_fanouts(db: Session, contents) -> int:
+    """``create_category_fanout`` for many content rows with one INSERT each for
+    fan-outs and jobs; the caller commits.
+
+    Each row needs ``id``, ``title``, ``author_id`` and ``category_id``.
+    """
+    contents = [content for content in contents if content.category_id]
+    if not contents:
+        return 0
+    names = dict(db.execute(
+        select(Category.id, Category.name).where(Category.id.in_({content.category_id for content in contents}))
+    ).all())
+    contents = [content for content in contents if content.category_id in names]
+    if not contents:
+        return 0
+    fanout_ids = db.execute(
+        insert(NotificationFanout).returning(NotificationFanout.id, sort_by_parameter_order=True),
+        [
+            {
+                "content_id": content.id,
+                "category_id": content.category_id,
+                "exclude_user_id": content.author_id,
+                "notification_type": NotificationTypeEnum.STATUS_CHANGE,
+                "title": f"New content in {names[content.category_id]}",
+                "message": f"\"{content.title}\" was just published.",
+            }
+            for content in contents
+        ],
+    ).scalars().all()
+    return enqueue_many(
+        db, "notifications.category_fanout",
+        [{"fanout_id": fanout_id} for fanout_id in fanout_ids],
+        idempotency_keys=[f"fanout:{fanout_id}" for fanout_id in fanout_ids],
+    )
+
+
+def _deliver_chunk(db: Session, fanout: NotificationFanout, chunk_size: int) -> bool:
+    """Notify the next chunk of subscribers; returns False once the fan-out is finished"""
+    subscriber_ids = db.execute(
+        select(user_categories.c.user_id)
+        .where(user_categories.c.category_id == fanout.category_id)
+        .where(user_categories.c.user_id > fanout.last_user_id)
+        .order_by(user_categories.c.user_id)
+        .limit(chunk_size)
+    ).scalars().all()
+
+    if not subscriber_ids:
+        fanout.is_complete = True
+        fanout.completed_at = datetime.utcnow()
+        db.commit()
+        return False
+
+    delivered = bulk_create_notifications(db, [
+        {
+            "user_id": user_id,
+            "notification_type": fanout.notification_type,
+            "title": fanout.title,
+            "message": fanout.message,
+            "related_content_id": fanout.content_id,
+        }
+        for user_id in subscriber_ids
+        if user_id != fanout.exclude_user_id
+    ])
+
+    # Compare-and-set on the cursor: if another runner already delivered this
+    # chunk, roll ours back instead of notifying everyone twice
+    advanced = db.execute(
+        update(NotificationFanout)
+        .where(NotificationFanout.id == fanout.id)
+        .where(NotificationFanout.last_user_id == fanout.last_user_id)
+        .values(
+            last_user_id=subscriber_ids[-1],
+            delivered_count=NotificationFanout.delivered_count + delivered,
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not advanced:
+        db.rollback()
+        return False
+    db.commit()
+    db.refresh(fanout)
+    return True
+
+
+def run_fanout(fanout_id: int, bind, chunk_size: int = None):
+    """Deliver a fan-out to completion in its own session (safe to re-run)"""
+    chunk_size = chunk_size or settings.NOTIFICATION_FANOUT_CHUNK_SIZE
+    db = Session(bind=bind)
+    try:
+        fanout = db.get(NotificationFanout, fanout_id)
+        if fanout is None:
+            return
+        while not fanout.is_complete and _deliver_chunk(db, fanout, chunk_size):
+            pass
+        logger.info(f"Fan-out {fanout_id} delivered {fanout.delivered_count} notifications")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+@job_handler("notifications.category_fanout")
+def _run_fanout_job(db: Session, payload: dict):
+    # Chunks commit as they go, so use a separate session from the job's
+    run_fanout(payload["fanout_id"], db.get_bind())
@@ -0,0 +1,120 @@
+"""Fixed-size avatar variants, generated once at upload time.
+
+Each uploaded avatar is center-cropped to a square and rendered at every
+size in ``AVATAR_VARIANT_SIZES``, in every format in
+``AVATAR_VARIANT_FORMATS``. The work runs on a small thread pool
+(``IMAGE_WORKERS``); Pillow releases the GIL while it resizes and encodes.
+Variants go into content-addressed storage like the avatar itself, so their
+URLs never change meaning and can be cached forever.
+
+Pillow is a requirement. Should it be missing anyway, uploads still work
+and profiles simply have no variants.
+"""
+import asyncio
+import json
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.services import storage
+from app.services.uploads import avatar_dir
+
+logger = logging.getLogger(__name__)
+
+# Variants rendered before they moved into storage are still served from here
+VARIANTS_URL_PREFIX = "/avatar-variants"
+
+# Pillow save() arguments per format
+ENCODERS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def variants_dir() -> str:
+    return os.path.join(avatar_dir(), "variants")
+
+
+def pillow_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def render_variants(source_path: str, directory: str) -> Dict[str, Dict[str, str]]:
+    """Write every size/format variant of an image into ``directory``; returns {size: {format: path}}"""
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as image:
+        # Lets JPEG decode at a reduced scale that still covers the largest variant
+        image.draft("RGB", (max(settings.AVATAR_VARIANT_SIZES),) * 2)
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGB")
+        side = min(image.size)
+        left, top = (image.width - side) // 2, (image.height - side) // 2
+        square = image.crop((left, top, left + side, top + side))
+
+    variants = {}
+    for size in settings.AVATAR_VARIANT_SIZES:
+        resized = square.resize((size, size), Image.LANCZOS) if side != size else square
+        variants[str(size)] = {}
+        for extension in settings.AVATAR_VARIANT_FORMATS:
+            path = os.path.join(directory, f"{size}.{extension}")
+            resized.save(path, **ENCODERS[extension])
+            variants[str(size)][extension] = path
+    return variants
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS, thread_name_prefix="image")
+    return _pool
+
+
+def _store_variants(db: Session, variants: Dict[str, Dict[str, str]]) -> Dict[str, Dict[str, str]]:
+    return {
+        size: {extension: storage.media_url(storage.store_file(db, path, extension)) for extension, path in formats.items()}
+        for size, formats in variants.items()
+    }
+
+
+async def create_avatar_variants(db: Session, source_path: str) -> Optional[Dict[str, Dict[str, str]]]:
+    """Render an avatar's variants on the image pool and store them; returns their URLs, or None if that is not possible"""
+    if not pillow_available():
+        logger.warning("Pillow is not installed; avatar stored without variants")
+        return None
+    loop = asyncio.get_running_loop()
+    with tempfile.TemporaryDirectory(prefix="avatar-variants-") as directory:
+        try:
+            variants = await loop.run_in_executor(_executor(), render_variants, source_path, directory)
+        except Exception as e:
+            # An image Pillow cannot decode still works as a plain avatar
+            logger.warning(f"Could not create variants of {source_path}: {e}")
+            return None
+        return await run_in_threadpool(_store_variants, db, variants)
+
+
+def encode_variants(variants: Optional[dict]) -> Optional[str]:
+    return json.dumps(variants, separators=(",", ":")) if variants else None
+
+
+def variant_urls(encoded: Optional[str]) -> List[str]:
+    if not encoded:
+        return []
+    return [url for formats in json.loads(encoded).values() for url in formats.values()]
+
+
+def release_avatar(db: Session, profile):
+    """Drop the profile's references to its stored avatar and variants"""
+    storage.release_urls(db, [profile.avatar_url, *variant_urls(profile.avatar_variants)])
@@ -0,0 +1,345 @@
+"""Durable background jobs backed by the ``jobs`` table.
+
+Request handlers ``enqueue`` a job in their own transaction, so a job
+exists exactly when the change that caused it was committed. Worker
+threads then claim due jobs one at a time with a compare-and-set UPDATE
+(``FOR UPDATE SKIP LOCKED`` on PostgreSQL). The claim holds a lease of
+``JOB_VISIBILITY_TIMEOUT_SECONDS``. A job whose worker died mid-run
+becomes claimable again when its lease runs out.
+
+A handler's writes through the session it is given commit together with
+the job's completion, so they apply once. Anything else it does (another
+session, a network call) is at-least-once and must be safe to repeat.
+Failed runs are retried with exponential backoff until ``max_attempts``.
+After that the job is left as ``failed`` for an admin to inspect or retry.
+"""
+import importlib
+import json
+import logging
+import random
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database.models import Job, JobStatusEnum
+
+logger = logging.getLogger(__name__)
+
+# Modules whose import registers job handlers
+HANDLER_MODULES = [
+    "app.services.notifications",
+    "app.services.fanout",
+    "app.services.unread_counts",
+    "app.services.retention",
+    "app.services.analytics",
+    "app.services.media_uploads",
+    "app.services.storage",
+]
+
+_handlers: Dict[str, Callable] = {}
+# kind -> seconds between runs
+_recurring: Dict[str, float] = {}
+
+
+def job_handler(kind: str, every: Optional[float] = None):
+    """Register ``fn(db, payload)`` as the handler for jobs of ``kind``.
+
+    With ``every``, the job also runs on its own every ``every`` seconds.
+    """
+    def decorator(fn):
+        _handlers[kind] = fn
+        if every:
+            _recurring[kind] = every
+        return fn
+    return decorator
+
+
+def load_handlers():
+    for module in HANDLER_MODULES:
+        importlib.import_module(module)
+
+
+def enqueue(
+    db: Session,
+    kind: str,
+    payload: Optional[dict] = None,
+    idempotency_key: Optional[str] = None,
+    delay_seconds: float = 0,
+    max_attempts: Optional[int] = None,
+) -> Job:
+    """Add a job to the caller's transaction; the caller commits.
+
+    If a job with the same ``idempotency_key`` already exists, that job is
+    returned and no new one is added.
+    """
+    if idempotency_key:
+        existing = db.query(Job).filter(Job.idempotency_key == idempotency_key).first()
+        if existing:
+            return existing
+
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        idempotency_key=idempotency_key,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        run_at=datetime.utcnow() + timedelta(seconds=delay_seconds),
+    )
+    if not idempotency_key:
+        db.add(job)
+        return job
+
+    # Another request may enqueue the same key concurrently: let the unique
+    # index decide, without rolling back the caller's own work
+    try:
+        with db.begin_nested():
+            db.add(job)
+    except IntegrityError:
+        return db.query(Job).filter(Job.idempotency_key == idempotency_key).one()
+    return job
+
+
+def enqueue_many(db: Session, kind: str, payloads: List[dict], idempotency_keys: List[str] = None) -> int:
+    """Add many jobs with one INSERT; the caller commits.
+
+    Unlike ``enqueue``, existing keys are not looked up first, so only pass
+    keys that cannot exist yet (for example, derived from rows just inserted).
+    """
+    if not payloads:
+        return 0
+    keys = idempotency_keys or [None] * len(payloads)
+    now = datetime.utcnow()
+    db.execute(insert(Job), [
+        {"kind": kind, "payload": json.dumps(payload), "idempotency_key": key,
+         "max_attempts": settings.JOB_MAX_ATTEMPTS, "run_at": now}
+        for payload, key in zip(payloads, keys)
+    ])
+    return len(payloads)
+
+
+def _schedule_next(db: Session, kind: str, interval: float):
+    # One job per time slot: the idempotency key stops several processes
+    # (or a finished run and a restart) from queueing the same slot twice
+    now = time.time()
+    slot = int(now // interval) + 1
+    enqueue(db, kind, idempotency_key=f"{kind}@{slot}", delay_seconds=slot * interval - now)
+
+
+def schedule_recurring(db: Session):
+    """Queue the next run of every recurring job that has none; the caller commits"""
+    for kind, interval in _recurring.items():
+        _schedule_next(db, kind, interval)
+
+
+def _claimable(now):
+    return or_(
+        and_(Job.status == JobStatusEnum.QUEUED, Job.run_at <= now),
+        # Lease ran out: the worker holding it is gone or stuck
+        and_(Job.status == JobStatusEnum.RUNNING, Job.locked_until < now),
+    )
+
+
+def claim_next(db: Session, worker_id: str) -> Optional[Job]:
+    """Lease the next due job to ``worker_id``, or return None"""
+    while True:
+        now = datetime.utcnow()
+        job_id = db.execute(
+            select(Job.id)
+            .where(_claimable(now))
+            .order_by(Job.run_at, Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).scalar()
+        if job_id is None:
+            db.rollback()
+            return None
+
+        claimed = db.execute(
+            update(Job)
+            .where(Job.id == job_id)
+            .where(_claimable(now))
+            .values(
+                status=JobStatusEnum.RUNNING,
+                attempts=Job.attempts + 1,
+                locked_by=worker_id,
+                locked_until=now + timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT_SECONDS),
+                started_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        if claimed:
+            return db.get(Job, job_id, populate_existing=True)
+        # Another worker won the race for this job; look for the next one
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, capped at JOB_RETRY_MAX_SECONDS"""
+    delay = min(
+        settings.JOB_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0),
+        settings.JOB_RETRY_MAX_SECONDS,
+    )
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _settle(db: Session, job: Job, worker_id: str, **values) -> bool:
+    # Only the current lease holder may settle the job; the caller commits
+    return bool(db.execute(
+        update(Job)
+        .where(Job.id == job.id)
+        .where(Job.status == JobStatusEnum.RUNNING)
+        .where(Job.locked_by == worker_id)
+        .values(locked_by=None, locked_until=None, **values)
+        .execution_options(synchronize_session=False)
+    ).rowcount)
+
+
+def execute_job(db: Session, job: Job, worker_id: str) -> bool:
+    """Run a claimed job and record the outcome; returns True on success"""
+    handler = _handlers.get(job.kind)
+    job_id, kind = job.id, job.kind
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job kind '{kind}'")
+        handler(db, json.loads(job.payload))
+        # Marked done in the handler's own transaction, so its writes and
+        # the job's completion commit together
+        if not _settle(db, job, worker_id, status=JobStatusEnum.SUCCEEDED, finished_at=datetime.utcnow()):
+            db.rollback()
+            logger.warning(f"Job {job_id} ({kind}) lost its lease before finishing; discarding this run")
+            return False
+        if kind in _recurring:
+            _schedule_next(db, kind, _recurring[kind])
+        db.commit()
+        return True
+    except Exception:
+        db.rollback()
+        error = traceback.format_exc(limit=5)
+        if job.attempts >= job.max_attempts:
+            logger.error(f"Job {job_id} ({kind}) failed permanently after {job.attempts} attempts")
+            if _settle(db, job, worker_id, status=JobStatusEnum.FAILED,
+                       last_error=error, finished_at=datetime.utcnow()) and kind in _recurring:
+                # A recurring job that gave up still runs again in its next slot
+                _schedule_next(db, kind, _recurring[kind])
+        else:
+            delay = retry_delay(job.attempts)
+            logger.warning(f"Job {job_id} ({kind}) failed, retrying in {delay:.0f}s")
+            _settle(db, job, worker_id, status=JobStatusEnum.QUEUED, last_error=error,
+                    run_at=datetime.utcnow() + timedelta(seconds=delay))
+        db.commit()
+        return False
+
+
+def run_pending(bind, worker_id: Optional[str] = None, max_jobs: Optional[int] = None) -> int:
+    """Run due jobs until the queue is empty (or ``max_jobs``); returns how many ran"""
+    load_handlers()
+    worker_id = worker_id or f"{socket.gethostname()}:{threading.get_ident()}"
+    ran = 0
+    db = Session(bind=bind)
+    try:
+        while max_jobs is None or ran < max_jobs:
+            job = claim_next(db, worker_id)
+            if job is None:
+                break
+            execute_job(db, job, worker_id)
+            ran += 1
+    finally:
+        db.close()
+    return ran
+
+
+class JobWorkerPool:
+    """Worker threads polling the jobs table until stopped"""
+
+    def __init__(self, bind, workers: int, poll_interval: float):
+        self.bind = bind
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _work(self, worker_id: str):
+        while not self._stop.is_set():
+            try:
+                ran = run_pending(self.bind, worker_id=worker_id, max_jobs=100)
+            except Exception as e:
+                logger.warning(f"Job worker {worker_id} could not poll the queue: {e}")
+                ran = 0
+            if not ran:
+                self._stop.wait(self.poll_interval)
+
+    def start(self):
+        load_handlers()
+        host = socket.gethostname()
+        for n in range(self.workers):
+            thread = threading.Thread(
+                target=self._work, args=(f"{host}:{n}",), name=f"job-worker-{n}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+
+_pool: Optional[JobWorkerPool] = None
+
+
+def start_workers(bind):
+    global _pool
+    if settings.JOB_WORKERS <= 0 or _pool is not None:
+        return
+    load_handlers()
+    db = Session(bind=bind)
+    try:
+        schedule_recurring(db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Could not schedule recurring jobs: {e}")
+    finally:
+        db.close()
+    _pool = JobWorkerPool(bind, settings.JOB_WORKERS, settings.JOB_POLL_INTERVAL_SECONDS)
+    _pool.start()
+
+
+def stop_workers():
+    global _pool
+    if _pool is not None:
+        _pool.stop()
+        _pool = None
+
+
+def queue_stats(db: Session) -> dict:
+    """Queue depth per status, plus how far behind the workers are"""
+    now = datetime.utcnow()
+    counts = dict(
+        db.query(Job.status, func.count(Job.id)).group_by(Job.status).all()
+    )
+    ready = db.query(func.count(Job.id), func.min(Job.run_at)).filter(
+        Job.status == JobStatusEnum.QUEUED, Job.run_at <= now
+    ).one()
+    stuck = db.query(func.count(Job.id)).filter(
+        Job.status == JobStatusEnum.RUNNING, Job.locked_until < now
+    ).scalar()
+    oldest_ready = ready[1]
+    if isinstance(oldest_ready, str):
+        oldest_ready = datetime.fromisoformat(oldest_ready)
+    return {
+        "counts": {status.value: counts.get(status, 0) for status in JobStatusEnum},
+        "ready": ready[0],
+        "expired_leases": stuck,
+        # How long the oldest due job has been waiting for a worker
+        "lag_seconds": (now - oldest_ready).total_seconds() if oldest_ready else 0.0,
+        "workers": _pool.workers if _pool else 0,
+    }
@@ -0,0 +1,286 @@
+"""Resumable, chunked uploads of audio and video files.
+
+The protocol follows tus: ``create_upload`` registers a file of known size,
+each PATCH appends a chunk at the current offset, HEAD reports the offset,
+and ``finalize_upload`` moves the finished file into content-addressed
+storage (app.services.storage), where it is served from ``/media``.
+
+A chunk is streamed from the request onto the end of a ``.part`` file in
+the staging directory and is never held in memory. The writer holds an
+exclusive ``flock`` on that file; a PATCH arriving meanwhile gets 423. The offset only moves
+once the chunk is on disk, so a dropped connection costs at most the chunk
+in flight: without a checksum the bytes that did arrive are kept, as tus
+does. A chunk may carry ``Upload-Checksum: <algorithm> <base64 digest>``.
+If the digest does not match, the chunk is cut off again and rejected.
+Completing an upload takes the same lock, so two completes store the
+file once and a complete never hashes a file a PATCH is still writing.
+A finished upload keeps its stored file when it is deleted, since
+content that uses its media_url does not count as a reference.
+
+Uploads that receive no chunk for ``MEDIA_UPLOAD_EXPIRE_SECONDS`` are
+deleted by the ``media_uploads.cleanup`` job.
+"""
+import base64
+import binascii
+import fcntl
+import hashlib
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional
+
+import anyio
+from fastapi import HTTPException, status
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import ObjectDeletedError
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+
+from app.core.config import settings
+from app.database.models import MediaUpload, MediaUploadStatusEnum
+from app.services import storage
+from app.services.jobs import job_handler
+from app.services.uploads import staging_dir
+
+logger = logging.getLogger(__name__)
+
+MEDIA_EXTENSIONS = {"mp3", "m4a", "aac", "wav", "ogg", "oga", "opus", "flac", "mp4", "m4v", "webm", "mov"}
+
+# tus: a chunk whose Upload-Checksum does not match
+HTTP_460_CHECKSUM_MISMATCH = 460
+
+
+def part_path(upload_id: str) -> str:
+    return os.path.join(staging_dir(), f"{upload_id}.part")
+
+
+def _remove_part(upload_id: str):
+    try:
+        os.unlink(part_path(upload_id))
+    except FileNotFoundError:
+        pass
+
+
+def _parse_checksum(header: Optional[str]):
+    # "sha256 <base64 digest>" -> (hash object, digest bytes)
+    if header is None:
+        return None, None
+    algorithm, _, encoded = header.strip().partition(" ")
+    algorithm = algorithm.lower()
+    if algorithm not in hashlib.algorithms_guaranteed or algorithm.startswith("shake"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unsupported checksum algorithm {algorithm!r}")
+    try:
+        expected = base64.b64decode(encoded.strip(), validate=True)
+    except binascii.Error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Upload-Checksum must be base64")
+    return hashlib.new(algorithm), expected
+
+
+def create_upload(db: Session, user_id: int, filename: str, size: int) -> MediaUpload:
+    """Register an upload of ``size`` bytes; the caller gets its id and sends chunks"""
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension not in MEDIA_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File must be one of: {', '.join(sorted(MEDIA_EXTENSIONS))}"
+        )
+    if size > settings.MEDIA_UPLOAD_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File must be at most {settings.MEDIA_UPLOAD_MAX_BYTES // (1024 * 1024)} MB"
+        )
+    upload = MediaUpload(id=uuid.uuid4().hex, user_id=user_id, filename=filename, extension=extension,
+                         total_size=size, upload_offset=0)
+    os.makedirs(staging_dir(), exist_ok=True)
+    open(part_path(upload.id), "wb").close()
+    db.add(upload)
+    db.commit()
+    db.refresh(upload)
+    return upload
+
+
+def get_upload(db: Session, upload_id: str, user_id: int) -> MediaUpload:
+    upload = db.get(MediaUpload, upload_id)
+    if upload is None or upload.user_id != user_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+    return upload
+
+
+def expires_at(upload: MediaUpload) -> Optional[datetime]:
+    if upload.status != MediaUploadStatusEnum.UPLOADING:
+        return None
+    return upload.updated_at + timedelta(seconds=settings.MEDIA_UPLOAD_EXPIRE_SECONDS)
+
+
+def _refresh(db: Session, upload: MediaUpload):
+    try:
+        db.refresh(upload)
+    except ObjectDeletedError:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Upload has expired")
+
+
+def _check_offset(upload: MediaUpload, offset: int):
+    if upload.status != MediaUploadStatusEnum.UPLOADING:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload is already complete")
+    if offset != upload.upload_offset:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload is at offset {upload.upload_offset}",
+            headers={"Upload-Offset": str(upload.upload_offset)},
+        )
+
+
+async def append_chunk(db: Session, upload: MediaUpload, offset: int, chunks: AsyncIterator[bytes],
+                       checksum: Optional[str] = None) -> int:
+    """Append the bytes of ``chunks`` at ``offset``; returns the new offset"""
+    _check_offset(upload, offset)
+    digest, expected = _parse_checksum(checksum)
+    try:
+        part = await anyio.open_file(part_path(upload.id), "r+b")
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Upload has expired")
+    async with part:
+        # One writer per upload: a second PATCH must not truncate or overwrite bytes the first acknowledges
+        try:
+            fcntl.flock(part.wrapped.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise HTTPException(status_code=status.HTTP_423_LOCKED, detail="Another chunk is being written")
+        # Another PATCH may have moved the offset, or the upload may be gone, by the time this one has the lock
+        _refresh(db, upload)
+        _check_offset(upload, offset)
+        written = await _write_chunk(part, upload, offset, chunks, digest, expected)
+
+        # Still under the lock, so the next chunk sees this offset
+        db.execute(
+            update(MediaUpload)
+            .where(MediaUpload.id == upload.id)
+            .values(upload_offset=offset + written, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    db.refresh(upload)
+    return upload.upload_offset
+
+
+async def _write_chunk(part, upload: MediaUpload, offset: int, chunks: AsyncIterator[bytes], digest, expected) -> int:
+    """Write ``chunks`` at ``offset`` into the locked part file; returns how many bytes to acknowledge"""
+    remaining = upload.total_size - offset
+    written = 0
+    # Drops anything past the last acknowledged byte, e.g. from a chunk that failed its checksum
+    await part.truncate(offset)
+    await part.seek(offset)
+    try:
+        async for chunk in chunks:
+            if written + len(chunk) > remaining:
+                await part.truncate(offset)
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                    detail="Chunk runs past the end of the upload")
+            if digest is not None:
+                digest.update(chunk)
+            await part.write(chunk)
+            written += len(chunk)
+    except ClientDisconnect:
+        logger.info(f"Upload {upload.id} disconnected after {written} bytes of a chunk")
+        if digest is not None:
+            # A partial chunk cannot match its checksum; the client resends all of it
+            await part.truncate(offset)
+            return 0
+    else:
+        if digest is not None and digest.digest() != expected:
+            await part.truncate(offset)
+            raise HTTPException(status_code=HTTP_460_CHECKSUM_MISMATCH, detail="Chunk checksum does not match")
+    await part.flush()
+    await anyio.to_thread.run_sync(os.fsync, part.wrapped.fileno())
+    return written
+
+
+async def finalize_upload(db: Session, upload: MediaUpload, sha256: Optional[str] = None) -> MediaUpload:
+    """Move a fully received upload into storage; ``sha256`` (hex) checks the whole file"""
+    if upload.status == MediaUploadStatusEnum.COMPLETE:
+        return upload
+    try:
+        part = await anyio.open_file(part_path(upload.id), "rb")
+    except FileNotFoundError:
+        # Finished by another request meanwhile, or expired
+        _refresh(db, upload)
+        if upload.status == MediaUploadStatusEnum.COMPLETE:
+            return upload
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Upload has expired")
+    async with part:
+        # The chunk writers' lock: one request stores the file, a concurrent one gets 423
+        try:
+            fcntl.flock(part.wrapped.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise HTTPException(status_code=status.HTTP_423_LOCKED, detail="Upload is being written or completed")
+        _refresh(db, upload)
+        if upload.status == MediaUploadStatusEnum.COMPLETE:
+            return upload
+        if upload.upload_offset != upload.total_size:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Upload has {upload.upload_offset} of {upload.total_size} bytes",
+                headers={"Upload-Offset": str(upload.upload_offset)},
+            )
+        path = part_path(upload.id)
+        digest = await run_in_threadpool(storage.hash_file, path)
+        if sha256 is not None and sha256.lower() != digest:
+            raise HTTPException(status_code=HTTP_460_CHECKSUM_MISMATCH, detail="File checksum does not match")
+        key = await run_in_threadpool(storage.store_file, db, path, upload.extension, None, digest)
+        # Claimed in the transaction that took the reference, so a complete that got
+        # past the lock some other way (another host) rolls its reference back
+        claimed = db.execute(
+            update(MediaUpload)
+            .where(MediaUpload.id == upload.id, MediaUpload.status == MediaUploadStatusEnum.UPLOADING)
+            .values(key=key, status=MediaUploadStatusEnum.COMPLETE, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            db.rollback()
+            _refresh(db, upload)
+            return upload
+        db.commit()
+    db.refresh(upload)
+    _remove_part(upload.id)
+    logger.info(f"Upload {upload.id} stored as {upload.key} ({upload.total_size} bytes)")
+    return upload
+
+
+def delete_upload(db: Session, upload: MediaUpload):
+    """Abort an upload, or forget a finished one.
+
+    A finished upload's stored file is kept: its media_url may already be on
+    a content item, which holds no reference of its own.
+    """
+    db.delete(upload)
+    db.commit()
+    _remove_part(upload.id)
+
+
+def cleanup_abandoned(db: Session, now: Optional[datetime] = None) -> int:
+    """Delete unfinished uploads that stopped receiving chunks; returns how many"""
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=settings.MEDIA_UPLOAD_EXPIRE_SECONDS)
+    abandoned = db.query(MediaUpload.id).filter(
+        MediaUpload.status == MediaUploadStatusEnum.UPLOADING,
+        MediaUpload.updated_at < cutoff,
+    ).all()
+    ids = [upload_id for upload_id, in abandoned]
+    if not ids:
+        return 0
+    # Guarded by the cutoff again, in case a chunk arrived meanwhile
+    removed = db.query(MediaUpload).filter(
+        MediaUpload.id.in_(ids), MediaUpload.updated_at < cutoff,
+    ).delete(synchronize_session=False)
+    db.commit()
+    kept = {upload_id for upload_id, in db.query(MediaUpload.id).filter(MediaUpload.id.in_(ids))}
+    for upload_id in ids:
+        if upload_id not in kept:
+            _remove_part(upload_id)
+    logger.info(f"Removed {removed} abandoned media uploads")
+    return removed
+
+
+@job_handler("media_uploads.cleanup", every=settings.MEDIA_UPLOAD_CLEANUP_INTERVAL_SECONDS)
+def _cleanup_job(db: Session, payload: dict):
+    cleanup_abandoned(db)
@@ -0,0 +1,249 @@
+"""Bulk moderation: one transaction and a fixed number of statements per batch.
+
+Each operation changes every matching item with one ``UPDATE ... WHERE id
+IN (...) RETURNING``. Its conditions skip items already in the target
+state, so the returned rows are exactly the items that changed, even when
+two admins work the same backlog. The authors of changed items are
+notified with one batched insert in the same transaction. Every requested
+id gets a result: the action taken, ``unchanged`` or ``not_found``.
+
+These statements bypass the ORM, so they mark the admin dashboard counts
+stale themselves.
+
+The work queues hand moderators disjoint items. Content in review and
+unresolved flags are claimed oldest first, for ``MODERATION_LEASE_SECONDS``.
+Claiming is one ``UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP
+LOCKED) RETURNING``. On PostgreSQL, concurrent claims skip each other's
+rows. SQLite serialises writers, so the statement is atomic there on its
+own. An expired lease makes the item claimable again, and claiming again
+renews the caller's own leases.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+from app.database.models import Content, ContentFlag, ContentStatusEnum, NotificationTypeEnum
+from app.services.admin_stats import mark_admin_stats_stale
+from app.services.public_feed import mark_public_feed_stale
+from app.services.fanout import create_category_fanouts
+from app.services.notifications import bulk_create_notifications, notification_row
+
+UNCHANGED = "unchanged"
+NOT_FOUND = "not_found"
+
+
+def _unique(ids: List[int]) -> List[int]:
+    return list(dict.fromkeys(ids))
+
+
+def _results(db: Session, model, ids: List[int], changed: Dict[int, str]) -> List[dict]:
+    missing = [item_id for item_id in ids if item_id not in changed]
+    existing = set(db.execute(select(model.id).where(model.id.in_(missing))).scalars()) if missing else set()
+    return [
+        {"id": item_id, "status": changed.get(item_id) or (UNCHANGED if item_id in existing else NOT_FOUND)}
+        for item_id in ids
+    ]
+
+
+def _set_content_status(db: Session, ids: List[int], new_status: ContentStatusEnum, **values):
+    return db.execute(
+        update(Content)
+        .where(Content.id.in_(ids), Content.status != new_status)
+        .values(status=new_status, claimed_by=None, claim_expires_at=None, **values)
+        .returning(Content.id, Content.title, Content.author_id, Content.category_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+
+def approve_content(db: Session, ids: List[int]) -> List[dict]:
+    """Publish content; the caller commits"""
+    ids = _unique(ids)
+    approved = _set_content_status(db, ids, ContentStatusEnum.PUBLISHED, published_at=func.now())
+    bulk_create_notifications(db, [
+        notification_row(
+            row.author_id, NotificationTypeEnum.STATUS_CHANGE, "Content Approved",
+            f"Your content '{row.title}' has been approved and published", row.id,
+        )
+        for row in approved
+    ])
+    create_category_fanouts(db, approved)
+    if approved:
+        mark_admin_stats_stale(db)
+        mark_public_feed_stale(db)
+    return _results(db, Content, ids, {row.id: "approved" for row in approved})
+
+
+def reject_content(db: Session, ids: List[int]) -> List[dict]:
+    """Reject content; the caller commits"""
+    ids = _unique(ids)
+    rejected = _set_content_status(db, ids, ContentStatusEnum.REJECTED)
+    bulk_create_notifications(db, [
+        notification_row(
+            row.author_id, NotificationTypeEnum.STATUS_CHANGE, "Content Rejected",
+            f"Your content '{row.title}' has been rejected. Please review the content guidelines and try again.",
+            row.id,
+        )
+        for row in rejected
+    ])
+    if rejected:
+        mark_admin_stats_stale(db)
+        mark_public_feed_stale(db)
+    return _results(db, Content, ids, {row.id: "rejected" for row in rejected})
+
+
+def flag_content(db: Session, ids: List[int], flagged_by: int, reason: str = None) -> List[dict]:
+    """Flag content for review; the caller commits"""
+    ids = _unique(ids)
+    reason = reason or "No reason provided"
+    flagged = db.execute(
+        update(Content)
+        .where(Content.id.in_(ids), Content.is_flagged.isnot(True))
+        .values(is_flagged=True)
+        .returning(Content.id, Content.title, Content.author_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    bulk_create_notifications(db, [
+        notification_row(
+            row.author_id, NotificationTypeEnum.FLAG, "Content Flagged",
+            f"Your content '{row.title}' has been flagged for review. Reason: {reason}", row.id,
+        )
+        for row in flagged
+        if row.author_id != flagged_by
+    ])
+    if flagged:
+        mark_public_feed_stale(db)
+    return _results(db, Content, ids, {row.id: "flagged" for row in flagged})
+
+
+def resolve_flags(db: Session, ids: List[int], resolved_by: int, action: str, admin_notes: str = None) -> List[dict]:
+    """Resolve flags; ``approve`` also removes the flagged content. The caller commits"""
+    ids = _unique(ids)
+    resolved = db.execute(
+        update(ContentFlag)
+        .where(ContentFlag.id.in_(ids), ContentFlag.is_resolved.isnot(True))
+        .values(is_resolved=True, resolved_by=resolved_by, resolved_at=func.now(), admin_notes=admin_notes,
+                claimed_by=None, claim_expires_at=None)
+        .returning(ContentFlag.id, ContentFlag.content_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if action == "approve" and resolved:
+        # Deleted through the ORM, as the single-flag endpoint does, so
+        # relationship handling and the dashboard hooks still apply
+        content_ids = {row.content_id for row in resolved}
+        for content in db.query(Content).filter(Content.id.in_(content_ids)).all():
+            db.delete(content)
+    if resolved:
+        mark_admin_stats_stale(db)
+    return _results(db, ContentFlag, ids, {row.id: "resolved" for row in resolved})
+
+
+# =========================
+# Work queues
+# =========================
+
+# queue name -> (model, condition for being in the queue)
+QUEUES = {
+    "content": (Content, lambda: Content.status == ContentStatusEnum.REVIEW),
+    "flags": (ContentFlag, lambda: ContentFlag.is_resolved.isnot(True)),
+}
+
+
+def _claimable(model, moderator_id: int, now: datetime):
+    return or_(
+        model.claimed_by.is_(None),
+        model.claim_expires_at < now,
+        # Claiming again renews your own leases
+        model.claimed_by == moderator_id,
+    )
+
+
+def _lease_values(model, **values) -> dict:
+    # A lease is not an edit: keep content's onupdate from touching updated_at
+    if hasattr(model, "updated_at"):
+        values["updated_at"] = model.updated_at
+    return values
+
+
+def claim_items(db: Session, queue: str, moderator_id: int, limit: int) -> List[int]:
+    """Lease the next ``limit`` items of ``queue`` to a moderator and commit; returns their ids, oldest first"""
+    model, in_queue = QUEUES[queue]
+    now = datetime.utcnow()
+    candidates = (
+        select(model.id)
+        .where(in_queue(), _claimable(model, moderator_id, now))
+        .order_by(model.created_at, model.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    claimed = db.execute(
+        update(model)
+        # Re-checked here: under READ COMMITTED a row can change between the two
+        .where(model.id.in_(candidates), in_queue(), _claimable(model, moderator_id, now))
+        .values(_lease_values(
+            model, claimed_by=moderator_id,
+            claim_expires_at=now + timedelta(seconds=settings.MODERATION_LEASE_SECONDS),
+        ))
+        .returning(model.id, model.created_at)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    return [row.id for row in sorted(claimed, key=lambda row: (row.created_at is None, row.created_at, row.id))]
+
+
+def release_items(db: Session, queue: str, moderator_id: int, ids: List[int]) -> List[dict]:
+    """Give back a moderator's leases before they expire; the caller commits"""
+    model, _ = QUEUES[queue]
+    ids = _unique(ids)
+    released = db.execute(
+        update(model)
+        .where(model.id.in_(ids), model.claimed_by == moderator_id)
+        .values(_lease_values(model, claimed_by=None, claim_expires_at=None))
+        .returning(model.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    return _results(db, model, ids, {item_id: "released" for item_id in released})
+
+
+def _age_seconds(created_at, now: datetime) -> float:
+    if created_at is None:
+        return 0.0
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return max((now - created_at).total_seconds(), 0.0)
+
+
+def queue_stats(db: Session) -> Dict[str, dict]:
+    """Depth, lease counts and the oldest waiting item's age for each queue"""
+    now = datetime.utcnow()
+    stats = {}
+    for queue, (model, in_queue) in QUEUES.items():
+        leased = and_(model.claimed_by.isnot(None), model.claim_expires_at >= now)
+        depth, claimed, expired, oldest, oldest_unclaimed = db.query(
+            func.count(model.id),
+            func.count(model.id).filter(leased),
+            func.count(model.id).filter(model.claimed_by.isnot(None), model.claim_expires_at < now),
+            func.min(model.created_at),
+            func.min(model.created_at).filter(~leased),
+        ).filter(in_queue()).one()
+        by_moderator = dict(
+            db.query(model.claimed_by, func.count(model.id))
+            .filter(in_queue(), leased)
+            .group_by(model.claimed_by)
+            .all()
+        )
+        stats[queue] = {
+            "depth": depth,
+            "claimed": claimed,
+            "available": depth - claimed,
+            "expired_leases": expired,
+            "oldest_age_seconds": _age_seconds(oldest, now),
+            "oldest_unclaimed_age_seconds": _age_seconds(oldest_unclaimed, now),
+            "claimed_by": by_moderator,
+        }
+    return stats
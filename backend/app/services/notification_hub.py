@@ -0,0 +1,262 @@
+"""In-process pub/sub for pushing notifications to open event streams.
+
+Every open ``/api/notifications/stream`` connection is a ``Subscriber`` that
+lives on the event loop serving it. Sessions that commit new notifications
+publish them to their users' subscribers. Publishing may happen from
+request threads or job workers: items are handed to the subscriber's loop
+with ``call_soon_threadsafe``.
+
+Each subscriber buffers at most ``NOTIFICATION_STREAM_QUEUE_SIZE`` items. A
+consumer that falls behind has its buffer collapsed into a single ``SYNC``
+marker, and then catches up from the database. The same marker is
+published when a change has no in-memory payload: bulk inserts, and read
+or delete operations that move the unread count.
+
+The hub only reaches connections held by this process. Streams served by
+another process catch up on their next sync.
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.database.models import Notification
+# Imported first so its after_commit hook refreshes the cached unread
+# counts before the hook below wakes the streams that read them
+from app.services.unread_counts import get_unread_count
+
+# Re-read notifications and the unread count from the database
+SYNC = "sync"
+
+
+class Subscriber:
+    """One open stream: a bounded buffer drained by its event loop"""
+
+    __slots__ = ("user_id", "loop", "maxsize", "buffer", "ready")
+
+    def __init__(self, user_id: int, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.user_id = user_id
+        self.loop = loop
+        self.maxsize = maxsize
+        self.buffer = deque()
+        self.ready = asyncio.Event()
+
+    def offer(self, item):
+        # Runs on self.loop. A pending SYNC re-reads everything, so it
+        # supersedes whatever else is buffered
+        if self.buffer and self.buffer[0] == SYNC:
+            pass
+        elif item == SYNC or len(self.buffer) >= self.maxsize:
+            self.buffer.clear()
+            self.buffer.append(SYNC)
+        else:
+            self.buffer.append(item)
+        self.ready.set()
+
+    async def next_batch(self, timeout: float) -> Optional[list]:
+        """Everything published since the last call, or None after ``timeout`` idle seconds"""
+        if not self.buffer:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        self.ready.clear()
+        batch = list(self.buffer)
+        self.buffer.clear()
+        return batch
+
+
+class NotificationHub:
+    def __init__(self):
+        self._subscribers: Dict[int, Set[Subscriber]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: int) -> Optional[Subscriber]:
+        """Register a stream on the running loop; None if the user has too many open"""
+        subscriber = Subscriber(user_id, asyncio.get_running_loop(), settings.NOTIFICATION_STREAM_QUEUE_SIZE)
+        with self._lock:
+            streams = self._subscribers.setdefault(user_id, set())
+            if len(streams) >= settings.NOTIFICATION_STREAM_MAX_PER_USER:
+                return None
+            streams.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            streams = self._subscribers.get(subscriber.user_id)
+            if streams is not None:
+                streams.discard(subscriber)
+                if not streams:
+                    del self._subscribers[subscriber.user_id]
+
+    def publish(self, user_id: int, item):
+        with self._lock:
+            streams = list(self._subscribers.get(user_id, ()))
+        for subscriber in streams:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, item)
+            except RuntimeError:
+                # The loop serving this stream has shut down
+                self.unsubscribe(subscriber)
+
+    def has_subscribers(self, user_id: int) -> bool:
+        return user_id in self._subscribers
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(streams) for streams in self._subscribers.values())
+
+
+hub = NotificationHub()
+
+
+# =========================
+# Publishing on commit
+# =========================
+
+def notify_sync(db: Session, user_ids):
+    """Ask the users' streams to re-read from the database once ``db`` commits"""
+    db.info.setdefault("hub_sync", set()).update(user_ids)
+
+
+def publish_on_commit(db: Session, user_id: int, payload: dict):
+    """Push a notification written outside the ORM once ``db`` commits.
+
+    A payload with ``"updated": True`` describes an existing notification
+    that changed, such as a coalesced one with a new count.
+    """
+    db.info.setdefault("hub_new", []).append((user_id, payload))
+
+
+def notification_payload(notification: Notification) -> dict:
+    return {
+        "id": notification.id,
+        "title": notification.title,
+        "message": notification.message,
+        "is_read": bool(notification.is_read),
+        "notification_type": notification.notification_type.value if notification.notification_type else None,
+        "related_content_id": notification.related_content_id,
+        "aggregate_count": notification.__dict__.get("aggregate_count") or 1,
+        # created_at is filled in by the database and not loaded yet
+        "created_at": notification.__dict__.get("created_at") or datetime.utcnow(),
+    }
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_new_notifications(session, flush_context):
+    new = [obj for obj in session.new if isinstance(obj, Notification)]
+    if new:
+        pending = session.info.setdefault("hub_new", [])
+        pending.extend((obj.user_id, notification_payload(obj)) for obj in new)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session):
+    new = session.info.pop("hub_new", ())
+    sync = session.info.pop("hub_sync", ())
+    for user_id, payload in new:
+        if hub.has_subscribers(user_id):
+            hub.publish(user_id, payload)
+    for user_id in sync:
+        if hub.has_subscribers(user_id):
+            hub.publish(user_id, SYNC)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_uncommitted(session):
+    session.info.pop("hub_new", None)
+    session.info.pop("hub_sync", None)
+
+
+# =========================
+# Event stream
+# =========================
+
+def format_event(event_name: str, data, event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_name}")
+    lines.append(f"data: {json.dumps(data, default=str, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _load_since(bind, user_id: int, after_id: Optional[int]):
+    """Notifications newer than ``after_id`` (oldest first), the unread count and the new cursor"""
+    db = Session(bind=bind)
+    try:
+        if after_id is None:
+            # Fresh connection: start after the newest notification, no replay
+            after_id = db.execute(
+                select(func.coalesce(func.max(Notification.id), 0)).where(Notification.user_id == user_id)
+            ).scalar()
+            rows = []
+        else:
+            rows = db.execute(
+                select(Notification)
+                .where(Notification.user_id == user_id, Notification.id > after_id)
+                .order_by(Notification.id)
+                .limit(settings.NOTIFICATION_STREAM_REPLAY_LIMIT)
+            ).scalars().all()
+        return [notification_payload(row) for row in rows], get_unread_count(db, user_id), after_id
+    finally:
+        db.close()
+
+
+def _load_unread(bind, user_id: int) -> int:
+    db = Session(bind=bind)
+    try:
+        return get_unread_count(db, user_id)
+    finally:
+        db.close()
+
+
+async def notification_events(subscriber: Subscriber, bind, last_event_id: Optional[int],
+                              is_disconnected=None, heartbeat_seconds: float = None):
+    """Server-Sent Events for one subscriber until the client goes away.
+
+    Emits ``notification`` events (with the notification id as the event id,
+    so a reconnect can resume from ``Last-Event-ID``), ``notification_updated``
+    events when a coalesced notification's count grows, ``unread_count``
+    events, and a comment line as heartbeat while idle.
+    """
+    heartbeat_seconds = heartbeat_seconds or settings.NOTIFICATION_STREAM_HEARTBEAT_SECONDS
+    try:
+        yield f"retry: {settings.NOTIFICATION_STREAM_RETRY_MS}\n\n"
+        last_id = last_event_id
+        batch = [SYNC]
+        while True:
+            if SYNC in batch:
+                pushed, unread, last_id = await run_in_threadpool(_load_since, bind, subscriber.user_id, last_id)
+            else:
+                pushed = batch
+                unread = await run_in_threadpool(_load_unread, bind, subscriber.user_id)
+
+            for payload in pushed:
+                if payload["id"] > last_id:
+                    last_id = payload["id"]
+                    yield format_event("notification", payload, event_id=payload["id"])
+                elif payload.get("updated"):
+                    yield format_event("notification_updated", payload)
+            yield format_event("unread_count", {"unread_count": unread})
+
+            if SYNC in batch and len(pushed) == settings.NOTIFICATION_STREAM_REPLAY_LIMIT:
+                # More to replay: keep catching up before waiting again
+                continue
+
+            batch = None
+            while batch is None:
+                batch = await subscriber.next_batch(heartbeat_seconds)
+                if is_disconnected is not None and await is_disconnected():
+                    return
+                if batch is None:
+                    yield ": keepalive\n\n"
+    finally:
+        hub.unsubscribe(subscriber)
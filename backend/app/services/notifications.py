@@ -0,0 +1,241 @@
+import time
+from collections import Counter
+from typing import List, Optional
+
+from sqlalchemy import String, case, cast, delete, func, insert, literal, select, text, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database.models import (
+    UNREAD_GROUP_PREDICATE, Notification, NotificationActor, NotificationTypeEnum, RoleEnum, User,
+)
+from app.database.upsert import dialect_insert
+from app.services.jobs import enqueue, job_handler
+from app.services.notification_hub import notification_payload, notify_sync, publish_on_commit
+from app.services.unread_counts import record_unread_changes
+
+
+def bulk_create_notifications(db: Session, rows: List[dict]) -> int:
+    """Insert many notifications with one executemany, bypassing the ORM.
+
+    Each row needs ``user_id``, ``notification_type``, ``title`` and
+    ``message``; ``related_content_id`` is optional. The caller commits,
+    which also wakes the recipients' open notification streams.
+    """
+    if not rows:
+        return 0
+    db.execute(insert(Notification), [
+        {
+            "user_id": row["user_id"],
+            "notification_type": NotificationTypeEnum(row["notification_type"]),
+            "title": row["title"],
+            "message": row["message"],
+            "related_content_id": row.get("related_content_id"),
+            "is_read": False,
+        }
+        for row in rows
+    ])
+    record_unread_changes(db, Counter(row["user_id"] for row in rows))
+    notify_sync(db, {row["user_id"] for row in rows})
+    return len(rows)
+
+
+def mark_notifications_read(db: Session, user_id: int, notification_ids: List[int] = None) -> int:
+    """Mark the user's unread notifications (all, or only ``notification_ids``) read.
+
+    The ``is_read = false`` condition makes the row count the exact change in
+    the unread counter, even if another request marks the same rows
+    concurrently. The caller commits.
+    """
+    stmt = update(Notification).where(Notification.user_id == user_id, Notification.is_read == False)
+    if notification_ids is not None:
+        stmt = stmt.where(Notification.id.in_(notification_ids))
+    marked = db.execute(stmt.values(is_read=True).execution_options(synchronize_session=False)).rowcount
+    record_unread_changes(db, {user_id: -marked})
+    notify_sync(db, [user_id])
+    return marked
+
+
+def delete_notifications(db: Session, user_id: int, notification_ids: List[int]) -> int:
+    """Delete the user's notifications by id; the caller commits"""
+    owned = delete(Notification).where(
+        Notification.user_id == user_id, Notification.id.in_(notification_ids)
+    ).execution_options(synchronize_session=False)
+    db.execute(
+        delete(NotificationActor)
+        .where(NotificationActor.notification_id.in_(
+            select(Notification.id).where(Notification.user_id == user_id, Notification.id.in_(notification_ids))
+        ))
+        .execution_options(synchronize_session=False)
+    )
+    # Unread rows first, so their count is what the counter loses
+    unread = db.execute(owned.where(Notification.is_read == False)).rowcount
+    deleted = unread + db.execute(owned).rowcount
+    record_unread_changes(db, {user_id: -unread})
+    notify_sync(db, [user_id])
+    return deleted
+
+
+def coalesce_notification(db: Session, row: dict, group_key: str, merged: dict,
+                          actor_id: Optional[int] = None) -> Notification:
+    """Create a notification, or fold it into the user's unread one with the same ``group_key``.
+
+    A single ``INSERT ... ON CONFLICT DO UPDATE`` against the partial unique
+    index on unread (user_id, group_key) rows does the merge. Concurrent
+    events therefore bump the count rather than race to insert. ``merged``
+    gives the columns to rewrite on a merge, as SQL expressions that may use
+    ``Notification.aggregate_count`` (the count before this event).
+
+    A merge also moves ``created_at`` up, so the group comes back to the top
+    of the inbox. A client already paging through the inbox with a cursor
+    does not meet it again on later pages; the stream's ``updated`` event
+    tells it about the change.
+
+    With ``actor_id`` the group counts people rather than events: each
+    counted actor gets a ``notification_actors`` row, and only an actor whose
+    row is new bumps the count. Returns the resulting row, detached. The
+    caller commits.
+    """
+    if actor_id is not None:
+        return _coalesce_by_actor(db, row, group_key, merged, actor_id)
+    table = Notification.__table__
+    stmt = _group_insert(db, row, group_key).on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.group_key],
+        index_where=text(UNREAD_GROUP_PREDICATE),
+        set_={"aggregate_count": table.c.aggregate_count + 1, "created_at": func.now(), **merged},
+    ).returning(*table.c)
+    return _announce(db, Notification(**db.execute(stmt).one()._mapping))
+
+
+def _group_insert(db: Session, row: dict, group_key: str):
+    return dialect_insert(db.connection(), Notification.__table__).values(
+        user_id=row["user_id"],
+        notification_type=NotificationTypeEnum(row["notification_type"]),
+        title=row["title"],
+        message=row["message"],
+        related_content_id=row.get("related_content_id"),
+        is_read=False,
+        group_key=group_key,
+        aggregate_count=1,
+    )
+
+
+def _coalesce_by_actor(db: Session, row: dict, group_key: str, merged: dict, actor_id: int) -> Notification:
+    table = Notification.__table__
+    while True:
+        created = db.execute(
+            _group_insert(db, row, group_key).on_conflict_do_nothing(
+                index_elements=[table.c.user_id, table.c.group_key],
+                index_where=text(UNREAD_GROUP_PREDICATE),
+            ).returning(*table.c)
+        ).first()
+        if created is not None:
+            db.execute(insert(NotificationActor).values(notification_id=created.id, actor_id=actor_id))
+            return _announce(db, Notification(**created._mapping))
+
+        group_id = db.execute(
+            select(table.c.id).where(table.c.user_id == row["user_id"], table.c.group_key == group_key,
+                                     text(UNREAD_GROUP_PREDICATE))
+        ).scalar()
+        if group_id is None:
+            # Read between the two statements: start a new group
+            continue
+        actors = NotificationActor.__table__
+        counted = db.execute(
+            dialect_insert(db.connection(), actors)
+            .values(notification_id=group_id, actor_id=actor_id)
+            .on_conflict_do_nothing(index_elements=[actors.c.notification_id, actors.c.actor_id])
+        ).rowcount
+        if not counted:
+            # Already counted in this group: nothing changed, nothing to announce
+            existing = db.execute(select(*table.c).where(table.c.id == group_id)).one()
+            return Notification(**existing._mapping)
+        updated = db.execute(
+            update(Notification)
+            .where(Notification.id == group_id)
+            .values(aggregate_count=Notification.aggregate_count + 1, created_at=func.now(), **merged)
+            .returning(*table.c)
+            .execution_options(synchronize_session=False)
+        ).one()
+        return _announce(db, Notification(**updated._mapping))
+
+
+def _announce(db: Session, notification: Notification) -> Notification:
+    if notification.aggregate_count == 1:
+        record_unread_changes(db, {notification.user_id: 1})
+    payload = notification_payload(notification)
+    payload["updated"] = notification.aggregate_count > 1
+    publish_on_commit(db, notification.user_id, payload)
+    return notification
+
+
+def notify_content_liked(db: Session, content, actor_id: int, actor_name: str) -> Notification:
+    """One "N people liked" notification per content and window, not one per like; the caller commits.
+
+    Each person counts once, however often they unlike and like again.
+    """
+    window = int(time.time() // settings.NOTIFICATION_COALESCE_WINDOW_SECONDS)
+    others = Notification.aggregate_count
+    return coalesce_notification(
+        db,
+        notification_row(
+            content.author_id,
+            NotificationTypeEnum.LIKE,
+            "Someone liked your content",
+            f"{actor_name} liked \"{content.title}\"",
+            content.id
+        ),
+        group_key=f"like:content:{content.id}:{window}",
+        merged={
+            "title": cast(others + 1, String) + literal(" people liked your content"),
+            "message": literal(f"{actor_name} and ") + cast(others, String)
+                + case((others == 1, literal(" other")), else_=literal(" others"))
+                + literal(f" liked \"{content.title}\""),
+        },
+        actor_id=actor_id,
+    )
+
+
+def notification_row(user_id: int, notification_type: NotificationTypeEnum, title: str,
+                     message: str, related_content_id: int = None) -> dict:
+    """A JSON-safe notification for ``enqueue_notifications``"""
+    return {
+        "user_id": user_id,
+        "notification_type": notification_type.value,
+        "title": title,
+        "message": message,
+        "related_content_id": related_content_id,
+    }
+
+
+def enqueue_notifications(db: Session, rows: List[dict], idempotency_key: str = None):
+    """Deliver notifications from a background job; the caller commits"""
+    if rows:
+        enqueue(db, "notifications.create", {"notifications": rows}, idempotency_key=idempotency_key)
+
+
+def enqueue_admin_notification(db: Session, title: str, message: str,
+                               related_content_id: int = None, idempotency_key: str = None):
+    """Notify every admin from a background job; the caller commits"""
+    enqueue(db, "notifications.notify_admins", {
+        "title": title,
+        "message": message,
+        "related_content_id": related_content_id,
+    }, idempotency_key=idempotency_key)
+
+
+@job_handler("notifications.create")
+def _create_notifications(db: Session, payload: dict):
+    bulk_create_notifications(db, payload["notifications"])
+
+
+@job_handler("notifications.notify_admins")
+def _notify_admins(db: Session, payload: dict):
+    admin_ids = db.execute(
+        select(User.id).where(User.role == RoleEnum.ADMIN)
+    ).scalars().all()
+    bulk_create_notifications(db, [
+        notification_row(admin_id, NotificationTypeEnum.STATUS_CHANGE, payload["title"],
+                         payload["message"], payload.get("related_content_id"))
+        for admin_id in admin_ids
+    ])
@@ -0,0 +1,142 @@
+"""Cached pages of the public content feed.
+
+A page is cached for ``PUBLIC_FEED_CACHE_TTL_SECONDS``. A commit in this
+process that adds or removes a content item, changes anything on one but
+its counters, or changes a category drops every cached page. Set-based
+updates that bypass the ORM call ``mark_public_feed_stale`` themselves.
+Like, dislike and comment counts on a cached page may lag by up to the TTL.
+"""
+import logging
+from typing import List, Optional
+
+from sqlalchemy import desc, event, inspect
+from sqlalchemy.orm import Session, joinedload
+
+from app.core.config import settings
+from app.database.models import Category, Comment, Content, ContentStatusEnum, Like
+from app.services.cache import TTLCache
+from app.services.warmup import warmup_task
+
+logger = logging.getLogger(__name__)
+
+_pages = TTLCache(settings.PUBLIC_FEED_CACHE_TTL_SECONDS, maxsize=256)
+
+# Content columns that change without changing what the feed shows
+COUNTER_COLUMNS = {"views_count", "likes_count", "dislikes_count", "claimed_by", "claim_expires_at"}
+
+
+def _content_dict(db: Session, content: Content) -> dict:
+    likes_count = db.query(Like).filter(Like.content_id == content.id, Like.is_like == True).count()
+    dislikes_count = db.query(Like).filter(Like.content_id == content.id, Like.is_like == False).count()
+    comments_count = db.query(Comment).filter(Comment.content_id == content.id).count()
+    return {
+        "id": content.id,
+        "title": content.title,
+        "content_text": content.content_text,
+        "content_type": content.content_type.value if content.content_type else "article",
+        "status": content.status.value if content.status else "published",
+        "media_url": content.media_url,
+        "thumbnail_url": content.thumbnail_url,
+        "tags": getattr(content, 'tags', None),
+        "views_count": content.views_count or 0,
+        "created_at": content.created_at.isoformat() if content.created_at else None,
+        "updated_at": content.updated_at.isoformat() if content.updated_at else None,
+        "published_at": content.published_at.isoformat() if content.published_at else None,
+        "author_id": content.author_id,
+        "category_id": content.category_id,
+        "likes_count": likes_count,
+        "dislikes_count": dislikes_count,
+        "comments_count": comments_count,
+        "is_flagged": content.is_flagged if hasattr(content, 'is_flagged') else False,
+        "author": {
+            "id": content.author.id if content.author else None,
+            "username": content.author.username if content.author else "Unknown",
+            "email": content.author.email if content.author else "",
+            "full_name": content.author.full_name if content.author else "Unknown",
+            "role": content.author.role.value if content.author and content.author.role else "user",
+            "is_active": content.author.is_active if content.author else True,
+            "created_at": content.author.created_at.isoformat() if content.author and content.author.created_at else None
+        },
+        "category": {
+            "id": content.category.id if content.category else None,
+            "name": content.category.name if content.category else "Uncategorized",
+            "description": content.category.description if content.category else "",
+            "color": content.category.color if content.category else "#3B82F6",
+            "created_at": content.category.created_at.isoformat() if content.category and content.category.created_at else None,
+            "created_by": content.category.created_by if content.category else None
+        }
+    }
+
+
+def load_public_page(db: Session, page: int, limit: int, category_id: Optional[int] = None) -> List[dict]:
+    query = db.query(Content)
+    if category_id:
+        query = query.filter(Content.category_id == category_id)
+
+    # Only show published content for public access
+    query = query.filter(Content.status == ContentStatusEnum.PUBLISHED)
+    query = query.filter(Content.is_flagged == False)
+
+    # Sort by published_at (newest approved content first)
+    query = query.order_by(desc(Content.published_at), desc(Content.created_at))
+    content_list = query.options(
+        joinedload(Content.author),
+        joinedload(Content.category)
+    ).offset((page - 1) * limit).limit(limit).all()
+
+    result = []
+    for content in content_list:
+        try:
+            result.append(_content_dict(db, content))
+        except Exception as e:
+            logger.warning(f"Error processing content {content.id}: {e}")
+            continue
+    return result
+
+
+def get_public_page(db: Session, page: int, limit: int, category_id: Optional[int] = None) -> List[dict]:
+    return _pages.get_or_load((page, limit, category_id), lambda: load_public_page(db, page, limit, category_id))
+
+
+def invalidate_public_feed():
+    _pages.invalidate()
+
+
+def mark_public_feed_stale(db: Session):
+    """Drop the cached pages once ``db`` commits"""
+    db.info["public_feed_stale"] = True
+
+
+@warmup_task("public_feed")
+def _warm_public_feed(db: Session):
+    for page in range(1, settings.WARMUP_FEED_PAGES + 1):
+        _pages.set((page, 20, None), load_public_page(db, page, 20))
+
+
+def _mark_stale(mapper, connection, target):
+    Session.object_session(target).info["public_feed_stale"] = True
+
+
+def _mark_stale_on_change(mapper, connection, target):
+    state = inspect(target)
+    if any(attr.history.has_changes() for attr in state.attrs if attr.key not in COUNTER_COLUMNS):
+        _mark_stale(mapper, connection, target)
+
+
+event.listen(Content, "after_insert", _mark_stale)
+event.listen(Content, "after_delete", _mark_stale)
+event.listen(Content, "after_update", _mark_stale_on_change)
+# Pages embed their items' categories
+for _event in ("after_update", "after_delete"):
+    event.listen(Category, _event, _mark_stale)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    if session.info.pop("public_feed_stale", False):
+        invalidate_public_feed()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_uncommitted(session):
+    session.info.pop("public_feed_stale", None)
@@ -0,0 +1,248 @@
+"""Token-bucket rate limiting for abuse-prone endpoints.
+
+Each route opts in with ``dependencies=[Depends(rate_limit("<policy>"))]``.
+A policy names its bucket capacity (the allowed burst), its refill rate and
+the scopes it is keyed by ("ip", "user"). A request must find a token in
+every scoped bucket, and the tightest bucket is reported in the standard
+``RateLimit-Limit`` / ``RateLimit-Remaining`` / ``RateLimit-Reset`` headers.
+
+Bucket state lives in a backend: the in-memory one is per process, the
+Redis one lets several workers share the same buckets.
+"""
+import logging
+import math
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response, status
+
+from app.core.auth import decode_token
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitPolicy(NamedTuple):
+    capacity: int
+    refill_per_second: float
+    scopes: Tuple[str, ...] = ("ip",)
+
+
+class BucketResult(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float
+    retry_after: float
+
+
+# Per-route policies. Login/register are keyed by IP since the caller is
+# anonymous; write endpoints are keyed by user and, as a backstop, by IP.
+POLICIES: Dict[str, RateLimitPolicy] = {
+    "auth.login": RateLimitPolicy(capacity=10, refill_per_second=10 / 60, scopes=("ip",)),
+    "auth.register": RateLimitPolicy(capacity=5, refill_per_second=5 / 600, scopes=("ip",)),
+    "comments.create": RateLimitPolicy(capacity=20, refill_per_second=20 / 60, scopes=("user", "ip")),
+    "content.like": RateLimitPolicy(capacity=60, refill_per_second=1.0, scopes=("user", "ip")),
+}
+
+
+def _refill(tokens: float, updated_at: float, policy: RateLimitPolicy, now: float) -> float:
+    return min(policy.capacity, tokens + (now - updated_at) * policy.refill_per_second)
+
+
+def _consume(tokens: float, policy: RateLimitPolicy, cost: int) -> Tuple[float, BucketResult]:
+    allowed = tokens >= cost
+    if allowed:
+        tokens -= cost
+    result = BucketResult(
+        allowed=allowed,
+        limit=policy.capacity,
+        remaining=int(tokens),
+        reset_after=(policy.capacity - tokens) / policy.refill_per_second,
+        retry_after=0.0 if allowed else (cost - tokens) / policy.refill_per_second,
+    )
+    return tokens, result
+
+
+class MemoryBackend:
+    """Buckets in a plain dict of ``key -> (tokens, updated_at, expires_at)``.
+
+    A bucket that has refilled completely is indistinguishable from a missing
+    one, so ``expires_at`` is the moment it becomes full again. Such entries
+    are dropped lazily: on access, and by a sweep every ``sweep_every`` takes.
+    """
+
+    def __init__(self, sweep_every: int = 1024):
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._lock = threading.Lock()
+        self._ops = 0
+        self._sweep_every = sweep_every
+
+    def take(self, key: str, policy: RateLimitPolicy, cost: int = 1, now: Optional[float] = None) -> BucketResult:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            state = self._buckets.get(key)
+            if state is None or state[2] <= now:
+                tokens = float(policy.capacity)
+            else:
+                tokens = _refill(state[0], state[1], policy, now)
+            tokens, result = _consume(tokens, policy, cost)
+            self._buckets[key] = (tokens, now, now + result.reset_after)
+
+            self._ops += 1
+            if self._ops >= self._sweep_every:
+                self._ops = 0
+                self._sweep(now)
+        return result
+
+    def _sweep(self, now: float):
+        expired = [key for key, state in self._buckets.items() if state[2] <= now]
+        for key in expired:
+            del self._buckets[key]
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RedisBackend:
+    """Buckets stored as Redis hashes so every worker shares them.
+
+    Works with any client exposing the redis-py ``lock``/``hmget``/``hset``/
+    ``pexpire`` calls. Keys expire on their own once the bucket has refilled.
+    """
+
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+
+    def take(self, key: str, policy: RateLimitPolicy, cost: int = 1, now: Optional[float] = None) -> BucketResult:
+        # Wall-clock time, since the state is shared between processes
+        now = time.time() if now is None else now
+        redis_key = f"{self.prefix}{key}"
+        with self.client.lock(f"{redis_key}:lock", timeout=1, blocking_timeout=1):
+            raw_tokens, raw_updated_at = self.client.hmget(redis_key, "tokens", "updated_at")
+            if raw_tokens is None or raw_updated_at is None:
+                tokens = float(policy.capacity)
+            else:
+                tokens = _refill(float(raw_tokens), float(raw_updated_at), policy, now)
+            tokens, result = _consume(tokens, policy, cost)
+            self.client.hset(redis_key, mapping={"tokens": tokens, "updated_at": now})
+            self.client.pexpire(redis_key, max(1, math.ceil(result.reset_after * 1000)))
+        return result
+
+    def reset(self):
+        for key in self.client.scan_iter(f"{self.prefix}*"):
+            self.client.delete(key)
+
+
+def create_backend():
+    if settings.RATE_LIMIT_REDIS_URL:
+        try:
+            import redis
+            return RedisBackend(redis.Redis.from_url(settings.RATE_LIMIT_REDIS_URL))
+        except ImportError:
+            logger.warning("RATE_LIMIT_REDIS_URL is set but redis is not installed; using in-memory rate limits")
+    return MemoryBackend()
+
+
+class RateLimiter:
+    def __init__(self, backend=None, policies: Optional[Dict[str, RateLimitPolicy]] = None):
+        self.backend = backend if backend is not None else create_backend()
+        self.policies = POLICIES if policies is None else policies
+
+    def check(self, policy_name: str, identities: Dict[str, Optional[str]], cost: int = 1) -> Optional[BucketResult]:
+        """Take a token from every scoped bucket; returns the tightest result.
+
+        Scopes are taken in policy order and stop at the first denial, so a
+        request refused by its user bucket does not also drain the IP bucket.
+        """
+        policy = self.policies[policy_name]
+        tightest = None
+        for scope in policy.scopes:
+            identity = identities.get(scope)
+            if identity is None:
+                continue
+            result = self.backend.take(f"{policy_name}:{scope}:{identity}", policy, cost)
+            if tightest is None or (tightest.allowed, tightest.remaining) > (result.allowed, result.remaining):
+                tightest = result
+            if not result.allowed:
+                break
+        return tightest
+
+
+limiter = RateLimiter()
+
+
+def _user_identity(request: Request) -> Optional[str]:
+    # Reads the signed uid claim only; the auth dependency does the real check
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        uid = decode_token(token).get("uid")
+    except HTTPException:
+        return None
+    return str(uid) if uid is not None else None
+
+
+def client_ip(request: Request) -> str:
+    """The caller's address, looking past ``RATE_LIMIT_TRUSTED_PROXIES`` reverse proxies.
+
+    Each proxy appends the address it received the request from to
+    ``X-Forwarded-For``, so with N trusted proxies the client is the Nth
+    entry from the right. Entries further left are whatever the client sent
+    and are ignored.
+    """
+    peer = request.client.host if request.client else "unknown"
+    proxies = settings.RATE_LIMIT_TRUSTED_PROXIES
+    forwarded_for = request.headers.get("x-forwarded-for")
+    if proxies <= 0 or not forwarded_for:
+        return peer
+    hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+    if not hops:
+        return peer
+    return hops[-proxies] if len(hops) >= proxies else hops[0]
+
+
+def rate_limit_headers(result: BucketResult) -> Dict[str, str]:
+    headers = {
+        "RateLimit-Limit": str(result.limit),
+        "RateLimit-Remaining": str(result.remaining),
+        "RateLimit-Reset": str(math.ceil(result.reset_after)),
+    }
+    if not result.allowed:
+        headers["Retry-After"] = str(max(1, math.ceil(result.retry_after)))
+    return headers
+
+
+def rate_limit(policy_name: str):
+    """FastAPI dependency enforcing the named policy"""
+    if policy_name not in POLICIES:
+        raise KeyError(f"Unknown rate limit policy: {policy_name}")
+
+    def dependency(request: Request, response: Response):
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        identities = {
+            "ip": client_ip(request),
+            "user": _user_identity(request),
+        }
+        result = limiter.check(policy_name, identities)
+        if result is None:
+            return
+        headers = rate_limit_headers(result)
+        if not result.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please try again later",
+                headers=headers,
+            )
+        response.headers.update(headers)
+
+    return dependency
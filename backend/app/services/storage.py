@@ -0,0 +1,310 @@
+"""Content-addressed object storage for uploaded files.
+
+An object's key is the SHA-256 of its bytes plus an extension, so the same
+file uploaded twice is stored once and a key never changes meaning; it is
+served from ``/media/{key}`` with an immutable Cache-Control header.
+
+The ``stored_objects`` table counts references to each key. ``store_file``
+takes a reference and only writes bytes the backend does not already hold.
+``release`` drops one. Both run in the caller's transaction. An object whose
+count reaches zero is only deleted from the backend once that transaction
+has committed, so a rollback never leaves a row pointing at missing bytes.
+``sweep`` does the deletion, right after the commit and as the periodic
+``storage.sweep`` job for anything a crash left behind. It locks each row
+and re-checks its count first, so a store of the same bytes that races it
+either keeps the object or uploads it again.
+
+Objects live on local disk (``STORAGE_BACKEND=local``) or in an
+S3-compatible bucket (``STORAGE_BACKEND=s3``: AWS, MinIO, R2, ...).
+boto3 is only needed for the latter.
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+from datetime import datetime
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database.models import StoredObject
+from app.database.upsert import dialect_insert
+from app.services.jobs import job_handler
+from app.utils.static_files import IMMUTABLE_CACHE_CONTROL
+
+logger = logging.getLogger(__name__)
+
+MEDIA_URL_PREFIX = "/media"
+
+KEY_PATTERN = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]{1,10}$")
+
+
+def is_valid_key(key: str) -> bool:
+    return bool(KEY_PATTERN.match(key))
+
+
+def media_url(key: str) -> str:
+    return f"{MEDIA_URL_PREFIX}/{key}"
+
+
+def key_from_url(url: Optional[str]) -> Optional[str]:
+    """The key of a ``/media/...`` URL, or None for any other URL"""
+    if not url or not url.startswith(MEDIA_URL_PREFIX + "/"):
+        return None
+    key = url[len(MEDIA_URL_PREFIX) + 1:]
+    return key if is_valid_key(key) else None
+
+
+def content_type_for(key: str) -> str:
+    return mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+
+# =========================
+# Backends
+# =========================
+
+class LocalStorage:
+    """Objects as files under ``root``, fanned out by the first two hex digits of their key"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def put_file(self, key: str, source_path: str, content_type: str):
+        directory = os.path.dirname(self.path(key))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".object-", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as target, open(source_path, "rb") as source:
+                shutil.copyfileobj(source, target, settings.UPLOAD_CHUNK_BYTES)
+                target.flush()
+                os.fsync(target.fileno())
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self.path(key), "rb")
+
+    def delete(self, key: str):
+        try:
+            os.unlink(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self.path(key)
+
+
+class S3Storage:
+    """Objects in an S3-compatible bucket; ``client`` is a boto3 S3 client or anything with its API"""
+
+    def __init__(self, bucket: str, client=None, prefix: str = ""):
+        self.bucket = bucket
+        self.prefix = prefix
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+            self._client = boto3.client(
+                "s3",
+                endpoint_url=settings.S3_ENDPOINT_URL or None,
+                region_name=settings.S3_REGION or None,
+                aws_access_key_id=settings.S3_ACCESS_KEY_ID or None,
+                aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY or None,
+            )
+        return self._client
+
+    def _name(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._name(key))
+        except self.client.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def put_file(self, key: str, source_path: str, content_type: str):
+        self.client.upload_file(
+            source_path, self.bucket, self._name(key),
+            ExtraArgs={"ContentType": content_type, "CacheControl": IMMUTABLE_CACHE_CONTROL},
+        )
+
+    def open(self, key: str) -> BinaryIO:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._name(key))["Body"]
+        except self.client.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                raise FileNotFoundError(key)
+            raise
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._name(key))
+
+    def local_path(self, key: str) -> Optional[str]:
+        return None
+
+
+_backend = None
+
+
+def local_storage_dir() -> str:
+    if settings.STORAGE_LOCAL_DIR:
+        return settings.STORAGE_LOCAL_DIR
+    if os.getenv("PERSISTENT_STORAGE"):
+        return os.path.join(os.getenv("PERSISTENT_STORAGE"), "media")
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "uploads", "media"))
+
+
+def get_storage():
+    """The configured backend, built on first use"""
+    global _backend
+    if _backend is None:
+        if settings.STORAGE_BACKEND == "s3":
+            _backend = S3Storage(settings.S3_BUCKET, prefix=settings.S3_PREFIX)
+        elif settings.STORAGE_BACKEND == "local":
+            _backend = LocalStorage(local_storage_dir())
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND {settings.STORAGE_BACKEND!r}")
+    return _backend
+
+
+def set_storage(backend):
+    """Swap the backend, e.g. for tests; None goes back to the configured one"""
+    global _backend
+    _backend = backend
+
+
+def iter_stream(stream: BinaryIO, chunk_bytes: int = None) -> Iterator[bytes]:
+    """Read an opened object in chunks, closing it at the end"""
+    chunk_bytes = chunk_bytes or settings.UPLOAD_CHUNK_BYTES
+    try:
+        while True:
+            chunk = stream.read(chunk_bytes)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        stream.close()
+
+
+# =========================
+# References
+# =========================
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        while True:
+            chunk = source.read(settings.UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_file(db: Session, path: str, extension: str, content_type: Optional[str] = None,
+               digest: Optional[str] = None) -> str:
+    """Take a reference to the object holding the bytes of ``path``; returns its key.
+
+    ``digest`` is the file's SHA-256, if the caller already has it. Blocking
+    (hashing and backend I/O): call it from a worker thread in async code.
+    """
+    key = f"{digest or hash_file(path)}.{extension}"
+    content_type = content_type or content_type_for(key)
+    table = StoredObject.__table__
+    stmt = dialect_insert(db.get_bind(), table).values(
+        key=key, size=os.path.getsize(path), content_type=content_type, refcount=1,
+        created_at=datetime.utcnow(), updated_at=datetime.utcnow(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.key],
+        set_={"refcount": table.c.refcount + 1, "updated_at": stmt.excluded.updated_at},
+    )
+    db.execute(stmt)
+    backend = get_storage()
+    if backend.exists(key):
+        logger.info(f"Deduplicated upload into {key}")
+    else:
+        backend.put_file(key, path, content_type)
+    return key
+
+
+def release(db: Session, key: str) -> bool:
+    """Drop one reference to ``key``; True if it was the last, and the object goes once ``db`` commits"""
+    refcount = db.execute(
+        update(StoredObject)
+        .where(StoredObject.key == key)
+        .values(refcount=StoredObject.refcount - 1, updated_at=datetime.utcnow())
+        .returning(StoredObject.refcount)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+    if refcount is None or refcount > 0:
+        return False
+    db.info.setdefault("storage_released", set()).add(key)
+    return True
+
+
+def sweep(db: Session, keys: Optional[Iterable[str]] = None) -> int:
+    """Delete unreferenced objects (all, or only ``keys``) from the backend and the table; returns how many"""
+    query = select(StoredObject).where(StoredObject.refcount <= 0)
+    if keys is not None:
+        query = query.where(StoredObject.key.in_(list(keys)))
+    # A store of the same bytes waits on the lock, then finds the row gone and uploads again
+    unreferenced = db.execute(query.with_for_update(skip_locked=True)).scalars().all()
+    backend = get_storage()
+    for stored in unreferenced:
+        backend.delete(stored.key)
+        db.delete(stored)
+    db.commit()
+    if unreferenced:
+        logger.info(f"Deleted {len(unreferenced)} unreferenced stored objects")
+    return len(unreferenced)
+
+
+def release_urls(db: Session, urls: Iterable[Optional[str]]):
+    """Release every ``/media/...`` URL in ``urls``; other URLs are ignored"""
+    for url in urls:
+        key = key_from_url(url)
+        if key:
+            release(db, key)
+
+
+@job_handler("storage.sweep", every=settings.STORAGE_SWEEP_INTERVAL_SECONDS)
+def _sweep_job(db: Session, payload: dict):
+    sweep(db)
+
+
+@event.listens_for(Session, "after_commit")
+def _sweep_committed(session):
+    keys = session.info.pop("storage_released", None)
+    if not keys:
+        return
+    try:
+        with Session(bind=session.get_bind()) as db:
+            sweep(db, keys)
+    except Exception as e:
+        # The storage.sweep job retries
+        logger.warning(f"Could not delete released objects {sorted(keys)}: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_uncommitted(session):
+    session.info.pop("storage_released", None)
@@ -0,0 +1,52 @@
+from typing import NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database.models import User
+from app.services.cache import TTLCache
+
+
+class TokenState(NamedTuple):
+    token_version: int
+    is_active: bool
+    role: Optional[str]
+
+
+# user_id -> TokenState. Revocation is visible immediately in this process
+# (the entry is invalidated) and within the TTL in every other worker.
+_token_states = TTLCache(ttl_seconds=settings.TOKEN_VERSION_CACHE_TTL_SECONDS)
+
+
+def get_token_state(db: Session, user_id: int) -> Optional[TokenState]:
+    """Cached (token_version, is_active, role) for a user, or None if the user is gone"""
+    state = _token_states.get(user_id)
+    if state is not None:
+        return state
+
+    row = db.query(User.token_version, User.is_active, User.role).filter(User.id == user_id).first()
+    if row is None:
+        return None
+    state = TokenState(
+        token_version=row.token_version or 0,
+        is_active=bool(row.is_active),
+        role=row.role.value if row.role else None,
+    )
+    _token_states.set(user_id, state)
+    return state
+
+
+def invalidate(user_id: int):
+    """Forget the cached state after is_active or role changes"""
+    _token_states.invalidate(user_id)
+
+
+def revoke_user_tokens(db: Session, user_id: int):
+    """Bump the user's token_version so every token issued so far is rejected"""
+    db.query(User).filter(User.id == user_id).update(
+        {User.token_version: User.token_version + 1},
+        synchronize_session="fetch",
+    )
+    db.commit()
+    # Invalidate after the commit so nobody can re-cache the old version
+    invalidate(user_id)
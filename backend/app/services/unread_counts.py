@@ -0,0 +1,156 @@
+"""Per-user unread notification counters.
+
+``notification_counters`` holds one row per user, changed by deltas in the
+same transaction as the notification writes that move it:
+
+* ORM inserts of ``Notification`` are picked up by mapper events and
+  applied once per flush;
+* reads and deletes go through ``mark_notifications_read`` and
+  ``delete_notifications``, whose ``is_read = false`` conditions make the
+  row count the exact delta, and bulk inserts report their own.
+
+ORM updates and deletes of loaded notifications are counted too. They
+trust the loaded ``is_read``, which a concurrent writer may have changed,
+so the request paths above avoid them.
+
+Each delta is an ``INSERT ... ON CONFLICT DO UPDATE SET unread_count =
+unread_count + delta``, so concurrent writers never lose an update. Reads
+go through a short TTL cache that is invalidated when a change commits in
+this process. A recurring job repairs drift left by writes outside these
+paths, such as raw SQL or a reset seed.
+"""
+from collections import Counter
+from typing import Dict
+
+from sqlalchemy import bindparam, event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database.models import Notification, NotificationCounter
+from app.database.upsert import dialect_insert
+from app.services.cache import TTLCache
+from app.services.jobs import job_handler
+
+_unread_counts = TTLCache(settings.UNREAD_COUNT_CACHE_TTL_SECONDS)
+
+counters = NotificationCounter.__table__
+
+
+def _apply(conn, deltas: Dict[int, int]):
+    rows = [{"user_id": user_id, "unread_count": delta} for user_id, delta in deltas.items() if delta]
+    if not rows:
+        return
+    stmt = dialect_insert(conn, counters)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[counters.c.user_id],
+        set_={"unread_count": counters.c.unread_count + stmt.excluded.unread_count},
+    )
+    conn.execute(stmt, rows)
+
+
+def record_unread_changes(db: Session, deltas: Dict[int, int]):
+    """Apply unread-count deltas in ``db``'s transaction; the caller commits"""
+    _apply(db.connection(), deltas)
+    db.info.setdefault("unread_touched", set()).update(deltas)
+
+
+def get_unread_count(db: Session, user_id: int) -> int:
+    def load():
+        count = db.execute(
+            select(counters.c.unread_count).where(counters.c.user_id == user_id)
+        ).scalar()
+        return max(count or 0, 0)
+    return _unread_counts.get_or_load(user_id, load)
+
+
+# =========================
+# ORM bookkeeping
+# =========================
+
+def _pending(target) -> Counter:
+    session = Session.object_session(target)
+    return session.info.setdefault("unread_deltas", Counter())
+
+
+@event.listens_for(Notification, "after_insert")
+def _count_insert(mapper, connection, target):
+    if not target.is_read:
+        _pending(target)[target.user_id] += 1
+
+
+@event.listens_for(Notification, "after_update")
+def _count_update(mapper, connection, target):
+    history = inspect(target).attrs.is_read.history
+    if not history.added or not history.deleted:
+        return
+    was_read, is_read = bool(history.deleted[0]), bool(target.is_read)
+    if was_read != is_read:
+        _pending(target)[target.user_id] += 1 if was_read else -1
+
+
+@event.listens_for(Notification, "after_delete")
+def _count_delete(mapper, connection, target):
+    # Only trust a loaded value; anything else is left to the reconciler
+    if target.__dict__.get("is_read") is False:
+        _pending(target)[target.user_id] -= 1
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_flushed(session, flush_context):
+    deltas = session.info.pop("unread_deltas", None)
+    if deltas:
+        record_unread_changes(session, deltas)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    for user_id in session.info.pop("unread_touched", ()):
+        _unread_counts.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_uncommitted(session):
+    session.info.pop("unread_deltas", None)
+    session.info.pop("unread_touched", None)
+
+
+# =========================
+# Reconciliation
+# =========================
+
+def reconcile_unread_counts(db: Session) -> int:
+    """Rewrite every counter that disagrees with the notifications table; returns how many"""
+    actual = dict(db.execute(
+        select(Notification.user_id, func.count(Notification.id))
+        .where(Notification.is_read == False, Notification.user_id.isnot(None))
+        .group_by(Notification.user_id)
+    ).all())
+    stored = dict(db.execute(select(counters.c.user_id, counters.c.unread_count)).all())
+    drifted = [
+        user_id for user_id in actual.keys() | stored.keys()
+        if actual.get(user_id, 0) != stored.get(user_id, 0)
+    ]
+    if not drifted:
+        return 0
+
+    # Recount inside the statement itself, so writes that committed since
+    # the scan above are not overwritten with a stale total
+    conn = db.connection()
+    recount = (
+        select(func.count(Notification.id))
+        .where(Notification.user_id == bindparam("uid"), Notification.is_read == False)
+        .scalar_subquery()
+    )
+    stmt = dialect_insert(conn, counters).values(user_id=bindparam("uid"), unread_count=recount)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[counters.c.user_id],
+        set_={"unread_count": stmt.excluded.unread_count},
+    )
+    conn.execute(stmt, [{"uid": user_id} for user_id in drifted])
+    db.info.setdefault("unread_touched", set()).update(drifted)
+    return len(drifted)
+
+
+@job_handler("notifications.reconcile_unread_counts", every=settings.UNREAD_COUNT_RECONCILE_SECONDS)
+def _reconcile_job(db: Session, payload: dict):
+    reconcile_unread_counts(db)
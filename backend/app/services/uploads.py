@@ -0,0 +1,168 @@
+"""Streaming, size-capped upload handling.
+
+An endpoint that declares a ``File`` parameter has its whole form parsed
+before its dependencies run, so an anonymous client could spool any amount
+to disk. Upload endpoints therefore authenticate first and then read the
+form themselves with ``read_upload``. It refuses a request whose
+Content-Length is already over the cap, and stops reading a body as soon
+as it passes the cap. Starlette spools the file to a temporary file as it
+arrives, holding at most 1 MB of it in memory.
+
+``save_upload`` copies the spooled file in ``UPLOAD_CHUNK_BYTES`` chunks on
+a worker thread, so neither the whole file nor any disk I/O ever sits on
+the event loop, and checks the exact file size as it goes. The type is
+taken from the first bytes, not from the client's filename or content
+type. The file is written under a temporary name and renamed into place,
+so a half-written file is never visible under its final name.
+"""
+import logging
+import os
+import tempfile
+import uuid
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Request, UploadFile, status
+from multipart.exceptions import MultipartParseError
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile as ParsedFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (magic prefix, offset of the prefix, extension)
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", 0, "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", 0, "png"),
+    (b"GIF87a", 0, "gif"),
+    (b"GIF89a", 0, "gif"),
+    (b"WEBP", 8, "webp"),  # RIFF....WEBP
+]
+
+# Room for the multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UnsupportedUpload(Exception):
+    pass
+
+
+def avatar_dir() -> str:
+    if os.getenv("PERSISTENT_STORAGE"):
+        return os.getenv("PERSISTENT_STORAGE")
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "uploads", "avatars"))
+
+
+def staging_dir() -> str:
+    """Where uploads land before they are moved into storage"""
+    return settings.UPLOAD_STAGING_DIR or os.path.join(tempfile.gettempdir(), "techhub-uploads")
+
+
+def detect_image_type(head: bytes) -> Optional[str]:
+    """The image extension for a file starting with ``head``, or None"""
+    for magic, offset, extension in IMAGE_SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            if extension == "webp" and not head.startswith(b"RIFF"):
+                continue
+            return extension
+    return None
+
+
+def _copy_to_disk(source, directory: str, max_bytes: int, chunk_bytes: int) -> Tuple[str, int]:
+    # Runs on a worker thread
+    source.seek(0)
+    first = source.read(chunk_bytes)
+    extension = detect_image_type(first)
+    if extension is None:
+        raise UnsupportedUpload()
+
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+    try:
+        size = 0
+        with os.fdopen(fd, "wb") as target:
+            chunk = first
+            while chunk:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge()
+                target.write(chunk)
+                chunk = source.read(chunk_bytes)
+            target.flush()
+            os.fsync(target.fileno())
+        filename = f"{uuid.uuid4()}.{extension}"
+        os.replace(temp_path, os.path.join(directory, filename))
+        return filename, size
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File must be at most {max_bytes // (1024 * 1024)} MB"
+    )
+
+
+async def read_upload(request: Request, field: str = "file", max_bytes: int = None) -> UploadFile:
+    """Parse a multipart body holding one file in ``field``, reading at most ``max_bytes`` of it"""
+    max_bytes = max_bytes or settings.AVATAR_MAX_BYTES
+    limit = max_bytes + MULTIPART_OVERHEAD_BYTES
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Expected a multipart form")
+    try:
+        declared = int(request.headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Content-Length")
+    if declared > limit:
+        raise _too_large(max_bytes)
+
+    received = 0
+
+    async def capped():
+        # Also covers chunked bodies and clients that understate Content-Length
+        nonlocal received
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > limit:
+                raise MultiPartException("Request body too large")
+            yield chunk
+
+    try:
+        form = await MultiPartParser(request.headers, capped(), max_files=1, max_fields=10).parse()
+    except (MultiPartException, MultipartParseError) as e:
+        if received > limit:
+            raise _too_large(max_bytes)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    upload = form.get(field)
+    if not isinstance(upload, ParsedFile):
+        await form.close()
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Missing file field '{field}'")
+    return upload
+
+
+async def save_upload(upload: UploadFile, directory: str, max_bytes: int = None) -> Tuple[str, int]:
+    """Copy an uploaded image into ``directory``; returns its new filename and size"""
+    max_bytes = max_bytes or settings.AVATAR_MAX_BYTES
+    try:
+        return await run_in_threadpool(_copy_to_disk, upload.file, directory, max_bytes, settings.UPLOAD_CHUNK_BYTES)
+    except UnsupportedUpload:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File must be a JPEG, PNG, GIF or WebP image"
+        )
+    except UploadTooLarge:
+        raise _too_large(max_bytes)
+    except OSError as e:
+        logger.error(f"Could not store upload in {directory}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to save file"
+        )
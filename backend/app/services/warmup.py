@@ -0,0 +1,119 @@
+"""Cache warm-up, run by the app's lifespan handler before it reports ready.
+
+Services register loaders with ``@warmup_task(name)``; each gets its own
+session. Without a warm-up, the first requests after a deploy would all
+miss the same caches at once and load them from the database together.
+``run_warmup`` runs every loader in parallel on a small thread pool and
+stops waiting after ``WARMUP_TIMEOUT_SECONDS``. A loader still running
+then keeps going in the background, but the instance reports ready anyway.
+``/health`` answers 503 until the warm-up has finished and reports each
+loader's outcome and timing.
+
+Admins can re-run the loaders later (``rewarm=True``), e.g. after a bulk
+import. A re-run is reported separately under ``rewarm`` and never makes a
+ready instance unready again; only one runs at a time.
+"""
+import asyncio
+import importlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Modules whose import registers warm-up tasks
+WARMUP_MODULES = [
+    "app.services.admin_stats",
+    "app.services.category_catalogue",
+    "app.services.public_feed",
+]
+
+_tasks: Dict[str, Callable[[Session], None]] = {}
+
+_state = {"status": "pending", "started_at": None, "finished_at": None, "duration_ms": None, "items": {}}
+# The last admin-triggered re-run: idle, warming or done
+_rewarm_state = {"status": "idle", "started_at": None, "finished_at": None, "duration_ms": None, "items": {}}
+
+
+def warmup_task(name: str):
+    """Register ``fn(db)`` to fill a cache during warm-up"""
+    def decorator(fn):
+        _tasks[name] = fn
+        return fn
+    return decorator
+
+
+def load_tasks():
+    for module in WARMUP_MODULES:
+        importlib.import_module(module)
+
+
+def report() -> dict:
+    """The startup warm-up: status (pending, warming, ready or disabled), timings per task, and the last re-run"""
+    return {**_state, "items": dict(_state["items"]),
+            "rewarm": {**_rewarm_state, "items": dict(_rewarm_state["items"])}}
+
+
+def rewarm_running() -> bool:
+    return _rewarm_state["status"] == "warming"
+
+
+def is_ready() -> bool:
+    return _state["status"] in ("ready", "disabled")
+
+
+def mark_disabled():
+    _state.update(status="disabled", items={})
+
+
+def _run_task(bind, name: str, fn) -> dict:
+    started = time.perf_counter()
+    db = Session(bind=bind)
+    try:
+        fn(db)
+        outcome = {"status": "ok"}
+    except Exception as e:
+        logger.warning(f"Warm-up task {name} failed: {e}")
+        outcome = {"status": "error", "error": str(e)}
+    finally:
+        db.close()
+    outcome["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return outcome
+
+
+async def run_warmup(bind, timeout: Optional[float] = None, rewarm: bool = False) -> dict:
+    """Run every warm-up task in parallel, waiting at most ``timeout`` seconds; returns ``report()``.
+
+    ``rewarm`` records the run as an admin re-run instead of the startup warm-up.
+    """
+    load_tasks()
+    timeout = settings.WARMUP_TIMEOUT_SECONDS if timeout is None else timeout
+    state = _rewarm_state if rewarm else _state
+    started = time.perf_counter()
+    state.update(status="warming", started_at=datetime.utcnow(), finished_at=None, duration_ms=None,
+                 items={name: {"status": "running"} for name in _tasks})
+
+    loop = asyncio.get_running_loop()
+    pool = ThreadPoolExecutor(max_workers=settings.WARMUP_WORKERS, thread_name_prefix="warmup")
+    futures = {loop.run_in_executor(pool, _run_task, bind, name, fn): name for name, fn in _tasks.items()}
+    try:
+        done, pending = await asyncio.wait(futures, timeout=timeout) if futures else (set(), set())
+    finally:
+        # Stragglers finish on their own; nothing waits for them
+        pool.shutdown(wait=False)
+    for future in done:
+        state["items"][futures[future]] = future.result()
+    for future in pending:
+        state["items"][futures[future]] = {"status": "timeout", "ms": round(timeout * 1000, 1)}
+
+    state.update(status="done" if rewarm else "ready", finished_at=datetime.utcnow(),
+                 duration_ms=round((time.perf_counter() - started) * 1000, 1))
+    logger.info(f"{'Re-warm' if rewarm else 'Warm-up'} finished in {state['duration_ms']:.0f} ms: "
+                + ", ".join(f"{name} {item['status']}" for name, item in sorted(state["items"].items())))
+    return report()
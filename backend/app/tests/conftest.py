@@ -0,0 +1,126 @@
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.config import settings
+from app.main import app
+from app.database.connection import get_db
+from app.database.models import Base, User, RoleEnum
+from app.core.auth import get_password_hash, create_token_pair
+from app.services import admin_stats, analytics, category_catalogue, public_feed, storage, token_versions, unread_counts
+from app.services.rate_limit import limiter
+
+# Tests run jobs explicitly with jobs.run_pending instead of worker threads
+settings.JOB_WORKERS = 0
+settings.ANALYTICS_VIEW_FLUSH_SECONDS = 0
+# Every test builds its own schema; the app's startup must not touch the configured database
+settings.SKIP_SCHEMA_CHECK = True
+settings.WARMUP_ENABLED = False
+
+TEST_PASSWORD = "testpass123"
+_TEST_PASSWORD_HASH = get_password_hash(TEST_PASSWORD)
+
+
+@pytest.fixture
+def engine():
+    """Fresh in-memory SQLite database shared by every connection of a test"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    # In-process caches keyed by ids that every fresh database reuses
+    token_versions._token_states.invalidate()
+    unread_counts._unread_counts.invalidate()
+    admin_stats.invalidate_admin_stats()
+    public_feed.invalidate_public_feed()
+    category_catalogue.invalidate_catalogue()
+    analytics.views._drain()
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def media_storage(tmp_path, monkeypatch):
+    """Stored and staged uploads go to the test's own directory, never the repository's"""
+    monkeypatch.setattr(settings, "UPLOAD_STAGING_DIR", str(tmp_path / "staging"))
+    backend = storage.LocalStorage(str(tmp_path / "media"))
+    storage.set_storage(backend)
+    yield backend
+    storage.set_storage(None)
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def client(session_factory):
+    def override_get_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    limiter.backend.reset()
+    with TestClient(app) as test_client:
+        yield test_client
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def make_user(db):
+    counter = {"n": 0}
+
+    def _make_user(role=RoleEnum.USER, **fields):
+        counter["n"] += 1
+        n = counter["n"]
+        user = User(
+            email=fields.pop("email", f"user{n}@example.com"),
+            username=fields.pop("username", f"user{n}"),
+            full_name=fields.pop("full_name", f"User {n}"),
+            hashed_password=_TEST_PASSWORD_HASH,
+            role=role,
+            is_active=fields.pop("is_active", True),
+            **fields,
+        )
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        return user
+
+    return _make_user
+
+
+def auth_headers(user):
+    return {"Authorization": f"Bearer {create_token_pair(user)['token']}"}
+
+
+@contextmanager
+def count_queries(engine):
+    """Collect every SQL statement executed on ``engine`` inside the block"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
@@ -0,0 +1,60 @@
+from app.database.models import Category, Content, ContentStatusEnum, ContentTypeEnum, RoleEnum
+from app.tests.conftest import auth_headers, count_queries
+
+
+def stats(client, admin, **params):
+    response = client.get("/api/admin/stats", params=params, headers=auth_headers(admin))
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_stats_use_one_query_per_table_and_are_cached(client, engine, db, make_user):
+    admin = make_user(role=RoleEnum.ADMIN)
+    make_user(role=RoleEnum.TECH_WRITER)
+    make_user(is_active=False)
+
+    with count_queries(engine) as statements:
+        first = stats(client, admin)
+    counts = [s for s in statements if "count(" in s.lower()]
+    assert len(counts) == 3
+    assert first["users"] == {"total": 3, "active": 2, "admins": 1, "tech_writers": 1, "regular_users": 1}
+
+    with count_queries(engine) as statements:
+        second = stats(client, admin)
+    assert not [s for s in statements if "count(" in s.lower()]
+    assert second == first
+
+
+def test_status_changes_invalidate_the_snapshot(client, db, make_user):
+    admin = make_user(role=RoleEnum.ADMIN)
+    user = make_user()
+    assert stats(client, admin)["users"]["active"] == 2
+
+    client.put(f"/api/admin/users/{user.id}/deactivate", headers=auth_headers(admin))
+    assert stats(client, admin)["users"]["active"] == 1
+
+    category = Category(name="AI")
+    db.add(category)
+    db.flush()
+    content = Content(title="Transformers", content_type=ContentTypeEnum.ARTICLE, status=ContentStatusEnum.REVIEW,
+                      author_id=admin.id, category_id=category.id)
+    db.add(content)
+    db.commit()
+    assert stats(client, admin)["content"]["pending_approval"] == 1
+
+    client.put(f"/api/content/{content.id}/approve", headers=auth_headers(admin))
+    assert stats(client, admin)["content"] == {"total": 1, "published": 1, "pending_approval": 0}
+
+
+def test_fresh_bypasses_the_cache(client, db, make_user):
+    admin = make_user(role=RoleEnum.ADMIN)
+    assert stats(client, admin)["users"]["total"] == 1
+
+    # A write the ORM hooks cannot see
+    db.execute(admin.__table__.insert().values(email="raw@example.com", username="raw", hashed_password="x"))
+    db.commit()
+    assert stats(client, admin)["users"]["total"] == 1
+    assert stats(client, admin, fresh="true")["users"]["total"] == 2
+    assert stats(client, admin)["users"]["total"] == 2
+
+    assert client.get("/api/admin/stats", headers=auth_headers(make_user())).status_code == 403
@@ -0,0 +1,180 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app.database.models import (
+    Category, Comment, Content, ContentStatusEnum, ContentTypeEnum, EngagementRollup, Like,
+    PlatformRollup, RoleEnum,
+)
+from app.services import analytics
+from app.services.analytics import backfill, run_aggregator
+from app.tests.conftest import auth_headers, count_queries
+
+DAY = datetime(2026, 3, 2)
+
+
+def make_content(db, author, title="Transformers"):
+    category = db.query(Category).first()
+    if category is None:
+        category = Category(name="AI")
+        db.add(category)
+        db.flush()
+    content = Content(title=title, content_type=ContentTypeEnum.ARTICLE, status=ContentStatusEnum.PUBLISHED,
+                      author_id=author.id, category_id=category.id, created_at=DAY)
+    db.add(content)
+    db.commit()
+    return content
+
+
+def add_likes(db, content, users, at, is_like=True):
+    db.add_all(Like(user_id=user.id, content_id=content.id, is_like=is_like, created_at=at) for user in users)
+    db.commit()
+
+
+def rollup(db, bucket, content_id):
+    db.expire_all()
+    rows = db.execute(
+        select(EngagementRollup).where(EngagementRollup.bucket == bucket, EngagementRollup.content_id == content_id)
+        .order_by(EngagementRollup.bucket_start)
+    ).scalars().all()
+    return [(row.bucket_start, row.views, row.likes, row.dislikes, row.comments) for row in rows]
+
+
+def test_aggregator_folds_each_row_once(engine, db, make_user):
+    author = make_user(role=RoleEnum.TECH_WRITER)
+    readers = [make_user() for _ in range(3)]
+    content = make_content(db, author)
+    add_likes(db, content, readers[:2], DAY + timedelta(hours=9, minutes=15))
+    add_likes(db, content, readers[2:], DAY + timedelta(hours=14), is_like=False)
+    db.add(Comment(content_id=content.id, author_id=readers[0].id, text="Nice",
+                   created_at=DAY + timedelta(days=1, hours=1)))
+    db.commit()
+
+    folded = run_aggregator(engine, settle_seconds=0)
+    assert folded == {"likes": 3, "comments": 1, "users": 4, "content": 1}
+    assert rollup(db, "hour", content.id) == [
+        (DAY + timedelta(hours=9), 0, 2, 0, 0),
+        (DAY + timedelta(hours=14), 0, 0, 1, 0),
+        (DAY + timedelta(days=1, hours=1), 0, 0, 0, 1),
+    ]
+    assert rollup(db, "day", content.id) == [(DAY, 0, 2, 1, 0), (DAY + timedelta(days=1), 0, 0, 0, 1)]
+    platform = db.execute(select(PlatformRollup).where(PlatformRollup.bucket == "day", PlatformRollup.bucket_start == DAY)).scalar_one()
+    assert platform.content_created == 1
+
+    # Nothing new: nothing is counted twice
+    assert run_aggregator(engine, settle_seconds=0) == {"likes": 0, "comments": 0, "users": 0, "content": 0}
+    # New rows are added to the existing buckets
+    add_likes(db, content, [make_user()], DAY + timedelta(hours=9, minutes=50))
+    assert run_aggregator(engine, settle_seconds=0, batch_size=1)["likes"] == 1
+    assert rollup(db, "day", content.id)[0] == (DAY, 0, 3, 1, 0)
+
+
+def test_unsettled_rows_wait_for_a_later_run(engine, db, make_user):
+    author = make_user()
+    content = make_content(db, author)
+    add_likes(db, content, [author], DAY)
+    add_likes(db, content, [make_user()], DAY + timedelta(hours=5))
+
+    assert run_aggregator(engine, now=DAY + timedelta(hours=5, seconds=30), settle_seconds=60)["likes"] == 1
+    assert rollup(db, "day", content.id) == [(DAY, 0, 1, 0, 0)]
+    assert run_aggregator(engine, now=DAY + timedelta(hours=6), settle_seconds=60)["likes"] == 1
+    assert rollup(db, "day", content.id) == [(DAY, 0, 2, 0, 0)]
+
+
+def test_overlapping_aggregators_do_not_double_count(engine, db, make_user, monkeypatch):
+    author = make_user()
+    content = make_content(db, author)
+    add_likes(db, content, [author], DAY)
+    run_aggregator(engine, settle_seconds=0)
+
+    # A second aggregator that read the watermark before the first advanced it
+    monkeypatch.setattr(analytics, "_watermark", lambda db, source: 0)
+    assert run_aggregator(engine, settle_seconds=0)["likes"] == 0
+    assert rollup(db, "day", content.id) == [(DAY, 0, 1, 0, 0)]
+
+
+def test_unlikes_and_toggles_keep_rollups_in_step(client, engine, db, make_user):
+    author = make_user(role=RoleEnum.TECH_WRITER)
+    fan, critic, late = make_user(), make_user(), make_user()
+    content = make_content(db, author)
+    add_likes(db, content, [fan, critic], DAY)
+    run_aggregator(engine, settle_seconds=0)
+    assert rollup(db, "day", content.id) == [(DAY, 0, 2, 0, 0)]
+
+    def react(user, is_like):
+        response = client.post(f"/api/content/{content.id}/like", headers=auth_headers(user),
+                               json={"content_id": content.id, "is_like": is_like})
+        assert response.status_code == 200
+
+    react(fan, False)     # like -> dislike
+    react(critic, True)   # unlike
+    assert rollup(db, "day", content.id) == [(DAY, 0, 0, 1, 0)]
+
+    # Rows the aggregator has not reached yet are folded as they end up
+    react(late, True)
+    react(late, False)
+    run_aggregator(engine, settle_seconds=0)
+    today = analytics.bucket_start(datetime.utcnow(), "day")
+    day_rows = rollup(db, "day", content.id)
+    assert day_rows == [(DAY, 0, 0, 1, 0), (today, 0, 0, 1, 0)]
+
+    likes = db.query(Like).filter(Like.content_id == content.id)
+    assert sum(row[2] for row in day_rows) == likes.filter(Like.is_like == True).count()
+    assert sum(row[3] for row in day_rows) == likes.filter(Like.is_like == False).count()
+
+
+def test_views_are_buffered_and_flushed(client, engine, db, make_user):
+    author = make_user()
+    content = make_content(db, author)
+    for _ in range(3):
+        assert client.get(f"/api/content/{content.id}").status_code == 200
+    client.post(f"/api/content/{content.id}/view", headers=auth_headers(author))
+    assert len(analytics.views) == 4
+
+    assert analytics.views.flush(engine) == 4
+    assert len(analytics.views) == 0
+    hour = analytics.bucket_start(datetime.utcnow(), "hour")
+    assert [row[:2] for row in rollup(db, "hour", content.id)] == [(hour, 4)]
+    assert [row[:2] for row in rollup(db, "day", content.id)] == [(analytics.bucket_start(hour, "day"), 4)]
+
+
+def test_backfill_reset_keeps_views(engine, db, make_user):
+    author = make_user()
+    content = make_content(db, author)
+    add_likes(db, content, [author], DAY)
+    analytics.views.record(content.id, at=DAY)
+    analytics.views.flush(engine)
+    run_aggregator(engine, settle_seconds=0)
+
+    assert backfill(engine, reset=True)["likes"] == 1
+    assert rollup(db, "day", content.id) == [(DAY, 1, 1, 0, 0)]
+
+
+def test_reports_read_only_the_rollups(client, engine, db, make_user):
+    admin = make_user(role=RoleEnum.ADMIN)
+    author = make_user(role=RoleEnum.TECH_WRITER)
+    first = make_content(db, author, "First")
+    second = make_content(db, author, "Second")
+    add_likes(db, first, [admin], DAY + timedelta(hours=3))
+    add_likes(db, second, [admin, author], DAY + timedelta(days=1))
+    run_aggregator(engine, settle_seconds=0)
+    params = {"start": DAY.isoformat(), "end": (DAY + timedelta(days=3)).isoformat()}
+
+    with count_queries(engine) as statements:
+        engagement = client.get("/api/admin/analytics/engagement", headers=auth_headers(admin),
+                                params={**params, "author_id": author.id})
+        top = client.get("/api/admin/analytics/top-content", headers=auth_headers(admin),
+                         params={**params, "metric": "likes"})
+        platform = client.get("/api/admin/analytics/platform", headers=auth_headers(admin), params=params)
+    assert engagement.status_code == top.status_code == platform.status_code == 200
+    for table in ("likes", "comments", "content"):
+        assert not [s for s in statements if f"FROM {table}" in s or f"JOIN {table}" in s]
+
+    assert [(row["likes"], row["views"]) for row in engagement.json()["series"]] == [(1, 0), (2, 0)]
+    assert top.json()["items"] == [{"content_id": second.id, "likes": 2}, {"content_id": first.id, "likes": 1}]
+    assert [row["content_created"] for row in platform.json()["series"]] == [2]
+
+    too_long = client.get("/api/admin/analytics/engagement", headers=auth_headers(admin),
+                          params={"bucket": "hour", "start": DAY.isoformat(), "end": (DAY + timedelta(days=60)).isoformat()})
+    assert too_long.status_code == 400
+    assert client.get("/api/admin/analytics/platform", headers=auth_headers(author)).status_code == 403
@@ -0,0 +1,68 @@
+from jose import jwt
+
+from app.core.config import settings
+from app.database.models import RoleEnum
+from app.tests.conftest import TEST_PASSWORD, auth_headers
+
+
+def test_login_issues_claims_and_refresh_token(client, make_user):
+    user = make_user(role=RoleEnum.TECH_WRITER)
+    response = client.post("/api/auth/login", json={"email": user.email, "password": TEST_PASSWORD})
+    assert response.status_code == 200
+    body = response.json()
+
+    claims = jwt.decode(body["token"], settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    assert claims["sub"] == user.username
+    assert claims["uid"] == user.id
+    assert claims["role"] == "tech_writer"
+    assert claims["tv"] == 0
+    assert claims["type"] == "access"
+    assert "refresh_token" in body
+
+
+def test_refresh_rotates_tokens(client, make_user):
+    user = make_user()
+    login = client.post("/api/auth/login", json={"email": user.email, "password": TEST_PASSWORD}).json()
+
+    response = client.post("/api/auth/refresh", json={"refresh_token": login["refresh_token"]})
+    assert response.status_code == 200
+    new_token = response.json()["token"]
+    assert client.get("/api/auth/me", headers={"Authorization": f"Bearer {new_token}"}).status_code == 200
+
+
+def test_access_token_is_not_a_refresh_token(client, make_user):
+    user = make_user()
+    login = client.post("/api/auth/login", json={"email": user.email, "password": TEST_PASSWORD}).json()
+
+    assert client.post("/api/auth/refresh", json={"refresh_token": login["token"]}).status_code == 401
+    headers = {"Authorization": f"Bearer {login['refresh_token']}"}
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+
+
+def test_logout_all_revokes_existing_tokens(client, make_user):
+    user = make_user()
+    login = client.post("/api/auth/login", json={"email": user.email, "password": TEST_PASSWORD}).json()
+    headers = {"Authorization": f"Bearer {login['token']}"}
+
+    assert client.post("/api/auth/logout-all", headers=headers).status_code == 200
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+    assert client.post("/api/auth/refresh", json={"refresh_token": login["refresh_token"]}).status_code == 401
+
+
+def test_deactivation_revokes_tokens(client, make_user):
+    admin = make_user(role=RoleEnum.ADMIN)
+    user = make_user()
+    user_headers = auth_headers(user)
+    assert client.get("/api/notifications/unread-count", headers=user_headers).status_code == 200
+
+    response = client.put(f"/api/admin/users/{user.id}/deactivate", headers=auth_headers(admin))
+    assert response.status_code == 200
+    assert client.get("/api/notifications/unread-count", headers=user_headers).status_code == 401
+
+
+def test_legacy_username_only_token_still_accepted(client, make_user):
+    user = make_user()
+    token = jwt.encode({"sub": user.username}, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    response = client.get("/api/auth/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json()["id"] == user.id
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.services.uploads import MULTIPART_OVERHEAD_BYTES, detect_image_type, read_upload, save_upload
+from app.tests.conftest import auth_headers
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 1024
+
+
+def upload(client, user, data, content_type="image/png", filename="me.png"):
+    return client.post("/api/auth/upload-avatar", files={"file": (filename, data, content_type)},
+                       headers=auth_headers(user))
+
+
+def test_avatar_is_stored_under_its_detected_type(client, make_user, media_storage, tmp_path):
+    user = make_user()
+
+    response = upload(client, user, PNG, content_type="application/octet-stream", filename="me.exe")
+    assert response.status_code == 200, response.text
+    key = response.json()["avatar_url"].rsplit("/", 1)[1]
+    assert key.endswith(".png")
+    with media_storage.open(key) as stored:
+        assert stored.read() == PNG
+    # The staged copy is gone once the avatar is in storage
+    assert os.listdir(tmp_path / "staging") == []
+
+
+def test_non_images_and_oversized_files_are_rejected(client, make_user, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "AVATAR_MAX_BYTES", 1024 * 1024)
+    user = make_user()
+
+    assert upload(client, user, b"<html>not an image</html>").status_code == 400
+    assert upload(client, user, PNG + b"\x00" * (2 * 1024 * 1024)).status_code == 413
+    # Nothing half-written is left behind
+    assert not (tmp_path / "staging").exists()
+    assert not (tmp_path / "media").exists()
+
+    assert detect_image_type(b"\xff\xd8\xff\xe0") == "jpeg"
+    assert detect_image_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "webp"
+    assert detect_image_type(b"GIF89a") == "gif"
+
+
+def test_oversized_bodies_are_refused_before_the_form_is_read(client, make_user, monkeypatch):
+    monkeypatch.setattr(settings, "AVATAR_MAX_BYTES", 1024 * 1024)
+    big = PNG + b"\x00" * (2 * 1024 * 1024)
+
+    # Authentication comes first, so an anonymous client cannot get anything spooled
+    anonymous = client.post("/api/auth/upload-avatar", files={"file": ("me.png", big, "image/png")})
+    assert anonymous.status_code == 403
+    assert upload(client, make_user(), big).status_code == 413
+
+
+def test_body_without_a_usable_length_is_cut_off_at_the_cap():
+    max_bytes = 64 * 1024
+    sent = []
+
+    async def receive():
+        # A chunked body far larger than the cap, with no Content-Length
+        chunk = (b"--x\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.png\"\r\n\r\n"
+                 if not sent else b"\x00" * 16 * 1024)
+        sent.append(len(chunk))
+        return {"type": "http.request", "body": chunk, "more_body": len(sent) < 1000}
+
+    request = Request({
+        "type": "http", "method": "POST", "path": "/",
+        "headers": [(b"content-type", b"multipart/form-data; boundary=x")],
+    }, receive)
+
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(read_upload(request, max_bytes=max_bytes))
+    assert rejected.value.status_code == 413
+    # Reading stopped one chunk past the cap rather than at the end of the body
+    assert sum(sent) <= max_bytes + MULTIPART_OVERHEAD_BYTES + 16 * 1024
+
+
+def test_concurrent_large_upload_benchmark(tmp_path):
+    uploads, size = 8, 8 * 1024 * 1024
+
+    def spooled():
+        # What Starlette hands the endpoint: a spooled temporary file
+        spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        spool.write(PNG)
+        block = os.urandom(1024 * 1024)
+        while spool.tell() < size:
+            spool.write(block)
+        return UploadFile(spool, filename="big.png")
+
+    files = [spooled() for _ in range(uploads)]
+
+    async def run():
+        return await asyncio.gather(*(save_upload(f, str(tmp_path), max_bytes=2 * size) for f in files))
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        results = asyncio.run(run())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    elapsed = time.perf_counter() - started
+    print(f"\n{uploads} concurrent {size // (1024 * 1024)} MB uploads: {elapsed * 1000:.0f} ms, "
+          f"peak {peak / 1e6:.2f} MB")
+
+    assert len({name for name, _ in results}) == uploads
+    assert all(written > size for _, written in results)
+    # A few chunks per upload in flight, never the files themselves
+    assert peak < uploads * settings.UPLOAD_CHUNK_BYTES * 3
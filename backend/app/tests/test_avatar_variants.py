@@ -0,0 +1,63 @@
+import io
+import json
+
+from PIL import Image
+from starlette.applications import Starlette
+from starlette.testclient import TestClient
+
+from app.database.models import Profile
+from app.schemas.schemas import ProfileResponse
+from app.services import images
+from app.tests.conftest import auth_headers
+from app.utils.static_files import IMMUTABLE_CACHE_CONTROL, ImmutableStaticFiles
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+def test_variants_are_served_as_immutable(tmp_path):
+    (tmp_path / "abc.webp").write_bytes(b"RIFF")
+    app = Starlette()
+    app.mount("/avatar-variants", ImmutableStaticFiles(directory=tmp_path))
+    response = TestClient(app).get("/avatar-variants/abc.webp")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+
+def test_profile_response_and_replacing_the_avatar(client, db, make_user):
+    user = make_user()
+    variants = {"48": {"webp": "/avatar-variants/a.webp", "jpeg": "/avatar-variants/a.jpeg"}}
+    db.add(Profile(user_id=user.id, avatar_url="/uploads/avatars/a.png", avatar_variants=json.dumps(variants)))
+    db.commit()
+
+    me = client.get("/api/auth/me", headers=auth_headers(user)).json()
+    assert me["profile"]["avatar_variants"] == variants
+    assert ProfileResponse.model_validate(db.query(Profile).one()).avatar_variants == variants
+
+    # An avatar set by URL has no variants of its own
+    client.put("/api/auth/profile", json={"avatar_url": "https://example.com/me.png"}, headers=auth_headers(user))
+    assert client.get("/api/auth/me", headers=auth_headers(user)).json()["profile"]["avatar_variants"] is None
+
+
+def test_upload_without_pillow_has_no_variants(client, make_user, monkeypatch):
+    monkeypatch.setattr(images, "pillow_available", lambda: False)
+    user = make_user()
+    response = client.post("/api/auth/upload-avatar", files={"file": ("me.png", PNG, "image/png")},
+                           headers=auth_headers(user))
+    assert response.status_code == 200
+    assert response.json()["user"]["profile"]["avatar_variants"] is None
+
+
+def test_upload_renders_stored_variants(client, make_user, media_storage):
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), "teal").save(buffer, format="JPEG")
+    user = make_user()
+
+    response = client.post("/api/auth/upload-avatar", files={"file": ("me.jpg", buffer.getvalue(), "image/jpeg")},
+                           headers=auth_headers(user))
+    variants = response.json()["user"]["profile"]["avatar_variants"]
+    assert set(variants) == {"48", "96", "256"}
+    for size, formats in variants.items():
+        assert set(formats) == {"webp", "jpeg"}
+        for url in formats.values():
+            with Image.open(media_storage.path(url.rsplit("/", 1)[1])) as variant:
+                assert variant.size == (int(size), int(size))
@@ -0,0 +1,112 @@
+from sqlalchemy import func
+
+from app.database.models import (
+    Category, Content, ContentFlag, ContentStatusEnum, ContentTypeEnum, FlagReasonEnum, Job,
+    Notification, NotificationFanout, RoleEnum,
+)
+from app.tests.conftest import auth_headers, count_queries
+
+
+def make_content(db, author, n, status=ContentStatusEnum.REVIEW, category=None):
+    items = [
+        Content(title=f"Post {i}", content_type=ContentTypeEnum.ARTICLE, status=status,
+                author_id=author.id, category_id=category.id if category else None)
+        for i in range(n)
+    ]
+    db.add_all(items)
+    db.commit()
+    return [item.id for item in items]
+
+
+def bulk(client, admin, path, **body):
+    response = client.post(f"/api/admin/moderation/{path}", json=body, headers=auth_headers(admin))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def notifications_for(db, user):
+    return db.query(func.count(Notification.id)).filter(Notification.user_id == user.id).scalar()
+
+
+def test_bulk_approve_reports_every_item(client, db, make_user):
+    admin = make_user(role=RoleEnum.ADMIN)
+    author = make_user(role=RoleEnum.TECH_WRITER)
+    category = Category(name="AI")
+    db.add(category)
+    db.commit()
+    pending = make_content(db, author, 3, category=category)
+    published = make_content(db, author, 1, status=ContentStatusEnum.PUBLISHED)
+    assert client.get("/api/admin/stats", headers=auth_headers(admin)).json()["content"]["published"] == 1
+
+    body = bulk(client, admin, "content/approve", ids=[*pending, *published, 9999, pending[0]])
+    assert body["changed"] == 3
+    assert body["results"] == [
+        *({"id": item_id, "status": "approved"} for item_id in pending),
+        {"id": published[0], "status": "unchanged"},
+        {"id": 9999, "status": "not_found"},
+    ]
+    db.expire_all()
+    assert db.query(Content).filter(Content.status == ContentStatusEnum.PUBLISHED).count() == 4
+    assert notifications_for(db, author) == 3
+    fanouts = db.query(NotificationFanout).all()
+    assert sorted(fanout.content_id for fanout in fanouts) == pending
+    assert db.query(Job).filter(Job.kind == "notifications.category_fanout").count() == 3
+    # Set-based updates still refresh the dashboard
+    assert client.get("/api/admin/stats", headers=auth_headers(admin)).json()["content"]["published"] == 4
+
+    # Repeating the request changes nothing
+    assert bulk(client, admin, "content/approve", ids=pending)["changed"] == 0
+
+
+def test_statement_count_does_not_grow_with_the_batch(client, engine, db, make_user):
+    admin = make_user(role=RoleEnum.ADMIN)
+    author = make_user()
+    small = make_content(db, author, 2)
+    large = make_content(db, author, 60)
+    # Warm the auth cache so both requests do the same work
+    bulk(client, admin, "content/reject", ids=[9999])
+
+    with count_queries(engine) as small_statements:
+        bulk(client, admin, "content/reject", ids=small)
+    with count_queries(engine) as large_statements:
+        assert bulk(client, admin, "content/reject", ids=large)["changed"] == 60
+    assert len(large_statements) == len(small_statements)
+    assert notifications_for(db, author) == 62
+
+
+def test_bulk_flag_and_resolve(client, db, make_user):
+    admin = make_user(role=RoleEnum.ADMIN)
+    author = make_user(role=RoleEnum.TECH_WRITER)
+    theirs = make_content(db, author, 2, status=ContentStatusEnum.PUBLISHED)
+    own = make_content(db, admin, 1, status=ContentStatusEnum.PUBLISHED)
+
+    body = bulk(client, admin, "content/flag", ids=[*theirs, *own], reason="spam")
+    assert [item["status"] for item in body["results"]] == ["flagged"] * 3
+    # No notification for flagging your own content
+    assert notifications_for(db, author) == 2
+    assert notifications_for(db, admin) == 0
+    assert bulk(client, admin, "content/flag", ids=theirs)["changed"] == 0
+
+    flags = [ContentFlag(content_id=content_id, flagged_by=admin.id, reason=FlagReasonEnum.SPAM) for content_id in theirs]
+    db.add_all(flags)
+    db.commit()
+    body = bulk(client, admin, "flags/resolve", ids=[flags[0].id], action="approve", admin_notes="spam")
+    assert body["results"] == [{"id": flags[0].id, "status": "resolved"}]
+    db.expire_all()
+    assert db.get(Content, theirs[0]) is None
+    assert db.get(Content, theirs[1]) is not None
+
+    body = bulk(client, admin, "flags/resolve", ids=[flag.id for flag in flags], action="reject")
+    assert [item["status"] for item in body["results"]] == ["unchanged", "resolved"]
+    assert db.get(Content, theirs[1]) is not None
+
+
+def test_bulk_requests_are_validated_and_admin_only(client, db, make_user):
+    admin = make_user(role=RoleEnum.ADMIN)
+    writer = make_user(role=RoleEnum.TECH_WRITER)
+    url = "/api/admin/moderation/content/approve"
+    assert client.post(url, json={"ids": []}, headers=auth_headers(admin)).status_code == 422
+    assert client.post(url, json={"ids": list(range(501))}, headers=auth_headers(admin)).status_code == 422
+    assert client.post("/api/admin/moderation/flags/resolve", json={"ids": [1], "action": "delete"},
+                       headers=auth_headers(admin)).status_code == 422
+    assert client.post(url, json={"ids": [1]}, headers=auth_headers(writer)).status_code == 403
@@ -0,0 +1,70 @@
+from sqlalchemy import insert
+
+from app.database.models import Category
+from app.services import category_catalogue
+from app.tests.conftest import auth_headers, count_queries
+
+
+def test_catalogue_serves_categories_without_queries(client, engine, db, make_user):
+    db.add_all([Category(name="Web Development", color="#3B82F6"), Category(name="Data Science")])
+    db.commit()
+    user = make_user()
+
+    assert [c["name"] for c in client.get("/api/categories").json()] == ["Web Development", "Data Science"]
+    category_id = db.query(Category.id).filter(Category.name == "Data Science").scalar()
+
+    with count_queries(engine) as statements:
+        listed = client.get("/api/categories").json()
+        assert category_catalogue.get_category(db, category_id).name == "Data Science"
+    assert listed[0] == {"id": 1, "name": "Web Development", "description": None, "color": "#3B82F6"}
+    assert statements == []
+
+    # A miss checks the database once before the content request is refused
+    with count_queries(engine) as statements:
+        rejected = client.post("/api/content/", headers=auth_headers(user), json={
+            "title": "Nowhere", "content_text": "text", "content_type": "article", "category_id": 12345,
+        })
+    assert rejected.status_code == 404
+    assert len([statement for statement in statements if "FROM categories" in statement]) == 1
+
+
+def test_category_created_by_another_worker_is_found_on_a_miss(engine, db):
+    before = category_catalogue.get_catalogue(db)
+    # Written without this process's ORM, as another worker's commit would look from here
+    with engine.begin() as conn:
+        conn.execute(insert(Category).values(name="DevOps"))
+    category_id = db.query(Category.id).filter(Category.name == "DevOps").scalar()
+
+    assert category_catalogue.get_category(db, category_id).name == "DevOps"
+    assert category_catalogue.get_catalogue(db).version > before.version
+
+
+def test_catalogue_reloads_on_create_update_and_delete(client, engine, db):
+    first = category_catalogue.get_catalogue(db)
+    assert first.categories == ()
+
+    created = client.post("/api/categories", json={"name": "Mobile"}).json()
+    after_create = category_catalogue.get_catalogue(db)
+    assert after_create.version > first.version
+    assert [c.name for c in after_create.categories] == ["Mobile"]
+    assert client.post("/api/categories", json={"name": "Mobile"}).json() == {"error": "Category already exists"}
+
+    category = db.get(Category, created["id"])
+    category.name = "Mobile Development"
+    db.commit()
+    after_update = category_catalogue.get_catalogue(db)
+    assert after_update.version > after_create.version
+    assert after_update.get(created["id"]).name == "Mobile Development"
+    # Snapshots are immutable; the one a reader holds never changes under it
+    assert after_create.get(created["id"]).name == "Mobile"
+
+    category.description = "rolled back"
+    db.flush()
+    db.rollback()
+    assert category_catalogue.get_catalogue(db) is after_update
+
+    db.delete(db.get(Category, created["id"]))
+    db.commit()
+    after_delete = category_catalogue.get_catalogue(db)
+    assert after_delete.version > after_update.version
+    assert after_delete.categories == ()
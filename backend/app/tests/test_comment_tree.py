@@ -0,0 +1,164 @@
+import time
+
+from sqlalchemy.orm import joinedload
+
+from app.database.models import Category, Comment, CommentLike, Content, ContentTypeEnum
+from app.database.migrations import backfill_comment_paths
+from app.routes.comments import build_comment_tree
+from app.tests.conftest import auth_headers, count_queries
+
+
+def make_thread(db, author, n_comments, like_every=3):
+    category = Category(name="Threads")
+    db.add(category)
+    db.flush()
+    content = Content(title="Viral", content_type=ContentTypeEnum.ARTICLE, author_id=author.id, category_id=category.id)
+    db.add(content)
+    db.flush()
+
+    # Every fifth comment starts a thread; the rest reply to the previous comment
+    rows = [
+        {
+            "id": i,
+            "content_id": content.id,
+            "author_id": author.id,
+            "parent_id": None if i % 5 == 1 else i - 1,
+            "text": f"comment {i}",
+        }
+        for i in range(1, n_comments + 1)
+    ]
+    if rows:
+        db.execute(Comment.__table__.insert(), rows)
+        likes = [{"user_id": author.id, "comment_id": i} for i in range(1, n_comments + 1, like_every)]
+        db.execute(CommentLike.__table__.insert(), likes)
+    db.commit()
+    return content
+
+
+def load_thread(db, content):
+    return db.query(Comment).options(joinedload(Comment.author)).filter(
+        Comment.content_id == content.id
+    ).order_by(Comment.created_at, Comment.id).all()
+
+
+def test_tree_resolves_likes_in_two_queries(engine, db, make_user):
+    author = make_user()
+    content = make_thread(db, author, n_comments=50)
+    comments = load_thread(db, content)
+
+    with count_queries(engine) as statements:
+        tree = build_comment_tree(comments, db, author)
+
+    assert len(statements) == 2
+    assert len(tree) == 10
+    first = tree[0]
+    assert first["likes_count"] == 1 and first["is_liked"]
+    assert first["replies"][0]["likes_count"] == 0 and not first["replies"][0]["is_liked"]
+    assert [node["id"] for node in first["replies"][0]["replies"]] == [3]
+
+
+def test_benchmark_10k_comment_thread(engine, db, make_user):
+    author = make_user()
+    content = make_thread(db, author, n_comments=10_000)
+    comments = load_thread(db, content)
+
+    with count_queries(engine) as statements:
+        started = time.perf_counter()
+        tree = build_comment_tree(comments, db, author)
+        elapsed = time.perf_counter() - started
+
+    print(f"\nbuild_comment_tree: 10k comments in {elapsed * 1000:.1f} ms, {len(statements)} queries")
+    assert len(statements) == 2
+    assert len(tree) == 2_000
+    assert elapsed < 5
+
+
+def test_top_level_comments_are_paginated_with_reply_counts(client, db, make_user):
+    author = make_user()
+    content = make_thread(db, author, n_comments=25)
+    headers = auth_headers(author)
+
+    first = client.get(f"/api/comments/content/{content.id}?limit=3", headers=headers).json()
+    assert [item["id"] for item in first["items"]] == [21, 16, 11]
+    assert [item["reply_count"] for item in first["items"]] == [1, 1, 1]
+    assert all(item["replies"] == [] for item in first["items"])
+    assert "hashed_password" not in first["items"][0]["author"]
+
+    second = client.get(
+        f"/api/comments/content/{content.id}?limit=3&cursor={first['next_cursor']}", headers=headers
+    ).json()
+    assert [item["id"] for item in second["items"]] == [6, 1]
+    assert second["next_cursor"] is None
+
+
+def test_legacy_tree_is_returned_without_pagination_params(client, db, make_user):
+    author = make_user()
+    content = make_thread(db, author, n_comments=10)
+    tree = client.get(f"/api/comments/content/{content.id}", headers=auth_headers(author)).json()
+    assert isinstance(tree, list)
+    assert [node["id"] for node in tree] == [1, 6]
+    assert tree[0]["reply_count"] == 1
+
+
+def test_replies_are_cursor_paginated(client, db, make_user):
+    author = make_user()
+    content = make_thread(db, author, n_comments=1)
+    db.execute(Comment.__table__.insert(), [
+        {"id": i, "content_id": content.id, "author_id": author.id, "parent_id": 1, "text": f"reply {i}"}
+        for i in range(2, 9)
+    ])
+    db.commit()
+
+    first = client.get("/api/comments/1/replies?limit=4").json()
+    assert [item["id"] for item in first["items"]] == [2, 3, 4, 5]
+    second = client.get(f"/api/comments/1/replies?limit=4&cursor={first['next_cursor']}").json()
+    assert [item["id"] for item in second["items"]] == [6, 7, 8]
+    assert second["next_cursor"] is None
+
+    assert client.get("/api/comments/1/replies?cursor=not-a-cursor").status_code == 400
+
+
+def test_backfill_assigns_materialized_paths(engine, db, make_user):
+    author = make_user()
+    make_thread(db, author, n_comments=7)
+    with engine.begin() as conn:
+        backfill_comment_paths(conn)
+
+    paths = dict(db.query(Comment.id, Comment.path).all())
+    depths = dict(db.query(Comment.id, Comment.depth).all())
+    assert paths[1] == "0000000001/"
+    assert paths[4] == "0000000001/0000000002/0000000003/0000000004/"
+    assert depths[4] == 3
+    assert paths[7] == "0000000006/0000000007/"
+
+
+def test_replies_with_depth_fetch_subtree_in_one_query(engine, client, db, make_user):
+    author = make_user()
+    content = make_thread(db, author, n_comments=0)
+    headers = auth_headers(author)
+
+    def post(parent_id=None):
+        body = {"content_id": content.id, "text": "hi", "parent_id": parent_id}
+        return client.post("/api/comments/", json=body, headers=headers).json()["id"]
+
+    root = post()
+    first, second = post(root), post(root)
+    grandchild = post(first)
+    great_grandchild = post(grandchild)
+    post(second)
+
+    with count_queries(engine) as statements:
+        page = client.get(f"/api/comments/{root}/replies?depth=2").json()
+    subtree_queries = [s for s in statements if "comments.path >" in s]
+    assert len(subtree_queries) == 1
+
+    items = page["items"]
+    assert [item["id"] for item in items] == [first, second]
+    assert [node["id"] for node in items[0]["replies"]] == [grandchild]
+    # Depth limit reached: the great-grandchild is counted but not loaded
+    assert items[0]["replies"][0]["reply_count"] == 1
+    assert items[0]["replies"][0]["replies"] == []
+
+    deep = client.get(f"/api/comments/{root}/replies?depth=3&limit=1").json()
+    assert [item["id"] for item in deep["items"]] == [first]
+    assert deep["items"][0]["replies"][0]["replies"][0]["id"] == great_grandchild
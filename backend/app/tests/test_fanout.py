@@ -0,0 +1,83 @@
+from sqlalchemy import func
+
+from app.database.models import (
+    Category, Content, ContentStatusEnum, ContentTypeEnum, Notification, NotificationFanout,
+    RoleEnum, User, user_categories,
+)
+from app.services.fanout import create_category_fanout, run_fanout
+from app.services.jobs import run_pending
+from app.tests.conftest import auth_headers
+
+
+def make_subscribed_category(db, author, n_subscribers):
+    category = Category(name="Back-End")
+    db.add(category)
+    db.flush()
+    db.execute(User.__table__.insert(), [
+        {"email": f"sub{i}@example.com", "username": f"sub{i}", "hashed_password": "x", "is_active": True}
+        for i in range(n_subscribers)
+    ])
+    subscriber_ids = [row[0] for row in db.query(User.id).filter(User.username.like("sub%")).all()]
+    db.execute(user_categories.insert(), [
+        {"user_id": user_id, "category_id": category.id} for user_id in subscriber_ids + [author.id]
+    ])
+    content = Content(
+        title="Scaling Postgres", content_type=ContentTypeEnum.ARTICLE, status=ContentStatusEnum.REVIEW,
+        author_id=author.id, category_id=category.id,
+    )
+    db.add(content)
+    db.commit()
+    return category, content
+
+
+def notification_count(db, **filters):
+    return db.query(func.count(Notification.id)).filter_by(**filters).scalar()
+
+
+def test_approve_fans_out_to_subscribers_in_background(client, engine, db, make_user):
+    writer = make_user(role=RoleEnum.TECH_WRITER)
+    admin = make_user(role=RoleEnum.ADMIN)
+    category, content = make_subscribed_category(db, writer, n_subscribers=250)
+
+    response = client.put(f"/api/content/{content.id}/approve", headers=auth_headers(admin))
+    assert response.status_code == 200
+    # Only the author's approval notice is written on the request path
+    assert notification_count(db, related_content_id=content.id) == 1
+
+    assert run_pending(engine) == 1
+    fanout = db.query(NotificationFanout).one()
+    assert fanout.is_complete
+    assert fanout.delivered_count == 250
+    # Subscribers get the fan-out notification, the author only the approval
+    assert notification_count(db, related_content_id=content.id) == 251
+    assert notification_count(db, user_id=writer.id) == 1
+
+
+def test_fanout_resumes_after_crash_without_duplicates(engine, db, make_user):
+    writer = make_user(role=RoleEnum.TECH_WRITER)
+    category, content = make_subscribed_category(db, writer, n_subscribers=95)
+    fanout = create_category_fanout(db, content, category)
+    db.commit()
+
+    # Simulate a crash after two committed chunks of 20
+    subscriber_ids = sorted(row[0] for row in db.execute(
+        user_categories.select().where(user_categories.c.category_id == category.id)
+    ).all())
+    delivered = [user_id for user_id in subscriber_ids[:40] if user_id != writer.id]
+    db.execute(Notification.__table__.insert(), [
+        {"user_id": user_id, "title": fanout.title, "message": fanout.message,
+         "related_content_id": content.id, "is_read": False}
+        for user_id in delivered
+    ])
+    fanout.last_user_id = subscriber_ids[39]
+    fanout.delivered_count = len(delivered)
+    db.commit()
+
+    run_fanout(fanout.id, engine, chunk_size=20)
+    db.refresh(fanout)
+
+    assert fanout.is_complete
+    assert fanout.delivered_count == 95
+    per_user = db.query(Notification.user_id, func.count()).group_by(Notification.user_id).all()
+    assert all(count == 1 for _, count in per_user)
+    assert len(per_user) == 95
@@ -0,0 +1,180 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, func
+
+from app.database.models import (
+    Base, Category, Comment, Content, ContentStatusEnum, ContentTypeEnum, Job, JobStatusEnum,
+    Notification, RoleEnum,
+)
+from app.services import jobs
+from app.tests.conftest import auth_headers
+
+
+def test_retries_with_backoff_then_fails(engine, db, monkeypatch):
+    calls = []
+
+    @jobs.job_handler("test.flaky")
+    def flaky(session, payload):
+        calls.append(payload["n"])
+        raise RuntimeError("downstream unavailable")
+
+    monkeypatch.setattr(jobs, "retry_delay", lambda attempts: 0)
+    job = jobs.enqueue(db, "test.flaky", {"n": 1}, max_attempts=3)
+    db.commit()
+
+    for _ in range(3):
+        jobs.run_pending(engine)
+    db.refresh(job)
+
+    assert calls == [1, 1, 1]
+    assert job.status == JobStatusEnum.FAILED
+    assert job.attempts == 3
+    assert "downstream unavailable" in job.last_error
+
+
+def test_recurring_job_keeps_its_schedule_after_failing(engine, db, monkeypatch):
+    @jobs.job_handler("test.always_fails")
+    def always_fails(session, payload):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setitem(jobs._recurring, "test.always_fails", 3600)
+    monkeypatch.setattr(jobs, "retry_delay", lambda attempts: 0)
+    job = jobs.enqueue(db, "test.always_fails", max_attempts=2)
+    db.commit()
+
+    for _ in range(2):
+        jobs.run_pending(engine)
+    db.expire_all()
+
+    runs = db.query(Job).filter(Job.kind == "test.always_fails").order_by(Job.id).all()
+    assert [run.status for run in runs] == [JobStatusEnum.FAILED, JobStatusEnum.QUEUED]
+    assert runs[0].id == job.id
+    assert runs[1].run_at > datetime.utcnow()
+
+
+def test_failed_run_is_delayed_by_backoff(engine, db):
+    @jobs.job_handler("test.fails_once")
+    def fails_once(session, payload):
+        raise RuntimeError("boom")
+
+    job = jobs.enqueue(db, "test.fails_once")
+    db.commit()
+    assert jobs.run_pending(engine) == 1
+    # The retry is not due yet
+    assert jobs.run_pending(engine) == 0
+    db.refresh(job)
+    assert job.status == JobStatusEnum.QUEUED
+    assert job.run_at > datetime.utcnow()
+
+
+def test_idempotency_key_deduplicates(db):
+    first = jobs.enqueue(db, "notifications.create", {"notifications": []}, idempotency_key="k1")
+    db.commit()
+    second = jobs.enqueue(db, "notifications.create", {"notifications": []}, idempotency_key="k1")
+    db.commit()
+    assert first.id == second.id
+    assert db.query(func.count(Job.id)).scalar() == 1
+
+
+def test_expired_lease_is_reclaimed(engine, db):
+    ran = []
+    jobs.job_handler("test.record")(lambda session, payload: ran.append(payload))
+
+    job = jobs.enqueue(db, "test.record", {"ok": True})
+    db.commit()
+    claimed = jobs.claim_next(db, "worker-that-dies")
+    assert claimed.id == job.id
+    # Still leased: nobody else may run it
+    assert jobs.run_pending(engine) == 0
+
+    claimed.locked_until = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert jobs.run_pending(engine) == 1
+    db.refresh(job)
+    assert ran == [{"ok": True}]
+    assert job.status == JobStatusEnum.SUCCEEDED
+    assert job.attempts == 2
+
+
+def test_comment_notifications_are_queued(client, engine, db, make_user):
+    writer = make_user(role=RoleEnum.TECH_WRITER)
+    reader = make_user()
+    category = Category(name="DevOps")
+    db.add(category)
+    db.flush()
+    content = Content(title="CI tips", content_type=ContentTypeEnum.ARTICLE,
+                      status=ContentStatusEnum.PUBLISHED, author_id=writer.id, category_id=category.id)
+    db.add(content)
+    db.commit()
+
+    response = client.post("/api/comments/", json={"text": "Nice", "content_id": content.id},
+                           headers=auth_headers(reader))
+    assert response.status_code in (200, 201)
+    assert db.query(func.count(Notification.id)).scalar() == 0
+
+    assert jobs.run_pending(engine) == 1
+    notification = db.query(Notification).one()
+    assert notification.user_id == writer.id
+
+
+def test_job_stats_endpoint(client, db, make_user):
+    admin = make_user(role=RoleEnum.ADMIN)
+    jobs.enqueue(db, "notifications.create", {"notifications": []})
+    db.commit()
+
+    response = client.get("/api/admin/jobs/stats", headers=auth_headers(admin))
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["counts"]["queued"] == 1
+    assert stats["ready"] == 1
+    assert stats["lag_seconds"] >= 0
+
+    assert client.get("/api/admin/jobs/stats", headers=auth_headers(make_user())).status_code == 403
+
+
+def test_job_throughput_benchmark(tmp_path):
+    """Four workers drain 1000 jobs exactly once each"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={"timeout": 30})
+
+    @event.listens_for(engine, "connect")
+    def use_wal(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+        dbapi_connection.execute("PRAGMA synchronous=NORMAL")
+
+    Base.metadata.create_all(bind=engine)
+    seen = []
+    lock = threading.Lock()
+
+    @jobs.job_handler("test.noop")
+    def noop(session, payload):
+        with lock:
+            seen.append(payload["n"])
+
+    with engine.begin() as conn:
+        conn.execute(Job.__table__.insert(), [
+            {"kind": "test.noop", "payload": f'{{"n": {n}}}', "status": "QUEUED",
+             "attempts": 0, "max_attempts": 5, "run_at": datetime.utcnow(), "created_at": datetime.utcnow()}
+            for n in range(1000)
+        ])
+
+    started = time.perf_counter()
+    workers = [
+        threading.Thread(target=jobs.run_pending, args=(engine,), kwargs={"worker_id": f"w{i}"})
+        for i in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    print(f"\n1000 jobs in {elapsed:.2f}s ({1000 / elapsed:.0f} jobs/s)")
+
+    assert sorted(seen) == list(range(1000))
+    with engine.connect() as conn:
+        remaining = conn.execute(
+            Job.__table__.select().where(Job.status != JobStatusEnum.SUCCEEDED)
+        ).fetchall()
+    assert remaining == []
+    engine.dispose()
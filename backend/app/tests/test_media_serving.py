@@ -0,0 +1,122 @@
+import asyncio
+import os
+import tracemalloc
+from email.utils import formatdate
+
+from starlette.applications import Starlette
+from starlette.testclient import TestClient
+
+from app.core.config import settings
+from app.services import storage
+from app.tests.conftest import auth_headers
+from app.utils.static_files import MediaStaticFiles, parse_range
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 8
+
+
+def media_app(directory):
+    app = Starlette()
+    app.mount("/uploads", MediaStaticFiles(directory=directory))
+    return app
+
+
+def test_ranges_and_conditional_requests(tmp_path):
+    (tmp_path / "clip.mp4").write_bytes(bytes(range(256)) * 4)
+    client = TestClient(media_app(tmp_path))
+
+    full = client.get("/uploads/clip.mp4")
+    assert full.status_code == 200 and len(full.content) == 1024
+    assert full.headers["accept-ranges"] == "bytes"
+    assert full.headers["cache-control"] == settings.MEDIA_CACHE_CONTROL["/uploads/"]
+
+    part = client.get("/uploads/clip.mp4", headers={"Range": "bytes=10-19"})
+    assert part.status_code == 206
+    assert part.content == bytes(range(10, 20))
+    assert part.headers["content-range"] == "bytes 10-19/1024"
+    assert part.headers["content-length"] == "10"
+    assert client.get("/uploads/clip.mp4", headers={"Range": "bytes=-4"}).content == bytes(range(252, 256))
+    assert client.get("/uploads/clip.mp4", headers={"Range": "bytes=1000-"}).headers["content-range"] == "bytes 1000-1023/1024"
+    unsatisfiable = client.get("/uploads/clip.mp4", headers={"Range": "bytes=5000-"})
+    assert unsatisfiable.status_code == 416 and unsatisfiable.headers["content-range"] == "bytes */1024"
+    # A stale If-Range gets the whole, current file
+    assert client.get("/uploads/clip.mp4", headers={"Range": "bytes=0-1", "If-Range": '"old"'}).status_code == 200
+
+    etag, last_modified = full.headers["etag"], full.headers["last-modified"]
+    assert client.get("/uploads/clip.mp4", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/uploads/clip.mp4", headers={"If-None-Match": '"other"'}).status_code == 200
+    assert client.get("/uploads/clip.mp4", headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get("/uploads/clip.mp4", headers={"If-Modified-Since": formatdate(0, usegmt=True)}).status_code == 200
+
+    assert parse_range("bytes=0-1,5-6", 10) is None
+    assert parse_range("items=0-1", 10) is None
+
+
+def test_stored_media_revalidates_by_content_hash(client, make_user):
+    user = make_user()
+    response = client.post("/api/auth/upload-avatar", files={"file": ("me.png", PNG, "image/png")},
+                           headers=auth_headers(user))
+    url = response.json()["user"]["profile"]["avatar_url"]
+    key = storage.key_from_url(url)
+
+    response = client.get(url)
+    assert response.headers["etag"] == f'"{key.split(".")[0]}"'
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert client.get(url, headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+    assert client.get(url, headers={"Range": "bytes=0-7"}).content == PNG[:8]
+    head = client.head(url)
+    assert head.status_code == 200 and head.content == b"" and head.headers["content-length"] == str(len(PNG))
+
+
+def serve(app, path, headers=(), extensions=None):
+    """Run one request through the ASGI app, counting body bytes instead of keeping them"""
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http", "server": ("test", 80),
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers],
+        "extensions": extensions or {},
+    }
+    result = {"bytes": 0, "messages": []}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            result["bytes"] += len(message["body"])
+        else:
+            result["messages"].append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return result
+
+
+def test_large_file_memory_stays_flat(tmp_path):
+    size = 512 * 1024 * 1024
+    # Sparse: takes no disk space, reads back as zeros
+    with open(tmp_path / "talk.mp4", "wb") as f:
+        f.truncate(size)
+    app = media_app(tmp_path)
+
+    tracemalloc.start()
+    try:
+        full = serve(app, "/uploads/talk.mp4")
+        seek = serve(app, "/uploads/talk.mp4", headers=[("Range", f"bytes={size - 3_000_000}-")])
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    print(f"\nserved {(full['bytes'] + seek['bytes']) / 1e6:.0f} MB with a {peak / 1e6:.2f} MB peak")
+
+    assert full["bytes"] == size
+    assert seek["messages"][0]["status"] == 206 and seek["bytes"] == 3_000_000
+    assert peak < 4 * settings.MEDIA_CHUNK_BYTES + 1_000_000
+
+
+def test_zero_copy_send_when_the_server_offers_it(tmp_path):
+    (tmp_path / "song.mp3").write_bytes(b"x" * 5000)
+    result = serve(media_app(tmp_path), "/uploads/song.mp3", headers=[("Range", "bytes=100-199")],
+                   extensions={"http.response.zerocopysend": {}})
+    start, zero_copy = result["messages"]
+    assert start["status"] == 206
+    assert zero_copy["type"] == "http.response.zerocopysend"
+    assert (zero_copy["offset"], zero_copy["count"]) == (100, 100)
+    assert os.path.samefile(zero_copy["file"].name, tmp_path / "song.mp3")
@@ -0,0 +1,215 @@
+import asyncio
+import base64
+import hashlib
+import os
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import ClientDisconnect
+
+from app.database.models import MediaUpload, MediaUploadStatusEnum, StoredObject
+from app.services import media_uploads
+from app.tests.conftest import auth_headers
+
+DATA = os.urandom(300_000)
+CHUNK = {"Content-Type": "application/offset+octet-stream"}
+
+
+def create(client, user, size=len(DATA), filename="episode.mp3"):
+    response = client.post("/api/uploads", json={"filename": filename, "size": size}, headers=auth_headers(user))
+    assert response.status_code == 201, response.text
+    return response
+
+
+def patch(client, user, upload_id, offset, data, checksum=None):
+    headers = {**auth_headers(user), **CHUNK, "Upload-Offset": str(offset)}
+    if checksum:
+        headers["Upload-Checksum"] = checksum
+    return client.patch(f"/api/uploads/{upload_id}", content=data, headers=headers)
+
+
+def sha256_b64(data):
+    return "sha256 " + base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+def test_resumable_upload_end_to_end(client, db, make_user):
+    user = make_user()
+    created = create(client, user)
+    upload_id = created.json()["id"]
+    assert created.headers["location"] == f"/api/uploads/{upload_id}"
+    assert created.headers["upload-offset"] == "0"
+
+    first = patch(client, user, upload_id, 0, DATA[:100_000], checksum=sha256_b64(DATA[:100_000]))
+    assert first.status_code == 204 and first.headers["upload-offset"] == "100000"
+
+    # A corrupted chunk is rejected and the offset stays put
+    assert patch(client, user, upload_id, 100_000, DATA[100_000:200_000],
+                 checksum=sha256_b64(b"something else")).status_code == 460
+    # So does a chunk at the wrong offset, telling the client where to resume
+    stale = patch(client, user, upload_id, 0, DATA[:10])
+    assert stale.status_code == 409 and stale.headers["upload-offset"] == "100000"
+    assert patch(client, user, upload_id, 100_000, DATA[100_000:] + b"extra").status_code == 413
+    head = client.head(f"/api/uploads/{upload_id}", headers=auth_headers(user))
+    assert head.headers["upload-offset"] == "100000" and head.headers["upload-length"] == str(len(DATA))
+
+    # Completing early is refused
+    assert client.post(f"/api/uploads/{upload_id}/complete", headers=auth_headers(user)).status_code == 409
+    assert patch(client, user, upload_id, 100_000, DATA[100_000:]).status_code == 204
+    done = client.post(f"/api/uploads/{upload_id}/complete", json={"sha256": hashlib.sha256(DATA).hexdigest()},
+                       headers=auth_headers(user))
+    assert done.status_code == 200, done.text
+    assert done.json()["status"] == "complete" and done.json()["expires_at"] is None
+    media_url = done.json()["media_url"]
+    assert client.get(media_url, headers={"Range": "bytes=0-99"}).content == DATA[:100]
+    assert not os.path.exists(media_uploads.part_path(upload_id))
+
+    # Uploads belong to whoever started them
+    assert client.get(f"/api/uploads/{upload_id}", headers=auth_headers(make_user())).status_code == 404
+    # Deleting a finished upload keeps the file, which content may already point at
+    assert client.delete(f"/api/uploads/{upload_id}", headers=auth_headers(user)).status_code == 204
+    assert db.query(MediaUpload).count() == 0
+    assert [stored.refcount for stored in db.query(StoredObject)] == [1]
+    assert client.get(media_url).status_code == 200
+
+
+def test_only_media_files_are_accepted(client, make_user):
+    user = make_user()
+    response = client.post("/api/uploads", json={"filename": "notes.exe", "size": 10}, headers=auth_headers(user))
+    assert response.status_code == 400
+    upload_id = create(client, user).json()["id"]
+    response = client.patch(f"/api/uploads/{upload_id}", content=b"x",
+                            headers={**auth_headers(user), "Upload-Offset": "0"})
+    assert response.status_code == 415
+
+
+def dropped_after(data, cut):
+    async def chunks():
+        yield data[:cut]
+        raise ClientDisconnect()
+    return chunks()
+
+
+def test_a_dropped_connection_keeps_what_arrived(db, make_user):
+    user = make_user()
+    upload = media_uploads.create_upload(db, user.id, "talk.mp4", len(DATA))
+
+    offset = asyncio.run(media_uploads.append_chunk(db, upload, 0, dropped_after(DATA, 70_000)))
+    assert offset == 70_000
+    # With a checksum, half a chunk is worthless and is dropped again
+    offset = asyncio.run(media_uploads.append_chunk(db, upload, 70_000, dropped_after(DATA[70_000:], 5_000),
+                                                    checksum=sha256_b64(DATA[70_000:])))
+    assert offset == 70_000
+    assert os.path.getsize(media_uploads.part_path(upload.id)) == 70_000
+    with open(media_uploads.part_path(upload.id), "rb") as part:
+        assert part.read() == DATA[:70_000]
+
+
+def test_concurrent_chunks_at_one_offset_do_not_share_the_file(db, session_factory, make_user):
+    user = make_user()
+    upload = media_uploads.create_upload(db, user.id, "talk.mp4", len(DATA))
+
+    async def race():
+        first_started, release_first = asyncio.Event(), asyncio.Event()
+
+        async def slow_chunks():
+            yield DATA[:50_000]
+            first_started.set()
+            await release_first.wait()
+            yield DATA[50_000:100_000]
+
+        first = asyncio.create_task(media_uploads.append_chunk(db, upload, 0, slow_chunks()))
+        await first_started.wait()
+        with session_factory() as other:
+            rival = other.get(MediaUpload, upload.id)
+            with pytest.raises(HTTPException) as locked:
+                await media_uploads.append_chunk(other, rival, 0, dropped_after(b"\xff" * 10, 10),
+                                                 checksum=sha256_b64(b"\xff" * 10))
+            release_first.set()
+            assert await first == 100_000
+            # The loser retries at the offset it read before; the lock holder already moved it
+            with pytest.raises(HTTPException) as stale:
+                await media_uploads.append_chunk(other, rival, 0, dropped_after(b"\xff" * 10, 10))
+        return locked.value, stale.value
+
+    locked, stale = asyncio.run(race())
+    assert locked.status_code == 423
+    assert stale.status_code == 409 and stale.headers["Upload-Offset"] == "100000"
+    with open(media_uploads.part_path(upload.id), "rb") as part:
+        assert part.read() == DATA[:100_000]
+
+
+def test_concurrent_completes_store_the_file_once(db, session_factory, make_user, monkeypatch):
+    user = make_user()
+    upload = media_uploads.create_upload(db, user.id, "talk.mp4", len(DATA))
+
+    async def whole():
+        yield DATA
+
+    asyncio.run(media_uploads.append_chunk(db, upload, 0, whole()))
+    hash_file = media_uploads.storage.hash_file
+
+    async def race():
+        hashing, release_first = asyncio.Event(), asyncio.Event()
+
+        async def slow_hash(func, *args):
+            if func is hash_file:
+                hashing.set()
+                await release_first.wait()
+            return func(*args)
+
+        monkeypatch.setattr(media_uploads, "run_in_threadpool", slow_hash)
+        first = asyncio.create_task(media_uploads.finalize_upload(db, upload))
+        await hashing.wait()
+        with session_factory() as other:
+            with pytest.raises(HTTPException) as locked:
+                await media_uploads.finalize_upload(other, other.get(MediaUpload, upload.id))
+            release_first.set()
+            await first
+            # Once it is done, completing again just reports the stored upload
+            again = await media_uploads.finalize_upload(other, other.get(MediaUpload, upload.id))
+        return locked.value, again
+
+    locked, again = asyncio.run(race())
+    assert locked.status_code == 423
+    assert again.status == MediaUploadStatusEnum.COMPLETE and again.key == upload.key
+    assert [stored.refcount for stored in db.query(StoredObject)] == [1]
+
+
+def test_abandoned_uploads_are_cleaned_up(db, make_user):
+    user = make_user()
+    stale = media_uploads.create_upload(db, user.id, "old.mp3", 100)
+    fresh = media_uploads.create_upload(db, user.id, "new.mp3", 100)
+    stale_id = stale.id
+    stale.updated_at = datetime.utcnow() - timedelta(days=2)
+    db.commit()
+
+    assert media_uploads.cleanup_abandoned(db) == 1
+    assert [upload.id for upload in db.query(MediaUpload)] == [fresh.id]
+    assert not os.path.exists(media_uploads.part_path(stale_id))
+    assert os.path.exists(media_uploads.part_path(fresh.id))
+    # An upload whose partial file went away has to start over
+    os.unlink(media_uploads.part_path(fresh.id))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(media_uploads.append_chunk(db, fresh, 0, dropped_after(b"x", 1)))
+    assert error.value.status_code == 410
+
+
+def test_chunk_memory_stays_flat(db, make_user):
+    size, block = 128 * 1024 * 1024, os.urandom(64 * 1024)
+    upload = media_uploads.create_upload(db, make_user().id, "lecture.mp4", size)
+
+    async def body():
+        for _ in range(size // len(block)):
+            yield block
+
+    tracemalloc.start()
+    try:
+        offset = asyncio.run(media_uploads.append_chunk(db, upload, 0, body(), checksum=None))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    print(f"\nappended {size / 1e6:.0f} MB with a {peak / 1e6:.2f} MB peak")
+    assert offset == size
+    assert peak < 2_000_000
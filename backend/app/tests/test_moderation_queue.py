@@ -0,0 +1,120 @@
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from app.database.models import (
+    Base, Content, ContentFlag, ContentStatusEnum, ContentTypeEnum, FlagReasonEnum, RoleEnum,
+)
+from app.services import moderation
+from app.tests.conftest import auth_headers
+
+
+def add_pending(db, author, n):
+    start = datetime(2026, 3, 1)
+    items = [
+        Content(title=f"Post {i}", content_type=ContentTypeEnum.ARTICLE, status=ContentStatusEnum.REVIEW,
+                author_id=author.id, created_at=start + timedelta(minutes=i))
+        for i in range(n)
+    ]
+    db.add_all(items)
+    db.commit()
+    return [item.id for item in items]
+
+
+def claim(client, admin, queue="content", limit=3):
+    response = client.post(f"/api/admin/moderation/queue/{queue}/claim", params={"limit": limit},
+                           headers=auth_headers(admin))
+    assert response.status_code == 200, response.text
+    return [item["id"] for item in response.json()["items"]]
+
+
+def stats(client, admin):
+    return client.get("/api/admin/moderation/queue/stats", headers=auth_headers(admin)).json()
+
+
+def test_moderators_get_disjoint_items_oldest_first(client, db, make_user):
+    alice = make_user(role=RoleEnum.ADMIN)
+    bob = make_user(role=RoleEnum.ADMIN)
+    ids = add_pending(db, alice, 8)
+
+    assert claim(client, alice) == ids[:3]
+    assert claim(client, bob) == ids[3:6]
+    # Claiming again renews your own leases rather than taking more
+    assert claim(client, alice) == ids[:3]
+
+    content = stats(client, alice)["content"]
+    assert (content["depth"], content["claimed"], content["available"]) == (8, 6, 2)
+    assert content["claimed_by"] == {str(alice.id): 3, str(bob.id): 3}
+    assert content["oldest_age_seconds"] >= content["oldest_unclaimed_age_seconds"] > 0
+
+    # Moderation takes items out of the queue and drops their leases
+    client.post("/api/admin/moderation/content/approve", json={"ids": ids[:2]}, headers=auth_headers(alice))
+    assert stats(client, alice)["content"]["claimed"] == 4
+    db.expire_all()
+    assert db.get(Content, ids[0]).claimed_by is None
+
+
+def test_expired_and_released_leases_return_to_the_queue(client, db, make_user):
+    alice = make_user(role=RoleEnum.ADMIN)
+    bob = make_user(role=RoleEnum.ADMIN)
+    ids = add_pending(db, alice, 4)
+    assert claim(client, alice, limit=2) == ids[:2]
+
+    db.query(Content).filter(Content.id == ids[0]).update({"claim_expires_at": datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+    assert stats(client, alice)["content"]["expired_leases"] == 1
+    assert claim(client, bob, limit=2) == [ids[0], ids[2]]
+
+    response = client.post("/api/admin/moderation/queue/content/release", json={"ids": [ids[0], ids[1]]},
+                           headers=auth_headers(alice))
+    # ids[0] now belongs to bob
+    assert [item["status"] for item in response.json()["results"]] == ["unchanged", "released"]
+    assert claim(client, bob, limit=3) == ids[:3]
+
+
+def test_flag_queue(client, db, make_user):
+    admin = make_user(role=RoleEnum.ADMIN)
+    content_id = add_pending(db, admin, 1)[0]
+    flags = [ContentFlag(content_id=content_id, flagged_by=admin.id, reason=FlagReasonEnum.SPAM) for _ in range(3)]
+    flags.append(ContentFlag(content_id=content_id, flagged_by=admin.id, reason=FlagReasonEnum.SPAM, is_resolved=True))
+    db.add_all(flags)
+    db.commit()
+
+    assert claim(client, admin, queue="flags", limit=10) == [flag.id for flag in flags[:3]]
+    assert stats(client, admin)["flags"]["depth"] == 3
+    response = client.post("/api/admin/moderation/queue/users/claim", headers=auth_headers(admin))
+    assert response.status_code == 422
+
+
+def test_concurrent_claims_never_overlap(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'queue.db'}", connect_args={"timeout": 30})
+
+    @event.listens_for(engine, "connect")
+    def _wal(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
+    Base.metadata.create_all(bind=engine)
+    with Session(bind=engine) as db:
+        db.add_all(
+            Content(title=f"Post {i}", content_type=ContentTypeEnum.ARTICLE, status=ContentStatusEnum.REVIEW)
+            for i in range(60)
+        )
+        db.commit()
+
+    claimed = {}
+
+    def moderator(moderator_id):
+        with Session(bind=engine) as db:
+            claimed[moderator_id] = moderation.claim_items(db, "content", moderator_id, 6)
+
+    threads = [threading.Thread(target=moderator, args=(n,)) for n in range(1, 11)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    everything = [item_id for ids in claimed.values() for item_id in ids]
+    assert len(everything) == len(set(everything)) == 60
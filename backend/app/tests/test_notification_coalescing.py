@@ -0,0 +1,114 @@
+from datetime import datetime
+
+from sqlalchemy import func
+
+from app.database.models import (
+    Category, Content, ContentStatusEnum, ContentTypeEnum, Notification, NotificationActor, NotificationTypeEnum,
+    RoleEnum,
+)
+from app.services import notifications
+from app.services.unread_counts import get_unread_count
+from app.tests.conftest import auth_headers
+
+
+def make_article(db, author):
+    category = Category(name="Frontend")
+    db.add(category)
+    db.flush()
+    content = Content(title="CSS Grid", content_type=ContentTypeEnum.ARTICLE,
+                      status=ContentStatusEnum.PUBLISHED, author_id=author.id, category_id=category.id)
+    db.add(content)
+    db.commit()
+    return content
+
+
+def like(client, content, user):
+    response = client.post(f"/api/content/{content.id}/like", json={"content_id": content.id, "is_like": True},
+                           headers=auth_headers(user))
+    assert response.status_code == 200
+
+
+def test_likes_merge_into_one_notification(client, db, make_user):
+    author = make_user(role=RoleEnum.TECH_WRITER)
+    content = make_article(db, author)
+    fans = [make_user() for _ in range(42)]
+
+    for fan in fans:
+        like(client, content, fan)
+
+    rows = db.query(Notification).filter(Notification.user_id == author.id).all()
+    assert len(rows) == 1
+    assert rows[0].aggregate_count == 42
+    assert rows[0].notification_type == NotificationTypeEnum.LIKE
+    assert rows[0].title == "42 people liked your content"
+    assert rows[0].message == f"{fans[-1].full_name} and 41 others liked \"CSS Grid\""
+    assert get_unread_count(db, author.id) == 1
+
+    listed = client.get("/api/notifications/", headers=auth_headers(author)).json()
+    assert [n["aggregate_count"] for n in listed] == [42]
+
+
+def test_read_notification_starts_a_new_group(client, db, make_user):
+    author = make_user(role=RoleEnum.TECH_WRITER)
+    content = make_article(db, author)
+    like(client, content, make_user())
+    like(client, content, make_user())
+    client.put("/api/notifications/mark-all-read", headers=auth_headers(author))
+
+    like(client, content, make_user())
+
+    counts = sorted(n.aggregate_count for n in db.query(Notification).filter_by(user_id=author.id))
+    assert counts == [1, 2]
+    assert get_unread_count(db, author.id) == 1
+
+
+def test_new_window_starts_a_new_group(client, db, make_user, monkeypatch):
+    author = make_user(role=RoleEnum.TECH_WRITER)
+    content = make_article(db, author)
+    like(client, content, make_user())
+
+    window = notifications.settings.NOTIFICATION_COALESCE_WINDOW_SECONDS
+    later = notifications.time.time() + window
+    monkeypatch.setattr(notifications.time, "time", lambda: later)
+    like(client, content, make_user())
+
+    assert db.query(func.count(Notification.id)).filter_by(user_id=author.id).scalar() == 2
+    assert get_unread_count(db, author.id) == 2
+
+
+def test_liking_again_does_not_count_twice(client, db, make_user):
+    author = make_user(role=RoleEnum.TECH_WRITER)
+    content = make_article(db, author)
+    fan, other = make_user(), make_user()
+
+    like(client, content, fan)
+    like(client, content, other)
+    # Unlike, like again, and again
+    for _ in range(4):
+        like(client, content, fan)
+
+    row = db.query(Notification).filter_by(user_id=author.id).one()
+    assert row.aggregate_count == 2
+    assert row.title == "2 people liked your content"
+    assert row.message == f"{other.full_name} and 1 other liked \"CSS Grid\""
+    assert get_unread_count(db, author.id) == 1
+    assert sorted(a.actor_id for a in db.query(NotificationActor).filter_by(notification_id=row.id)) == [fan.id, other.id]
+
+
+def test_merged_group_moves_to_the_top_of_the_inbox(client, db, make_user):
+    author = make_user(role=RoleEnum.TECH_WRITER)
+    content = make_article(db, author)
+    like(client, content, make_user())
+    db.add(Notification(user_id=author.id, notification_type=NotificationTypeEnum.STATUS_CHANGE,
+                        title="Approved", message="Your content was approved"))
+    db.commit()
+    # Both happened a while ago, the like first
+    liked, approved = db.query(Notification).order_by(Notification.id)
+    liked.created_at = datetime(2026, 1, 1, 10)
+    approved.created_at = datetime(2026, 1, 1, 11)
+    db.commit()
+
+    like(client, content, make_user())
+
+    listed = client.get("/api/notifications/inbox", headers=auth_headers(author)).json()
+    assert [n["title"] for n in listed["items"]] == ["2 people liked your content", "Approved"]
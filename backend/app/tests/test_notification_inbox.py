@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from app.database.models import Notification, NotificationTypeEnum
+from app.tests.conftest import auth_headers
+
+
+def seed_inbox(db, user_id):
+    base = datetime(2026, 1, 1, 12, 0, 0)
+    rows = []
+    for n in range(25):
+        rows.append({
+            "user_id": user_id,
+            "notification_type": NotificationTypeEnum.LIKE if n % 2 else NotificationTypeEnum.COMMENT,
+            "title": f"n{n}", "message": "m", "is_read": n < 10,
+            # Groups of five share a timestamp, so the id tie-break matters
+            "created_at": base + timedelta(minutes=n // 5),
+        })
+    db.execute(Notification.__table__.insert(), rows)
+    db.commit()
+
+
+def walk(client, headers, **params):
+    items, cursor, pages = [], None, 0
+    while True:
+        query = dict(params, limit=4)
+        if cursor:
+            query["cursor"] = cursor
+        page = client.get("/api/notifications/inbox", params=query, headers=headers).json()
+        items += page["items"]
+        pages += 1
+        cursor = page["next_cursor"]
+        if not cursor:
+            return items, pages
+
+
+def test_inbox_pages_newest_first_without_gaps(client, db, make_user):
+    user = make_user()
+    seed_inbox(db, user.id)
+
+    items, pages = walk(client, auth_headers(user))
+
+    assert pages == 7
+    assert [item["title"] for item in items] == [f"n{n}" for n in range(24, -1, -1)]
+
+
+def test_inbox_filters(client, db, make_user):
+    user = make_user()
+    seed_inbox(db, user.id)
+    headers = auth_headers(user)
+
+    likes, _ = walk(client, headers, notification_type="like")
+    assert len(likes) == 12
+    assert {item["notification_type"] for item in likes} == {"like"}
+
+    unread_comments, _ = walk(client, headers, notification_type="comment", is_read="false")
+    assert len(unread_comments) == 8
+    assert not any(item["is_read"] for item in unread_comments)
+
+    assert client.get("/api/notifications/inbox", params={"notification_type": "bogus"},
+                      headers=headers).status_code == 422
+    assert client.get("/api/notifications/inbox", params={"cursor": "nope"}, headers=headers).status_code == 400
+
+
+def test_inbox_includes_unread_count(client, db, make_user):
+    user = make_user()
+    headers = auth_headers(user)
+    db.add_all([Notification(user_id=user.id, title="t", message="m") for _ in range(3)])
+    db.commit()
+
+    page = client.get("/api/notifications/inbox", headers=headers).json()
+    assert page["unread_count"] == 3
+    assert len(page["items"]) == 3
+    assert page["next_cursor"] is None
+
+    page = client.get("/api/notifications/inbox", params={"include_unread_count": "false"}, headers=headers).json()
+    assert page["unread_count"] is None
+
+
+def test_inbox_page_uses_the_index(db):
+    plan = db.execute(text(
+        "EXPLAIN QUERY PLAN SELECT * FROM notifications WHERE user_id = 1 "
+        "AND (created_at, id) < ('2026-01-01', 10) ORDER BY created_at DESC, id DESC LIMIT 21"
+    )).all()
+    details = " ".join(row[-1] for row in plan)
+    assert "ix_notifications_user_created_id" in details
+    assert "TEMP B-TREE" not in details
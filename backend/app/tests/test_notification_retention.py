@@ -0,0 +1,98 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+
+from app.database.models import Notification, NotificationArchive, NotificationTypeEnum, RoleEnum
+from app.services import jobs
+from app.services.notifications import bulk_create_notifications
+from app.services.retention import compact_notifications
+from app.services.unread_counts import get_unread_count
+from app.tests.conftest import auth_headers
+
+NOW = datetime.now(timezone.utc)
+
+
+def add(db, user_id, notification_type, days_old, is_read=True, n=1):
+    db.execute(Notification.__table__.insert(), [
+        {"user_id": user_id, "notification_type": notification_type, "title": "t", "message": "m",
+         "is_read": is_read, "created_at": NOW - timedelta(days=days_old)}
+        for _ in range(n)
+    ])
+    db.commit()
+
+
+def remaining(db, notification_type):
+    return db.query(func.count(Notification.id)).filter_by(notification_type=notification_type).scalar()
+
+
+def test_per_type_retention(engine, db, make_user):
+    user = make_user()
+    add(db, user.id, NotificationTypeEnum.LIKE, days_old=40)            # past 30-day like retention
+    add(db, user.id, NotificationTypeEnum.LIKE, days_old=10)
+    add(db, user.id, NotificationTypeEnum.COMMENT, days_old=40)         # within the 90-day default
+    add(db, user.id, NotificationTypeEnum.COMMENT, days_old=100, n=3)
+    add(db, user.id, NotificationTypeEnum.COMMENT, days_old=100, is_read=False)
+
+    report = compact_notifications(engine, batch_size=2)
+
+    assert report == {"like": {"deleted": 1}, "comment": {"archived": 3}}
+    assert remaining(db, NotificationTypeEnum.LIKE) == 1
+    # Recent and unread comments stay
+    assert remaining(db, NotificationTypeEnum.COMMENT) == 2
+    archived = db.query(NotificationArchive).all()
+    assert len(archived) == 3
+    assert {a.notification_type for a in archived} == {NotificationTypeEnum.COMMENT}
+
+
+def test_admin_storage_and_compact_endpoints(client, engine, db, make_user):
+    admin = make_user(role=RoleEnum.ADMIN)
+    add(db, admin.id, NotificationTypeEnum.FLAG, days_old=200, n=5)
+
+    tables = client.get("/api/admin/storage", headers=auth_headers(admin)).json()["tables"]
+    assert tables["notifications"]["rows"] == 5
+    assert tables["notifications_archive"]["rows"] == 0
+
+    response = client.post("/api/admin/notifications/compact", headers=auth_headers(admin))
+    assert response.status_code == 202
+    jobs.run_pending(engine)
+
+    tables = client.get("/api/admin/storage", headers=auth_headers(admin)).json()["tables"]
+    assert tables["notifications"]["rows"] == 0
+    assert tables["notifications_archive"]["rows"] == 5
+
+
+def test_inbox_latency_before_and_after_compaction(engine, db, make_user, record_property):
+    user = make_user()
+    add(db, user.id, NotificationTypeEnum.LIKE, days_old=60, n=20_000)
+    # Unread rows go through the normal path, so the user's counter knows about them
+    bulk_create_notifications(db, [
+        {"user_id": user.id, "notification_type": NotificationTypeEnum.COMMENT, "title": "t", "message": "m"}
+        for _ in range(20)
+    ])
+    db.commit()
+    assert get_unread_count(db, user.id) == 20
+    inbox = (
+        select(Notification).where(Notification.user_id == user.id)
+        .order_by(Notification.created_at.desc()).limit(20)
+    )
+
+    def latency():
+        started = time.perf_counter()
+        for _ in range(20):
+            db.execute(inbox).all()
+        return (time.perf_counter() - started) / 20
+
+    before = latency()
+    compact_notifications(engine)
+    after = latency()
+    record_property("inbox_ms_before_compaction", round(before * 1000, 3))
+    record_property("inbox_ms_after_compaction", round(after * 1000, 3))
+
+    assert len(db.execute(inbox).all()) == 20
+    assert db.query(func.count(Notification.id)).scalar() == 20
+    # Compaction only removed read rows, so the unread counter is unchanged
+    assert get_unread_count(db, user.id) == 20
+    # The inbox index keeps the query fast either way; a smaller table must not make it slower.
+    # The slack absorbs timer noise on sub-millisecond queries
+    assert after <= before * 2 + 0.005
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import threading
+import time
+import tracemalloc
+
+from sqlalchemy.orm import Session
+
+from app.database.models import Notification, NotificationTypeEnum
+from app.services import jobs
+from app.services.notification_hub import SYNC, Subscriber, hub, notification_events
+from app.services.notifications import enqueue_notifications, notification_row
+from app.tests.conftest import auth_headers
+
+
+def add_notification(engine, user_id, title="Hello"):
+    # Committed from another thread, like a request handler or job worker would
+    result = {}
+
+    def commit():
+        with Session(bind=engine) as session:
+            notification = Notification(user_id=user_id, title=title, message="...",
+                                        notification_type=NotificationTypeEnum.COMMENT)
+            session.add(notification)
+            session.commit()
+            result["id"] = notification.id
+
+    thread = threading.Thread(target=commit)
+    thread.start()
+    thread.join()
+    return result["id"]
+
+
+def parse(chunk):
+    fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines() if not line.startswith(":"))
+    if "data" in fields:
+        fields["data"] = json.loads(fields["data"])
+    return fields
+
+
+def test_stream_pushes_new_notifications(engine, make_user):
+    user = make_user()
+    add_notification(engine, user.id, "Before connecting")
+
+    async def scenario():
+        subscriber = hub.subscribe(user.id)
+        events = notification_events(subscriber, engine, None, heartbeat_seconds=0.2)
+        assert (await events.__anext__()).startswith("retry:")
+        assert parse(await events.__anext__())["data"] == {"unread_count": 1}
+
+        new_id = add_notification(engine, user.id, "Live")
+        pushed = parse(await events.__anext__())
+        assert pushed["event"] == "notification"
+        assert pushed["id"] == str(new_id)
+        assert pushed["data"]["title"] == "Live"
+        assert parse(await events.__anext__())["data"] == {"unread_count": 2}
+
+        # Idle: heartbeat comment
+        assert (await events.__anext__()).startswith(": keepalive")
+        await events.aclose()
+        assert not hub.has_subscribers(user.id)
+
+    asyncio.run(scenario())
+
+
+def test_stream_resumes_from_last_event_id(engine, make_user):
+    user = make_user()
+    seen_id = add_notification(engine, user.id, "Seen")
+    missed = [add_notification(engine, user.id, f"Missed {n}") for n in range(3)]
+
+    async def scenario():
+        subscriber = hub.subscribe(user.id)
+        events = notification_events(subscriber, engine, seen_id, heartbeat_seconds=5)
+        await events.__anext__()
+        replayed = [parse(await events.__anext__()) for _ in missed]
+        assert [int(event["id"]) for event in replayed] == missed
+        assert parse(await events.__anext__())["data"] == {"unread_count": 4}
+        await events.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_bulk_notifications_wake_the_stream(engine, db, make_user):
+    user = make_user()
+
+    async def scenario():
+        subscriber = hub.subscribe(user.id)
+        events = notification_events(subscriber, engine, None, heartbeat_seconds=5)
+        await events.__anext__()
+        await events.__anext__()
+
+        enqueue_notifications(db, [notification_row(user.id, NotificationTypeEnum.FLAG, "Flagged", "...")])
+        db.commit()
+        await asyncio.get_running_loop().run_in_executor(None, jobs.run_pending, engine)
+
+        pushed = parse(await events.__anext__())
+        assert pushed["data"]["title"] == "Flagged"
+        assert parse(await events.__anext__())["data"] == {"unread_count": 1}
+        await events.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_slow_consumer_collapses_to_sync():
+    async def scenario():
+        subscriber = Subscriber(1, asyncio.get_running_loop(), maxsize=3)
+        for n in range(3):
+            subscriber.offer({"id": n})
+        assert await subscriber.next_batch(1) == [{"id": 0}, {"id": 1}, {"id": 2}]
+
+        # Overflow drops the buffered payloads; the stream re-reads the database
+        for n in range(10):
+            subscriber.offer({"id": n})
+        assert await subscriber.next_batch(1) == [SYNC]
+
+    asyncio.run(scenario())
+
+
+def test_stream_requires_auth(client, make_user):
+    assert client.get("/api/notifications/stream").status_code == 403
+    response = client.get(
+        "/api/notifications/stream", headers={**auth_headers(make_user()), "Last-Event-ID": "abc"}
+    )
+    assert response.status_code == 400
+
+
+def test_ten_thousand_idle_streams():
+    """Idle streams cost little memory and publishing reaches only the target"""
+    async def scenario():
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        subscribers = [hub.subscribe(user_id) for user_id in range(1, 10_001)]
+        waiters = [asyncio.ensure_future(s.next_batch(60)) for s in subscribers]
+        await asyncio.sleep(0)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        per_stream = sum(stat.size_diff for stat in after.compare_to(before, "filename")) / 10_000
+        print(f"\n10k idle streams: {per_stream:.0f} bytes each")
+        assert len(hub) == 10_000
+        assert per_stream < 8192
+
+        started = time.perf_counter()
+        # Published from another thread, as a request handler would
+        threading.Thread(target=hub.publish, args=(5000, {"id": 1})).start()
+        batch = await asyncio.wait_for(waiters[4999], 1)
+        print(f"delivery latency: {(time.perf_counter() - started) * 1000:.2f} ms")
+        assert batch == [{"id": 1}]
+        assert sum(waiter.done() for waiter in waiters) == 1
+
+        for waiter in waiters:
+            waiter.cancel()
+        for subscriber in subscribers:
+            hub.unsubscribe(subscriber)
+        assert len(hub) == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,136 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from app.core.config import settings
+from app.services.rate_limit import MemoryBackend, RateLimitPolicy, RateLimiter, RedisBackend
+from app.tests.conftest import TEST_PASSWORD
+
+
+class LocalRedis:
+    """In-process stand-in for the handful of redis-py calls RedisBackend uses"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.expiry = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lock(self, name, timeout=None, blocking_timeout=None):
+        with self._lock:
+            yield
+
+    def _expire_if_needed(self, key):
+        if key in self.expiry and self.expiry[key] <= time.time():
+            self.hashes.pop(key, None)
+            self.expiry.pop(key, None)
+
+    def hmget(self, key, *fields):
+        self._expire_if_needed(key)
+        values = self.hashes.get(key, {})
+        return [values.get(field) for field in fields]
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update({k: str(v) for k, v in mapping.items()})
+
+    def pexpire(self, key, milliseconds):
+        self.expiry[key] = time.time() + milliseconds / 1000
+
+    def scan_iter(self, pattern):
+        prefix = pattern.rstrip("*")
+        return [key for key in list(self.hashes) if key.startswith(prefix)]
+
+    def delete(self, key):
+        self.hashes.pop(key, None)
+        self.expiry.pop(key, None)
+
+
+POLICY = RateLimitPolicy(capacity=3, refill_per_second=1.0, scopes=("ip",))
+
+
+def test_bucket_allows_burst_then_refills():
+    backend = MemoryBackend()
+    results = [backend.take("k", POLICY, now=100.0) for _ in range(4)]
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert results[2].remaining == 0
+    assert results[3].retry_after == 1.0
+
+    assert backend.take("k", POLICY, now=101.0).allowed
+    assert not backend.take("k", POLICY, now=101.0).allowed
+
+
+def test_full_buckets_expire_lazily():
+    backend = MemoryBackend(sweep_every=2)
+    backend.take("a", POLICY, now=0.0)
+    backend.take("b", POLICY, now=0.5)
+    # Both buckets are full again well before t=10, so the sweep drops them
+    backend.take("c", POLICY, now=10.0)
+    backend.take("c", POLICY, now=10.0)
+    assert len(backend) == 1
+
+
+def test_redis_backend_shares_buckets_between_workers():
+    redis = LocalRedis()
+    policies = {"test": POLICY}
+    worker_a = RateLimiter(RedisBackend(redis), policies)
+    worker_b = RateLimiter(RedisBackend(redis), policies)
+
+    allowed = [
+        worker.check("test", {"ip": "10.0.0.1"}).allowed
+        for worker in (worker_a, worker_b, worker_a, worker_b)
+    ]
+    assert allowed == [True, True, True, False]
+    assert worker_a.check("test", {"ip": "10.0.0.2"}).allowed
+
+
+def test_tightest_scope_wins():
+    policies = {"test": RateLimitPolicy(capacity=2, refill_per_second=0.01, scopes=("user", "ip"))}
+    rate_limiter = RateLimiter(MemoryBackend(), policies)
+    rate_limiter.check("test", {"user": "1", "ip": "shared"})
+    rate_limiter.check("test", {"user": "2", "ip": "shared"})
+    # User 3 has a fresh user bucket but the shared IP bucket is empty
+    assert not rate_limiter.check("test", {"user": "3", "ip": "shared"}).allowed
+
+
+def test_denied_user_bucket_does_not_drain_the_ip_bucket():
+    policies = {"test": RateLimitPolicy(capacity=2, refill_per_second=0.01, scopes=("user", "ip"))}
+    backend = MemoryBackend()
+    rate_limiter = RateLimiter(backend, policies)
+    for _ in range(2):
+        backend.take("test:user:1", policies["test"])
+    assert [rate_limiter.check("test", {"user": "1", "ip": "shared"}).allowed for _ in range(2)] == [False, False]
+    # User 1's refused requests took nothing from the IP everyone behind it shares
+    assert rate_limiter.check("test", {"user": "2", "ip": "shared"}).remaining == 1
+
+
+def test_client_ip_trusts_only_the_configured_proxies(client, make_user, monkeypatch):
+    user = make_user()
+    payload = {"email": user.email, "password": TEST_PASSWORD}
+
+    def remaining(forwarded_for):
+        response = client.post("/api/auth/login", json=payload, headers={"X-Forwarded-For": forwarded_for})
+        return response.headers["RateLimit-Remaining"]
+
+    # Without trusted proxies the header is ignored: everyone shares the peer address
+    assert [remaining("1.1.1.1"), remaining("2.2.2.2")] == ["9", "8"]
+
+    monkeypatch.setattr(settings, "RATE_LIMIT_TRUSTED_PROXIES", 1)
+    assert remaining("3.3.3.3") == "9"
+    assert remaining("4.4.4.4") == "9"
+    # A client-supplied entry to the left of the proxy's does not pick the bucket
+    assert remaining("9.9.9.9, 3.3.3.3") == "8"
+
+
+def test_login_is_throttled_with_ratelimit_headers(client, make_user):
+    user = make_user()
+    ok = client.post("/api/auth/login", json={"email": user.email, "password": TEST_PASSWORD})
+    assert ok.status_code == 200
+    assert ok.headers["RateLimit-Limit"] == "10"
+    assert ok.headers["RateLimit-Remaining"] == "9"
+
+    payload = {"email": user.email, "password": "wrongpassword"}
+    responses = [client.post("/api/auth/login", json=payload) for _ in range(10)]
+    assert [r.status_code for r in responses] == [401] * 9 + [429]
+    throttled = responses[-1]
+    assert throttled.headers["RateLimit-Remaining"] == "0"
+    assert int(throttled.headers["Retry-After"]) >= 1
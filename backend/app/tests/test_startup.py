@@ -0,0 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Runs in a fresh interpreter: import cost only shows up on a cold import
+STARTUP_SCRIPT = """
+import json, os, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+result = {
+    "import_ms": (imported - started) * 1000,
+    "seed_imported": "seed_final" in sys.modules,
+    "db_after_import": os.path.exists(sys.argv[1]),
+}
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    result["db_after_startup"] = os.path.exists(sys.argv[1])
+    client.get("/")
+    result["first_request_ms"] = (time.perf_counter() - imported) * 1000
+print(json.dumps(result))
+"""
+
+
+def start(tmp_path, **env):
+    tmp_path.mkdir()
+    db_path = tmp_path / "startup.db"
+    environment = {
+        **os.environ, "DATABASE_URL": f"sqlite:///{db_path}", "JOB_WORKERS": "0",
+        "ANALYTICS_VIEW_FLUSH_SECONDS": "0", "STORAGE_LOCAL_DIR": str(tmp_path / "media"), **env,
+    }
+    completed = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, str(db_path)], cwd=BACKEND_DIR,
+                               env=environment, capture_output=True, text=True, timeout=120)
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def test_startup_benchmark(tmp_path):
+    cold = start(tmp_path / "cold")
+    skipped = start(tmp_path / "skipped", SKIP_SCHEMA_CHECK="true", WARMUP_ENABLED="false")
+    print(f"\nimport {cold['import_ms']:.0f} ms, startup + first request {cold['first_request_ms']:.0f} ms; "
+          f"with SKIP_SCHEMA_CHECK: {skipped['first_request_ms']:.0f} ms")
+
+    # Importing the app neither connects to the database nor loads the seed data
+    assert not cold["db_after_import"] and not cold["seed_imported"]
+    assert cold["db_after_startup"]
+    assert not skipped["db_after_startup"]
@@ -0,0 +1,119 @@
+import io
+
+from app.database.models import StoredObject
+from app.services import storage
+from app.tests.conftest import auth_headers
+from app.utils.static_files import IMMUTABLE_CACHE_CONTROL
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 1024
+
+
+class ClientError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class FakeS3Client:
+    """The slice of the boto3 S3 client that S3Storage uses, kept in memory like a throwaway MinIO"""
+
+    class exceptions:
+        ClientError = ClientError
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = 0
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError("404")
+        return {"ContentLength": len(self.objects[Bucket, Key][0])}
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None):
+        with open(Filename, "rb") as source:
+            self.objects[Bucket, Key] = (source.read(), ExtraArgs)
+        self.uploads += 1
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError("NoSuchKey")
+        return {"Body": io.BytesIO(self.objects[Bucket, Key][0])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+
+def upload(client, user, data):
+    response = client.post("/api/auth/upload-avatar", files={"file": ("me.png", data, "image/png")},
+                           headers=auth_headers(user))
+    assert response.status_code == 200, response.text
+    return response.json()["user"]["profile"]["avatar_url"]
+
+
+def refcounts(db):
+    db.expire_all()
+    return {row.key: row.refcount for row in db.query(StoredObject)}
+
+
+def test_identical_uploads_are_stored_once_and_deleted_with_their_last_reference(client, db, make_user,
+                                                                                media_storage):
+    alice, bob = make_user(), make_user()
+    url = upload(client, alice, PNG)
+    assert upload(client, bob, PNG) == url
+    key = storage.key_from_url(url)
+    assert refcounts(db) == {key: 2}
+
+    response = client.get(url)
+    assert response.content == PNG
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.headers["content-type"] == "image/png"
+
+    # Replacing an avatar releases the old one; the object survives while bob still uses it
+    other = storage.key_from_url(upload(client, alice, PNG + b"\x01"))
+    assert refcounts(db) == {key: 1, other: 1}
+    client.put("/api/auth/profile", json={"avatar_url": "https://example.com/bob.png"}, headers=auth_headers(bob))
+    assert refcounts(db) == {other: 1}
+    assert not media_storage.exists(key)
+    assert client.get(url).status_code == 404
+    assert client.get("/media/not-a-key.png").status_code == 404
+
+
+def test_s3_backend(client, db, tmp_path):
+    s3 = FakeS3Client()
+    storage.set_storage(storage.S3Storage("media", client=s3, prefix="uploads/"))
+    source = tmp_path / "avatar.png"
+    source.write_bytes(PNG)
+
+    keys = [storage.store_file(db, str(source), "png") for _ in range(3)]
+    db.commit()
+    assert len(set(keys)) == 1 and s3.uploads == 1
+    body, extra = s3.objects["media", f"uploads/{keys[0]}"]
+    assert body == PNG and extra == {"ContentType": "image/png", "CacheControl": IMMUTABLE_CACHE_CONTROL}
+    assert client.get(storage.media_url(keys[0])).content == PNG
+
+    assert [storage.release(db, keys[0]) for _ in range(3)] == [False, False, True]
+    db.commit()
+    assert s3.objects == {} and refcounts(db) == {}
+    assert client.get(storage.media_url(keys[0])).status_code == 404
+
+
+def test_released_objects_are_deleted_only_after_commit(engine, db, tmp_path, media_storage, monkeypatch):
+    source = tmp_path / "clip.mp4"
+    source.write_bytes(b"\x00" * 4096)
+    key = storage.store_file(db, str(source), "mp4")
+    db.commit()
+
+    # A rolled-back release keeps both the reference and the bytes
+    assert storage.release(db, key)
+    db.rollback()
+    assert refcounts(db) == {key: 1} and media_storage.exists(key)
+
+    # A delete that fails after commit leaves the row at zero for the sweep job
+    monkeypatch.setattr(media_storage, "delete", lambda key: (_ for _ in ()).throw(OSError("disk gone")))
+    storage.release(db, key)
+    db.commit()
+    assert refcounts(db) == {key: 0} and media_storage.exists(key)
+
+    monkeypatch.delattr(media_storage, "delete")
+    assert storage.sweep(db) == 1
+    assert refcounts(db) == {} and not media_storage.exists(key)
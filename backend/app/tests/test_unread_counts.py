@@ -0,0 +1,147 @@
+import random
+import threading
+
+from sqlalchemy import create_engine, event, func, select, update
+from sqlalchemy.orm import Session
+
+from app.database.models import Base, Job, Notification, NotificationCounter, NotificationTypeEnum, User
+from app.services import jobs
+from app.services.notifications import bulk_create_notifications, delete_notifications, mark_notifications_read
+from app.services.unread_counts import get_unread_count, reconcile_unread_counts
+from app.tests.conftest import auth_headers
+
+
+def stored_counts(db):
+    return dict(db.execute(select(NotificationCounter.user_id, NotificationCounter.unread_count)).all())
+
+
+def actual_counts(db):
+    return dict(db.execute(
+        select(Notification.user_id, func.count(Notification.id))
+        .where(Notification.is_read == False).group_by(Notification.user_id)
+    ).all())
+
+
+def notify(db, user_id, n=1):
+    notifications = [Notification(user_id=user_id, title="t", message="m") for _ in range(n)]
+    db.add_all(notifications)
+    db.commit()
+    return notifications
+
+
+def test_counter_follows_every_write_path(client, db, make_user):
+    user = make_user()
+    headers = auth_headers(user)
+    unread = lambda: client.get("/api/notifications/unread-count", headers=headers).json()["unread_count"]
+
+    first, second = notify(db, user.id, 2)
+    assert unread() == 2
+
+    client.put(f"/api/notifications/{first.id}/read", headers=headers)
+    assert unread() == 1
+
+    bulk_create_notifications(db, [
+        {"user_id": user.id, "notification_type": NotificationTypeEnum.LIKE, "title": "t", "message": "m"}
+        for _ in range(3)
+    ])
+    db.commit()
+    assert unread() == 4
+
+    assert client.delete(f"/api/notifications/{second.id}", headers=headers).status_code == 200
+    assert unread() == 3
+    # Deleting a read notification leaves the count alone
+    client.delete(f"/api/notifications/{first.id}", headers=headers)
+    assert unread() == 3
+
+    client.put("/api/notifications/mark-all-read", headers=headers)
+    assert unread() == 0
+    assert stored_counts(db) == {user.id: 0}
+
+
+def test_unread_count_is_served_from_cache(db, engine, make_user):
+    user = make_user()
+    notify(db, user.id, 2)
+    assert get_unread_count(db, user.id) == 2
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert get_unread_count(db, user.id) == 2
+    assert statements == []
+
+
+def test_counters_match_under_concurrent_writes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'counters.db'}", connect_args={"timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    with Session(bind=engine) as db:
+        db.execute(User.__table__.insert(), [
+            {"email": f"u{i}@example.com", "username": f"u{i}", "hashed_password": "x"} for i in range(5)
+        ])
+        db.commit()
+        user_ids = db.execute(select(User.id)).scalars().all()
+
+    def writer(seed):
+        rng = random.Random(seed)
+        with Session(bind=engine) as db:
+            for _ in range(60):
+                user_id = rng.choice(user_ids)
+                op = rng.random()
+                if op < 0.4:
+                    notify(db, user_id, rng.randint(1, 3))
+                elif op < 0.6:
+                    bulk_create_notifications(db, [
+                        {"user_id": user_id, "notification_type": NotificationTypeEnum.LIKE,
+                         "title": "t", "message": "m"}
+                    ] * rng.randint(1, 3))
+                    db.commit()
+                elif op < 0.8:
+                    # Possibly stale by the time it is written, as with two open tabs
+                    ids = db.execute(select(Notification.id).where(Notification.user_id == user_id)
+                                     .limit(2)).scalars().all()
+                    if rng.random() < 0.5:
+                        mark_notifications_read(db, user_id, ids)
+                    else:
+                        delete_notifications(db, user_id, ids)
+                    db.commit()
+                else:
+                    mark_notifications_read(db, user_id)
+                    db.commit()
+
+    threads = [threading.Thread(target=writer, args=(seed,)) for seed in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with Session(bind=engine) as db:
+        actual = actual_counts(db)
+        stored = stored_counts(db)
+        assert {u: stored.get(u, 0) for u in user_ids} == {u: actual.get(u, 0) for u in user_ids}
+        assert sum(actual.values()) > 0
+    engine.dispose()
+
+
+def test_reconcile_job_repairs_drift(engine, db, make_user):
+    user, other = make_user(), make_user()
+    notify(db, user.id, 3)
+    # Writes that bypass the bookkeeping
+    db.execute(Notification.__table__.insert(), [{"user_id": other.id, "title": "t", "message": "m", "is_read": False}])
+    db.execute(update(NotificationCounter).where(NotificationCounter.user_id == user.id).values(unread_count=7))
+    db.commit()
+
+    assert reconcile_unread_counts(db) == 2
+    db.commit()
+    assert stored_counts(db) == {user.id: 3, other.id: 1}
+    assert get_unread_count(db, user.id) == 3
+
+
+def test_reconcile_runs_as_a_recurring_job(engine, db):
+    jobs.load_handlers()
+    jobs.schedule_recurring(db)
+    db.commit()
+    scheduled = db.query(Job).filter(Job.kind == "notifications.reconcile_unread_counts").all()
+    assert len(scheduled) == 1
+
+    # Scheduling again, e.g. from another process, does not queue a duplicate
+    jobs.schedule_recurring(db)
+    db.commit()
+    assert db.query(Job).filter(Job.kind == "notifications.reconcile_unread_counts").count() == 1
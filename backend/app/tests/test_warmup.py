@@ -0,0 +1,95 @@
+import asyncio
+import threading
+from datetime import datetime
+
+from app.database.models import Category, Content, ContentStatusEnum, ContentTypeEnum, RoleEnum
+from app.services import admin_stats, warmup
+from app.tests.conftest import auth_headers, count_queries
+
+
+def publish(db, author, title, day):
+    category = db.query(Category).first() or Category(name="Web Development")
+    content = Content(title=title, content_type=ContentTypeEnum.ARTICLE, status=ContentStatusEnum.PUBLISHED,
+                      author_id=author.id, category=category, published_at=datetime(2026, 3, day))
+    db.add(content)
+    db.commit()
+    return content
+
+
+def test_warmup_preloads_the_feed_and_admin_stats(client, engine, db, make_user):
+    author = make_user()
+    publish(db, author, "First", 1)
+
+    report = asyncio.run(warmup.run_warmup(engine))
+    assert report["status"] == "ready"
+    assert {name: item["status"] for name, item in report["items"].items()} == {
+        "admin_stats": "ok", "categories": "ok", "public_feed": "ok",
+    }
+    assert all(item["ms"] >= 0 for item in report["items"].values())
+    assert admin_stats._snapshot.get(admin_stats._KEY)["content"]["published"] == 1
+
+    with count_queries(engine) as statements:
+        feed = client.get("/api/content/public").json()
+    assert [item["title"] for item in feed] == ["First"]
+    assert statements == []
+
+    # Publishing drops the cached pages
+    second = publish(db, author, "Second", 2)
+    assert [item["title"] for item in client.get("/api/content/public").json()] == ["Second", "First"]
+    # A view only moves a counter, which may lag
+    second.views_count = 5
+    db.commit()
+    with count_queries(engine) as statements:
+        client.get("/api/content/public")
+    assert statements == []
+
+
+def test_warmup_is_bounded_and_reports_each_task(client, engine, monkeypatch):
+    release = threading.Event()
+
+    def broken(db):
+        raise RuntimeError("no such table")
+
+    monkeypatch.setattr(warmup, "_tasks", {
+        "quick": lambda db: None,
+        "broken": broken,
+        "stuck": lambda db: release.wait(5),
+    })
+    try:
+        report = asyncio.run(warmup.run_warmup(engine, timeout=0.2))
+    finally:
+        release.set()
+    items = report["items"]
+    assert (items["quick"]["status"], items["broken"]["status"], items["stuck"]["status"]) == ("ok", "error", "timeout")
+    assert items["broken"]["error"] == "no such table"
+    assert report["status"] == "ready" and report["duration_ms"] < 5000
+
+    # Load balancers are kept away while the caches are still warming
+    monkeypatch.setitem(warmup._state, "status", "warming")
+    response = client.get("/health")
+    assert response.status_code == 503 and response.json()["ready"] is False
+    monkeypatch.setitem(warmup._state, "status", "ready")
+    assert client.get("/health").json()["warmup"]["items"]["quick"]["status"] == "ok"
+
+
+def test_rewarm_keeps_a_ready_instance_in_rotation(client, engine, make_user, monkeypatch):
+    admin = make_user(role=RoleEnum.ADMIN)
+    monkeypatch.setattr(warmup, "_tasks", {"quick": lambda db: None})
+    asyncio.run(warmup.run_warmup(engine))
+    release = threading.Event()
+    monkeypatch.setattr(warmup, "_tasks", {"slow": lambda db: release.wait(5)})
+
+    async def rewarm_while_serving():
+        rewarm = asyncio.create_task(warmup.run_warmup(engine, rewarm=True))
+        await asyncio.sleep(0.05)
+        health = client.get("/health")
+        second = client.post("/api/admin/cache/warmup", headers=auth_headers(admin))
+        release.set()
+        return health, second, await rewarm
+
+    health, second, report = asyncio.run(rewarm_while_serving())
+    assert health.status_code == 200 and health.json()["warmup"]["rewarm"]["status"] == "warming"
+    assert second.status_code == 409
+    # The startup report is left alone; the re-run has its own
+    assert report["status"] == "ready" and set(report["items"]) == {"quick"}
+    assert report["rewarm"]["status"] == "done" and report["rewarm"]["items"]["slow"]["status"] == "ok"
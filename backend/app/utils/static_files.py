@@ -0,0 +1,180 @@
+"""Serving uploaded files: byte ranges, conditional requests and cache policy.
+
+``MediaFileResponse`` answers ``Range`` requests (one range; anything else
+gets the whole file), ``If-None-Match``/``If-Modified-Since`` with 304 and
+``If-Range``. The body is handed to the server with the ASGI
+``http.response.zerocopysend`` extension (``os.sendfile``) or
+``http.response.pathsend`` where the server offers them, and is otherwise
+read in ``MEDIA_CHUNK_BYTES`` chunks. A file is never held in memory.
+
+Cache-Control comes from ``MEDIA_CACHE_CONTROL``, keyed by path prefix.
+"""
+import os
+import stat
+from email.utils import parsedate
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def cache_control_for(path: str) -> Optional[str]:
+    """The Cache-Control of the longest ``MEDIA_CACHE_CONTROL`` prefix of ``path``, if any"""
+    matches = [prefix for prefix in settings.MEDIA_CACHE_CONTROL if path.startswith(prefix)]
+    return settings.MEDIA_CACHE_CONTROL[max(matches, key=len)] if matches else None
+
+
+def parse_range(value: str, size: int) -> Optional[Tuple[int, int]]:
+    """The inclusive (start, end) of a single byte range, or None if the header should be ignored"""
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        # Multiple ranges are allowed to get the whole file
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0 or size == 0:
+                raise RangeNotSatisfiable()
+            return max(size - suffix, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def is_not_modified(response_headers, request_headers: Headers) -> bool:
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-Modified-Since is ignored when If-None-Match is present
+        etag = response_headers.get("etag")
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag is not None and ("*" in tags or etag.removeprefix("W/") in tags)
+    if_modified_since = request_headers.get("if-modified-since")
+    last_modified = response_headers.get("last-modified")
+    if if_modified_since and last_modified:
+        since, modified = parsedate(if_modified_since), parsedate(last_modified)
+        return since is not None and modified is not None and since >= modified
+    return False
+
+
+def _if_range_matches(response_headers, request_headers: Headers) -> bool:
+    if_range = request_headers.get("if-range")
+    if if_range is None:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # Only a strong validator can vouch for a partial response
+        return if_range == response_headers.get("etag")
+    return if_range == response_headers.get("last-modified")
+
+
+class MediaFileResponse(FileResponse):
+    """A file response that honours Range and conditional request headers"""
+
+    def __init__(self, path, cache_control: Optional[str] = None, etag: Optional[str] = None, **kwargs):
+        headers = dict(kwargs.pop("headers", None) or {})
+        if etag:
+            headers["etag"] = etag
+        if cache_control:
+            headers["cache-control"] = cache_control
+        headers["accept-ranges"] = "bytes"
+        super().__init__(path, headers=headers, **kwargs)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.stat_result is None:
+            try:
+                self.stat_result = await anyio.to_thread.run_sync(os.stat, self.path)
+            except FileNotFoundError:
+                raise RuntimeError(f"File at path {self.path} does not exist.")
+            if not stat.S_ISREG(self.stat_result.st_mode):
+                raise RuntimeError(f"File at path {self.path} is not a file.")
+            self.set_stat_headers(self.stat_result)
+
+        request_headers = Headers(scope=scope)
+        if is_not_modified(self.headers, request_headers):
+            await NotModifiedResponse(self.headers)(scope, receive, send)
+            return
+
+        size = self.stat_result.st_size
+        start, end = 0, size - 1
+        if "range" in request_headers and _if_range_matches(self.headers, request_headers):
+            try:
+                byte_range = parse_range(request_headers["range"], size)
+            except RangeNotSatisfiable:
+                await Response(status_code=416, headers={"content-range": f"bytes */{size}"})(scope, receive, send)
+                return
+            if byte_range is not None:
+                start, end = byte_range
+                self.status_code = 206
+                self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+                self.headers["content-length"] = str(end - start + 1)
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        else:
+            await self._send_body(scope, send, start, end - start + 1)
+        if self.background is not None:
+            await self.background()
+
+    async def _send_body(self, scope: Scope, send: Send, offset: int, count: int) -> None:
+        extensions = scope.get("extensions") or {}
+        if "http.response.zerocopysend" in extensions:
+            with open(self.path, "rb") as file:
+                await send({"type": "http.response.zerocopysend", "file": file,
+                            "offset": offset, "count": count, "more_body": False})
+            return
+        if "http.response.pathsend" in extensions and offset == 0 and count == self.stat_result.st_size:
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+            return
+        chunk_bytes = settings.MEDIA_CHUNK_BYTES
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(offset)
+            remaining = count
+            while True:
+                chunk = await file.read(min(chunk_bytes, remaining)) if remaining else b""
+                remaining -= len(chunk)
+                more_body = bool(chunk) and remaining > 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                if not more_body:
+                    break
+
+
+class MediaStaticFiles(StaticFiles):
+    """StaticFiles served through ``MediaFileResponse``"""
+
+    # A fixed Cache-Control for the whole mount; None looks each path up in MEDIA_CACHE_CONTROL
+    cache_control: Optional[str] = None
+
+    def file_response(self, full_path, stat_result, scope: Scope, status_code: int = 200) -> Response:
+        if status_code != 200:
+            # html-mode 404 pages
+            return super().file_response(full_path, stat_result, scope, status_code)
+        # The full request path, as the app sees it
+        path = scope["path"].removeprefix(scope.get("app_root_path", ""))
+        return MediaFileResponse(full_path, stat_result=stat_result,
+                                 cache_control=self.cache_control or cache_control_for(path))
+
+
+class ImmutableStaticFiles(MediaStaticFiles):
+    """Static files whose names change whenever their bytes do, so browsers and CDNs may keep them forever"""
+
+    cache_control = IMMUTABLE_CACHE_CONTROL
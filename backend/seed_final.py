@@ -1,5 +1,5 @@
 from app.database.connection import get_db
-from app.database.models import User, Category, Content, ContentTypeEnum, user_wishlist, Comment, Like, Notification, ContentFlag, ContentStatusEnum
+from app.database.models import User, Category, Content, ContentTypeEnum, user_wishlist, Comment, Like, Notification, NotificationCounter, ContentFlag, ContentStatusEnum
 import logging
 
 logger = logging.getLogger(__name__)
@@ -83,6 +83,7 @@ def seed_database():
         # Delete in correct order to avoid foreign key constraints
         db.query(ContentFlag).delete()
         db.query(Notification).delete()
+        db.query(NotificationCounter).delete()
         db.query(Like).delete()
         db.query(Comment).delete()
         db.query(user_wishlist).delete()